@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Disponibilidad por sucursal en bloque desde una hoja de existencias.
+
+Genera los cuerpos de POST /api/catalog/products/:id/branch-availability
+(`BulkUpdateProductBranchAvailabilityDto`) a partir de la hoja de existencias
+o del delta de `enrich_products_with_ai.py --stock-delta`. Cada SKU se cruza
+con un índice local exportado de la base de datos, que da el producto y las
+sucursales. Con --send los cuerpos se aplican en paralelo con reintentos y se
+escribe un reporte por request. Los requests que fallan quedan en un archivo
+que se puede reenviar con --from-payloads.
+
+Uso:
+    python scripts/apply_branch_availability.py --input existencias.xlsx --index sku_index.csv
+    python scripts/apply_branch_availability.py --input existencias.delta.csv --index sku_index.csv --send
+    python scripts/apply_branch_availability.py --from-payloads existencias.branch_payloads.failed.jsonl --send
+    python scripts/apply_branch_availability.py --input existencias.xlsx --index sku_index.csv --standin
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from enrichment.branch_availability import (
+    BRANCH_PRICE_KEEP, BRANCH_PRICE_MODES, DEFAULT_API_URL, DEFAULT_MAX_BODY_BYTES,
+    DEFAULT_MAX_BRANCHES_PER_REQUEST, DEFAULT_SENDER_WORKERS, BranchAvailabilitySender, apply_payloads,
+    iter_payloads, plan_branch_updates, read_sku_index, read_stock_updates, write_payloads,
+)
+from enrichment.http import DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT, HttpClient
+from enrichment.journal import read_jsonl
+
+
+def generate(args) -> str:
+    """Escribe el archivo de cuerpos y retorna su ruta"""
+    payloads_path = args.payloads or f"{os.path.splitext(args.input)[0]}.branch_payloads.jsonl"
+    started = time.perf_counter()
+    print(f"📖 Leyendo existencias: {args.input}")
+    stock = read_stock_updates(args.input)
+    index = None
+    if args.index:
+        print(f"🗂️  Leyendo índice de SKUs: {args.index}")
+        index = read_sku_index(args.index)
+    plan = plan_branch_updates(stock, index, branches=args.branch or (), branch_price=args.branch_price,
+                               disable_out_of_stock=args.disable_out_of_stock,
+                               skip_unchanged=not args.include_unchanged,
+                               reset_missing_fields=args.reset_missing_fields)
+    requests_count, branches = write_payloads(
+        iter_payloads(plan, args.max_branches, args.max_body_bytes), payloads_path
+    )
+    products = plan.updates['product_id'].nunique()
+    print(f"✅ {requests_count} requests ({products} productos, {branches} sucursales) escritos en: {payloads_path}")
+    print(f"   • SKUs en la entrada: {plan.skus}")
+    print(f"   • SKUs sin producto en el índice (omitidos): {plan.skus_without_product}")
+    if plan.unchanged:
+        print(f"   • Sucursales sin cambios (omitidas): {plan.unchanged}")
+    if not plan.has_classifications:
+        print("   ⚠️  Sin classification_ids: el endpoint borrará las clasificaciones de cada sucursal enviada")
+    print(f"   ⏱️  {time.perf_counter() - started:.2f}s")
+    return payloads_path
+
+
+def send(args, payloads_path: str):
+    report_path = args.report or f"{os.path.splitext(payloads_path)[0]}.report.csv"
+    failed_path = f"{os.path.splitext(payloads_path)[0]}.failed.jsonl"
+    if failed_path == payloads_path:
+        failed_path = f"{os.path.splitext(payloads_path)[0]}.retry.jsonl"
+    client = HttpClient(pool_size=args.workers, max_retries=args.retries, timeout=args.timeout)
+
+    standin = None
+    api_url = args.api_url
+    if args.standin:
+        from benchmarks.standins import EndpointBehavior, StandinServer
+        standin = StandinServer(products=EndpointBehavior(latency_ms=20, latency_sigma=0.5,
+                                                          error_rate=args.standin_error_rate,
+                                                          retry_after=0.1)).start()
+        api_url = standin.api_base_url
+        client.backoff_base = 0.05
+        print(f"🧪 Servidor local de prueba en {api_url} (errores 5xx: {args.standin_error_rate:.0%})")
+
+    sender = BranchAvailabilitySender(api_url, token=args.token, workers=args.workers, client=client)
+    print(f"📤 Enviando {payloads_path} a {api_url} con {args.workers} workers")
+    try:
+        report = apply_payloads(read_jsonl(payloads_path), sender, report_path, failed_path)
+    finally:
+        sender.close()
+        if standin is not None:
+            standin.stop()
+
+    rate = (report.sent + report.failed) / report.seconds if report.seconds > 0 else 0
+    print(f"{'✅' if not report.failed else '⚠️ '} {report.sent} requests aplicados "
+          f"({report.branches} sucursales), {report.failed} fallidos")
+    print(f"   • Requests HTTP: {report.http_requests} ({report.retries} reintentos)")
+    print("   • Respuestas: " + ", ".join(f"{status}: {count}" for status, count in sorted(report.statuses.items())))
+    print(f"   • Reporte: {report_path}")
+    if report.failed:
+        print(f"   • Fallidos (para reenviar con --from-payloads): {failed_path}")
+    print(f"   ⏱️  {report.seconds:.2f}s ({rate:,.1f} requests/s)")
+    if standin is not None:
+        print(f"   • Productos en el servidor de prueba: {len(standin.branch_availability)}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Genera y envía la disponibilidad por sucursal de los productos desde una hoja de existencias',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        '--input',
+        help='Hoja de existencias (.xlsx/.csv) o delta de --stock-delta (.csv/.jsonl)'
+    )
+    source.add_argument(
+        '--from-payloads',
+        metavar='PAYLOADS_JSONL',
+        help='Enviar un archivo de cuerpos ya generado (p. ej. los fallidos de una corrida anterior)'
+    )
+    parser.add_argument(
+        '--index',
+        help='CSV exportado de la base de datos: sku, product_id y opcionalmente branch_id, price, stock, '
+             'is_enabled, classification_ids (sin índice, la entrada debe ser un delta con product_id)'
+    )
+    parser.add_argument(
+        '--branch',
+        action='append',
+        metavar='BRANCH_ID',
+        help='Sucursal a actualizar (repetible). Si el índice trae branch_id, filtra; si no, aplica a todos'
+    )
+    parser.add_argument(
+        '--branch-price',
+        choices=BRANCH_PRICE_MODES,
+        default=BRANCH_PRICE_KEEP,
+        help='keep: conservar el precio por sucursal del índice; sheet: usar el precio de la hoja (default: keep)'
+    )
+    parser.add_argument(
+        '--disable-out-of-stock',
+        action='store_true',
+        help='Deshabilitar en la sucursal los productos sin existencia (el backend borra su registro)'
+    )
+    parser.add_argument(
+        '--include-unchanged',
+        action='store_true',
+        help='Enviar también las sucursales cuya existencia no cambió respecto al índice'
+    )
+    parser.add_argument(
+        '--reset-missing-fields',
+        action='store_true',
+        help='Permitir enviar sin price o classification_ids en el índice (el endpoint los deja vacíos)'
+    )
+    parser.add_argument(
+        '--max-branches',
+        type=int,
+        default=DEFAULT_MAX_BRANCHES_PER_REQUEST,
+        help=f'Máximo de sucursales por request (default: {DEFAULT_MAX_BRANCHES_PER_REQUEST})'
+    )
+    parser.add_argument(
+        '--max-body-bytes',
+        type=int,
+        default=DEFAULT_MAX_BODY_BYTES,
+        help=f'Tamaño máximo aproximado de cada cuerpo (default: {DEFAULT_MAX_BODY_BYTES})'
+    )
+    parser.add_argument(
+        '--payloads',
+        help='Archivo JSONL de cuerpos a generar (default: <input>.branch_payloads.jsonl)'
+    )
+    parser.add_argument(
+        '--send',
+        action='store_true',
+        help='Enviar los cuerpos a la API después de generarlos'
+    )
+    parser.add_argument(
+        '--api-url',
+        default=os.getenv('API_URL', DEFAULT_API_URL),
+        help=f'URL base de la API (default: API_URL o {DEFAULT_API_URL})'
+    )
+    parser.add_argument(
+        '--token',
+        default=os.getenv('AUTH_TOKEN'),
+        help='Token de autenticación (Bearer); default: variable de entorno AUTH_TOKEN'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=DEFAULT_SENDER_WORKERS,
+        help=f'Requests en paralelo (default: {DEFAULT_SENDER_WORKERS})'
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help=f'Reintentos por request en 429/5xx o error de red (default: {DEFAULT_MAX_RETRIES})'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=f'Timeout por request en segundos (default: {DEFAULT_TIMEOUT})'
+    )
+    parser.add_argument(
+        '--report',
+        help='Reporte CSV con el resultado de cada request (default: <payloads>.report.csv)'
+    )
+    parser.add_argument(
+        '--standin',
+        action='store_true',
+        help='Enviar a un servidor local que imita el endpoint (para probar sin tocar el backend)'
+    )
+    parser.add_argument(
+        '--standin-error-rate',
+        type=float,
+        default=0.0,
+        help='Probabilidad de que el servidor local responda 500 (default: 0)'
+    )
+
+    args = parser.parse_args()
+
+    for path in (args.input, args.index, args.from_payloads):
+        if path and not os.path.exists(path):
+            print(f"❌ Error: El archivo {path} no existe")
+            sys.exit(1)
+    if args.workers < 1:
+        print("❌ Error: --workers debe ser al menos 1")
+        sys.exit(1)
+
+    if args.from_payloads:
+        payloads_path = args.from_payloads
+    else:
+        try:
+            payloads_path = generate(args)
+        except (OSError, ValueError) as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+
+    if args.send or args.standin or args.from_payloads:
+        if not args.token and not args.standin:
+            print("⚠️  Sin token (--token o AUTH_TOKEN): el backend responderá 401")
+        report = send(args, payloads_path)
+        if report.failed:
+            sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Benchmark de throughput de enrich_products_with_ai.py sin gastar en APIs reales.
+
+Levanta servidores locales que imitan OpenAI (chat completions) y Unsplash,
+genera archivos de existencias sintéticos y ejecuta el script real (como
+subproceso) con varios niveles de concurrencia. Reporta filas por segundo,
+memoria máxima (RSS) y llamadas a las APIs por fila. Con --baseline compara
+contra una corrida guardada y termina con error si hay regresiones.
+
+Uso:
+    python scripts/benchmark_enrich_products.py --rows 1000,10000 --workers 1,4,16
+    python scripts/benchmark_enrich_products.py --rows 1000 --save-baseline scripts/benchmarks/baseline.json
+    python scripts/benchmark_enrich_products.py --rows 1000 --baseline scripts/benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.standins import EndpointBehavior, StandinServer
+from benchmarks.synthetic import ensure_synthetic_file
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ENRICH_SCRIPT = os.path.join(SCRIPT_DIR, 'enrich_products_with_ai.py')
+DEFAULT_WORK_DIR = os.path.join(tempfile.gettempdir(), 'agora-enrich-bench')
+
+# Tolerancias para considerar una regresión contra el baseline
+DEFAULT_THROUGHPUT_TOLERANCE = 0.20   # 20% menos filas/s
+DEFAULT_RSS_TOLERANCE = 0.25          # 25% más memoria
+DEFAULT_CALLS_TOLERANCE = 0.05        # 5% más llamadas por fila
+
+
+def parse_int_list(value: str) -> List[int]:
+    """'1000,10k,1m' -> [1000, 10000, 1000000]"""
+    numbers = []
+    for item in value.split(','):
+        item = item.strip().lower()
+        multiplier = 1
+        if item.endswith('k'):
+            multiplier, item = 1000, item[:-1]
+        elif item.endswith('m'):
+            multiplier, item = 1000000, item[:-1]
+        numbers.append(int(float(item) * multiplier))
+    return numbers
+
+
+def run_case(server: StandinServer, input_path: str, rows: int, workers: int, work_dir: str,
+             extra_args: List[str]) -> Dict:
+    """Ejecuta el script una vez y retorna sus mediciones"""
+    case_dir = tempfile.mkdtemp(prefix=f"r{rows}_w{workers}_", dir=work_dir)
+    output_path = os.path.join(case_dir, 'salida.xlsx')
+    metrics_path = os.path.join(case_dir, 'metrics.json')
+    command = [
+        sys.executable, ENRICH_SCRIPT, '--input', input_path, '--output', output_path,
+        '--workers', str(workers), '--no-cache', '--metrics-file', metrics_path,
+        '--cache-dir', os.path.join(case_dir, 'cache'),
+    ] + extra_args
+    env = dict(os.environ, OPENAI_API_KEY='standin', OPENAI_BASE_URL=server.openai_base_url,
+               UNSPLASH_ACCESS_KEY='standin', UNSPLASH_SEARCH_URL=server.unsplash_search_url)
+
+    server.reset_stats()
+    log_path = os.path.join(case_dir, 'salida.log')
+    started = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 entrega el uso de recursos de este proceso hijo (ru_maxrss en KB en Linux)
+        _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - started
+    exit_code = os.waitstatus_to_exitcode(status)
+
+    stats = server.stats.snapshot()
+    metrics = {}
+    if os.path.exists(metrics_path):
+        with open(metrics_path, encoding='utf-8') as f:
+            metrics = json.load(f)
+    llm_latency = metrics.get('operations', {}).get('llm_request', {})
+
+    calls = sum(stats['requests'].values())
+    return {
+        "rows": rows,
+        "workers": workers,
+        "exit_code": exit_code,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 2) if elapsed > 0 else 0.0,
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "api_calls": stats['requests'],
+        "api_statuses": stats['statuses'],
+        "calls_per_row": round(calls / rows, 4) if rows else 0.0,
+        "llm_p95_seconds": round(llm_latency.get('p95', 0.0), 4),
+        "log": log_path,
+    }
+
+
+def case_key(result: Dict) -> str:
+    return f"{result['rows']}x{result['workers']}"
+
+
+def compare_with_baseline(results: List[Dict], baseline: Dict, throughput_tolerance: float,
+                          rss_tolerance: float, calls_tolerance: float) -> List[str]:
+    """Mensajes de regresión (lista vacía = sin regresiones)"""
+    previous = {case_key(case): case for case in baseline.get('cases', [])}
+    regressions = []
+    for result in results:
+        key = case_key(result)
+        base = previous.get(key)
+        if not base:
+            continue
+        if result['exit_code'] != 0:
+            regressions.append(f"{key}: el script terminó con código {result['exit_code']}")
+        if result['rows_per_second'] < base['rows_per_second'] * (1 - throughput_tolerance):
+            regressions.append(f"{key}: {result['rows_per_second']} filas/s vs {base['rows_per_second']} del baseline")
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + rss_tolerance):
+            regressions.append(f"{key}: {result['peak_rss_mb']} MB de RSS vs {base['peak_rss_mb']} MB del baseline")
+        if result['calls_per_row'] > base['calls_per_row'] * (1 + calls_tolerance) + 1e-9:
+            regressions.append(f"{key}: {result['calls_per_row']} llamadas/fila vs {base['calls_per_row']} del baseline")
+    return regressions
+
+
+def print_report(results: List[Dict]):
+    print(f"\n{'filas':>9} {'workers':>7} {'seg':>9} {'filas/s':>10} {'RSS MB':>8} {'llamadas/fila':>14} {'p95 IA s':>9}")
+    for result in results:
+        flag = '' if result['exit_code'] == 0 else f"  ❌ código {result['exit_code']} (ver {result['log']})"
+        print(f"{result['rows']:>9} {result['workers']:>7} {result['seconds']:>9.2f} {result['rows_per_second']:>10.1f} "
+              f"{result['peak_rss_mb']:>8.1f} {result['calls_per_row']:>14.3f} {result['llm_p95_seconds']:>9.3f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de enrich_products_with_ai.py con APIs simuladas')
+    parser.add_argument('--rows', default='1000,10000',
+                        help='Tamaños de archivo a probar, p. ej. 1k,10k,100k,1m (default: 1000,10000)')
+    parser.add_argument('--workers', default='1,4,16', help='Niveles de concurrencia (default: 1,4,16)')
+    parser.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx', help='Formato del archivo sintético')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla de los datos sintéticos')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1,
+                        help='Fracción de filas que repiten un número de parte (default: 0.1)')
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR,
+                        help=f'Directorio de archivos sintéticos y salidas (default: {DEFAULT_WORK_DIR})')
+    parser.add_argument('--args', default='--no-images',
+                        help='Argumentos adicionales para el script (default: "--no-images")')
+
+    parser.add_argument('--llm-latency-ms', type=float, default=300, help='Mediana de latencia de la IA simulada')
+    parser.add_argument('--llm-latency-sigma', type=float, default=0.5, help='Dispersión log-normal de la latencia')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='Probabilidad de error 500 de la IA')
+    parser.add_argument('--llm-429-rate', type=float, default=0.0, help='Probabilidad de 429 de la IA')
+    parser.add_argument('--llm-max-rps', type=float, help='Requests por segundo antes de responder 429')
+    parser.add_argument('--llm-truncate-rate', type=float, default=0.0,
+                        help='Probabilidad de respuestas de la IA cortadas (como al agotar max_tokens)')
+    parser.add_argument('--search-latency-ms', type=float, default=150, help='Mediana de latencia de Unsplash simulado')
+    parser.add_argument('--search-error-rate', type=float, default=0.0, help='Probabilidad de error 500 de Unsplash')
+    parser.add_argument('--search-429-rate', type=float, default=0.0, help='Probabilidad de 429 de Unsplash')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Segundos en el header Retry-After de los 429')
+
+    parser.add_argument('--output', help='Guardar los resultados en este JSON')
+    parser.add_argument('--baseline', help='JSON de un baseline guardado; termina con error si hay regresiones')
+    parser.add_argument('--save-baseline', help='Guardar los resultados como nuevo baseline en este JSON')
+    parser.add_argument('--throughput-tolerance', type=float, default=DEFAULT_THROUGHPUT_TOLERANCE)
+    parser.add_argument('--rss-tolerance', type=float, default=DEFAULT_RSS_TOLERANCE)
+    parser.add_argument('--calls-tolerance', type=float, default=DEFAULT_CALLS_TOLERANCE)
+    args = parser.parse_args()
+
+    sizes = parse_int_list(args.rows)
+    worker_levels = parse_int_list(args.workers)
+    extra_args = shlex.split(args.args)
+
+    chat = EndpointBehavior(latency_ms=args.llm_latency_ms, latency_sigma=args.llm_latency_sigma,
+                            error_rate=args.llm_error_rate, throttle_rate=args.llm_429_rate,
+                            max_rps=args.llm_max_rps, retry_after=args.retry_after,
+                            truncate_rate=args.llm_truncate_rate)
+    search = EndpointBehavior(latency_ms=args.search_latency_ms, latency_sigma=0.3,
+                              error_rate=args.search_error_rate, throttle_rate=args.search_429_rate,
+                              retry_after=args.retry_after)
+
+    results = []
+    with StandinServer(chat=chat, search=search, seed=args.seed) as server:
+        print(f"🧪 APIs simuladas en {server.base_url}")
+        for rows in sizes:
+            print(f"📄 Preparando archivo sintético de {rows} filas...")
+            input_path = ensure_synthetic_file(args.work_dir, rows, args.seed, args.format, args.duplicate_ratio)
+            for workers in worker_levels:
+                print(f"⏱️  {rows} filas, {workers} workers...")
+                result = run_case(server, input_path, rows, workers, args.work_dir, extra_args)
+                results.append(result)
+                print(f"   {result['rows_per_second']:.1f} filas/s, {result['peak_rss_mb']:.1f} MB, "
+                      f"{result['calls_per_row']:.3f} llamadas/fila")
+
+    print_report(results)
+    report = {
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": sys.version.split()[0],
+        "script_args": extra_args,
+        "standin": {"chat": vars(chat), "search": vars(search)},
+        "cases": results,
+    }
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Resultados guardados en {path}")
+
+    failed = [result for result in results if result['exit_code'] != 0]
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.throughput_tolerance,
+                                            args.rss_tolerance, args.calls_tolerance)
+        if regressions:
+            print("\n❌ Regresiones contra el baseline:")
+            for message in regressions:
+                print(f"   - {message}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones contra el baseline")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
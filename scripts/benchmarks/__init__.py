@@ -0,0 +1,4 @@
+"""
+Herramientas de benchmark para scripts/enrich_products_with_ai.py
+(servidores locales que imitan las APIs externas y datos sintéticos)
+"""
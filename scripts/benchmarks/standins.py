@@ -0,0 +1,368 @@
+"""
+Servidores HTTP locales que imitan las APIs externas del enriquecimiento.
+
+- POST /v1/chat/completions: respuesta con la forma de OpenAI; el contenido es
+  un JSON válido para el prompt recibido (un objeto, o un arreglo con los ids
+  de un lote) y `usage` con tokens estimados (4 caracteres por token). Imita
+  el caché de prompts de OpenAI: `usage.prompt_tokens_details.cached_tokens`
+  es el prefijo más largo ya recibido antes, desde 1024 tokens y en bloques
+  de 128.
+- GET /search/photos: respuesta con la forma de Unsplash que apunta a
+  /images/<n>.jpg, también servidas aquí (JPEG real, para la verificación).
+- POST /api/catalog/products/<id>/branch-availability: valida el cuerpo como
+  `BulkUpdateProductBranchAvailabilityDto` (400 con campos inválidos o de más)
+  y guarda el estado por producto y sucursal.
+
+La latencia sigue una distribución log-normal configurable y se pueden
+inyectar errores 5xx, respuestas 429 (por probabilidad o por límite de
+requests por segundo, con su header Retry-After) y contenido cortado como
+cuando se agota max_tokens.
+"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Dict, List, Optional, Set
+from urllib.parse import parse_qs, urlparse
+
+# Ids de los productos dentro del prompt de lote: {"id": 3, "producto": ...}
+BATCH_ID_PATTERN = re.compile(r'^\{"id": (\d+),', re.MULTILINE)
+BRANCH_AVAILABILITY_PATH = re.compile(r'^/api/catalog/products/([^/]+)/branch-availability$')
+UUID_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.IGNORECASE)
+AVAILABILITY_FIELDS = {'branch_id', 'is_enabled', 'price', 'stock', 'classification_id', 'classification_ids'}
+PRODUCT_TYPES = ('refaccion', 'accesorio', 'fluido')
+IMAGE_VARIANTS = 50
+# Caché de prompts: prefijo mínimo y granularidad en tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class EndpointBehavior:
+    """Comportamiento de un endpoint; las latencias en milisegundos"""
+    latency_ms: float = 0.0        # mediana
+    latency_sigma: float = 0.0     # dispersión log-normal (0 = latencia fija)
+    error_rate: float = 0.0        # probabilidad de responder 500
+    throttle_rate: float = 0.0     # probabilidad de responder 429
+    max_rps: Optional[float] = None  # con más requests por segundo se responde 429
+    retry_after: float = 1.0
+    truncate_rate: float = 0.0     # probabilidad de cortar el contenido (finish_reason "length")
+
+    def sample_latency(self, rng: random.Random) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return self.latency_ms / 1000
+        return rng.lognormvariate(math.log(self.latency_ms), self.latency_sigma) / 1000
+
+
+@dataclass
+class StandinStats:
+    requests: Dict[str, int] = field(default_factory=dict)
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+    def snapshot(self) -> Dict:
+        return {"requests": dict(self.requests), "statuses": dict(self.statuses)}
+
+
+def _placeholder_jpeg(index: int) -> bytes:
+    """JPEG de 400x300 distinto por índice (para que los hashes no coincidan)"""
+    from PIL import Image, ImageDraw
+    image = Image.new('RGB', (400, 300), (230, 230, 230))
+    draw = ImageDraw.Draw(image)
+    rng = random.Random(index)
+    for _ in range(6):
+        x, y = rng.randrange(0, 350), rng.randrange(0, 250)
+        draw.rectangle([x, y, x + rng.randrange(20, 120), y + rng.randrange(20, 120)],
+                       fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def availability_errors(body) -> List[str]:
+    """Errores de validación como los del ValidationPipe del backend (whitelist estricta)"""
+    if not isinstance(body, dict) or not isinstance(body.get('availabilities'), list):
+        return ["availabilities must be an array"]
+    errors = [f"property {key} should not exist" for key in body if key != 'availabilities']
+    for position, entry in enumerate(body['availabilities']):
+        prefix = f"availabilities.{position}"
+        if not isinstance(entry, dict):
+            errors.append(f"{prefix} must be an object")
+            continue
+        errors.extend(f"{prefix}.property {key} should not exist" for key in entry if key not in AVAILABILITY_FIELDS)
+        if not UUID_PATTERN.match(str(entry.get('branch_id', ''))):
+            errors.append(f"{prefix}.branch_id must be a UUID")
+        if not isinstance(entry.get('is_enabled'), bool):
+            errors.append(f"{prefix}.is_enabled must be a boolean value")
+        for key in ('price', 'stock'):
+            value = entry.get(key)
+            if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0):
+                errors.append(f"{prefix}.{key} must not be less than 0")
+        ids = entry.get('classification_ids')
+        if ids is not None and (not isinstance(ids, list) or not all(UUID_PATTERN.match(str(i)) for i in ids)):
+            errors.append(f"{prefix}.each value in classification_ids must be a UUID")
+    return errors
+
+
+def _enrichment_object(product_id: Optional[int] = None) -> Dict:
+    data = {
+        "description": "Producto sintético para benchmark. Compatible con varios modelos.",
+        "product_type": PRODUCT_TYPES[(product_id or 0) % len(PRODUCT_TYPES)],
+        "suggested_category": "General",
+        "technical_specs": {"marca_compatible": "GM", "modelos_compatibles": "", "años_compatibles": "",
+                            "especificaciones": ""},
+        "search_keywords": ["refaccion", "auto"],
+    }
+    if product_id is not None:
+        data = {"id": product_id, **data}
+    return data
+
+
+class StandinServer:
+    """Servidor con todos los endpoints en un hilo de fondo; usar como context manager"""
+
+    def __init__(self, chat: Optional[EndpointBehavior] = None, search: Optional[EndpointBehavior] = None,
+                 images: Optional[EndpointBehavior] = None, products: Optional[EndpointBehavior] = None,
+                 host: str = '127.0.0.1', port: int = 0, seed: int = 0,
+                 known_products: Optional[Set[str]] = None):
+        self.behaviors = {
+            'chat': chat or EndpointBehavior(),
+            'search': search or EndpointBehavior(),
+            'images': images or EndpointBehavior(),
+            'products': products or EndpointBehavior(),
+        }
+        # Productos que existen (None = todos); los demás responden 404
+        self.known_products = known_products
+        # producto -> sucursal -> último elemento recibido
+        self.branch_availability: Dict[str, Dict[str, Dict]] = {}
+        self.stats = StandinStats()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._windows: Dict[str, list] = {name: [] for name in self.behaviors}
+        self._images: Dict[int, bytes] = {}
+        # Hashes de los prefijos de prompt ya recibidos (caché de prompts)
+        self._prompt_prefixes: Set[bytes] = set()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def openai_base_url(self) -> str:
+        return f"{self.base_url}/v1"
+
+    @property
+    def unsplash_search_url(self) -> str:
+        return f"{self.base_url}/search/photos"
+
+    @property
+    def api_base_url(self) -> str:
+        return f"{self.base_url}/api"
+
+    def start(self) -> 'StandinServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = StandinStats()
+
+    def _decide(self, endpoint: str):
+        """(latencia s, código de error o None) para un request"""
+        behavior = self.behaviors[endpoint]
+        with self._lock:
+            self.stats.requests[endpoint] = self.stats.requests.get(endpoint, 0) + 1
+            latency = behavior.sample_latency(self._rng)
+            status = None
+            if behavior.max_rps:
+                now = time.monotonic()
+                window = self._windows[endpoint]
+                while window and now - window[0] > 1.0:
+                    window.pop(0)
+                if len(window) >= behavior.max_rps:
+                    status = 429
+                else:
+                    window.append(now)
+            roll = self._rng.random()
+            if status is None and roll < behavior.throttle_rate:
+                status = 429
+            elif status is None and roll < behavior.throttle_rate + behavior.error_rate:
+                status = 500
+            key = f"{endpoint}:{status or 200}"
+            self.stats.statuses[key] = self.stats.statuses.get(key, 0) + 1
+        return latency, status
+
+    def _cached_tokens(self, prompt: str) -> int:
+        """Tokens del prefijo más largo de `prompt` ya visto en requests anteriores; registra sus prefijos"""
+        cached = 0
+        with self._lock:
+            for tokens in range(PROMPT_CACHE_MIN_TOKENS, len(prompt) // CHARS_PER_TOKEN + 1, PROMPT_CACHE_INCREMENT):
+                key = hashlib.sha1(prompt[:tokens * CHARS_PER_TOKEN].encode('utf-8')).digest()
+                if key in self._prompt_prefixes:
+                    cached = tokens
+                else:
+                    self._prompt_prefixes.add(key)
+        return cached
+
+    def _image_bytes(self, index: int) -> bytes:
+        with self._lock:
+            data = self._images.get(index)
+        if data is None:
+            data = _placeholder_jpeg(index)
+            with self._lock:
+                self._images[index] = data
+        return data
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = 'application/json',
+                      headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _fail(self, endpoint: str, status: int):
+                retry_after = standin.behaviors[endpoint].retry_after
+                body = json.dumps({"error": {"message": "stand-in error", "type": "server_error"}}).encode()
+                self._send(status, body, headers={'Retry-After': f"{retry_after:g}"} if status == 429 else None)
+
+            def _branch_availability(self, product_id: str, payload: bytes):
+                latency, status = standin._decide('products')
+                time.sleep(latency)
+                if status:
+                    self._fail('products', status)
+                    return
+                if standin.known_products is not None and product_id not in standin.known_products:
+                    self._send(404, json.dumps({"statusCode": 404, "message": "Producto no encontrado"}).encode())
+                    return
+                try:
+                    body = json.loads(payload or b'{}')
+                except ValueError:
+                    body = None
+                errors = availability_errors(body)
+                if errors:
+                    self._send(400, json.dumps({"statusCode": 400, "message": errors,
+                                                "error": "Bad Request"}).encode())
+                    return
+                with standin._lock:
+                    branches = standin.branch_availability.setdefault(product_id, {})
+                    for entry in body['availabilities']:
+                        if entry['is_enabled']:
+                            branches[entry['branch_id']] = entry
+                        else:
+                            # Como el backend: deshabilitar borra el registro de la sucursal
+                            branches.pop(entry['branch_id'], None)
+                    current = list(branches.values())
+                self._send(200, json.dumps({"availabilities": current}).encode())
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = self.rfile.read(length)
+                branch_match = BRANCH_AVAILABILITY_PATH.match(urlparse(self.path).path)
+                if branch_match:
+                    self._branch_availability(branch_match.group(1), payload)
+                    return
+                if not urlparse(self.path).path.endswith('/chat/completions'):
+                    self._send(404, b'{}')
+                    return
+                latency, status = standin._decide('chat')
+                time.sleep(latency)
+                if status:
+                    self._fail('chat', status)
+                    return
+
+                request = json.loads(payload or b'{}')
+                prompt = request.get('messages', [{}])[-1].get('content', '')
+                ids = [int(match) for match in BATCH_ID_PATTERN.findall(prompt)]
+                if ids:
+                    content = json.dumps([_enrichment_object(product_id) for product_id in ids], ensure_ascii=False)
+                else:
+                    content = json.dumps(_enrichment_object(), ensure_ascii=False)
+                finish_reason = "stop"
+                with standin._lock:
+                    truncate_at = (standin._rng.randrange(1, len(content))
+                                   if standin._rng.random() < standin.behaviors['chat'].truncate_rate else None)
+                if truncate_at:
+                    content, finish_reason = content[:truncate_at], "length"
+                full_prompt = "\n".join(m.get('content', '') for m in request.get('messages', []))
+                prompt_tokens = sum(len(m.get('content', '')) for m in request.get('messages', [])) // 4 + 1
+                cached_tokens = standin._cached_tokens(full_prompt)
+                completion_tokens = len(content) // 4 + 1
+                body = json.dumps({
+                    "id": "chatcmpl-standin",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get('model', 'standin'),
+                    "choices": [{"index": 0, "finish_reason": finish_reason,
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens,
+                              "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+                }).encode()
+                self._send(200, body)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path.endswith('/search/photos'):
+                    latency, status = standin._decide('search')
+                    time.sleep(latency)
+                    if status:
+                        self._fail('search', status)
+                        return
+                    query = parse_qs(parsed.query).get('query', [''])[0]
+                    index = sum(query.encode()) % IMAGE_VARIANTS
+                    body = json.dumps({"total": 1, "results": [
+                        {"urls": {"regular": f"{standin.base_url}/images/{index}.jpg"}}
+                    ]}).encode()
+                    self._send(200, body)
+                elif parsed.path.startswith('/images/'):
+                    latency, status = standin._decide('images')
+                    time.sleep(latency)
+                    if status:
+                        self._fail('images', status)
+                        return
+                    try:
+                        index = int(parsed.path.rsplit('/', 1)[1].split('.')[0])
+                    except ValueError:
+                        self._send(404, b'{}')
+                        return
+                    self._send(200, standin._image_bytes(index), content_type='image/jpeg')
+                else:
+                    self._send(404, b'{}')
+
+        return Handler
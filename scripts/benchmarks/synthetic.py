@@ -0,0 +1,69 @@
+"""
+Archivos de existencias sintéticos (mismas columnas que data/gm/existencias.xlsx).
+
+Los nombres combinan piezas y complementos reales de autopartes y una parte de
+las filas repite un número de parte anterior, como pasa en los archivos reales
+(una fila por ubicación), para ejercitar la deduplicación.
+"""
+
+import csv
+import os
+import random
+
+import openpyxl
+
+HEADERS = ['No. de Parte', 'DESCRIPCION', 'EXISTENCIAS', 'PRECIO']
+
+PARTS = [
+    'BOMBA AGUA', 'FILTRO ACEITE', 'FILTRO AIRE', 'BALATA DELANTERA', 'DISCO FRENO', 'BUJIA', 'SENSOR OXIGENO',
+    'BANDA ACCESORIOS', 'MANGUERA RADIADOR', 'AMORTIGUADOR', 'ROTULA', 'TERMINAL DIRECCION', 'ALTERNADOR',
+    'MARCHA', 'BATERIA', 'RADIADOR', 'TERMOSTATO', 'EMBRAGUE', 'JUNTA TAPA PUNTERIAS', 'TUERCA AMORTIGUADOR',
+    'ACEITE MOTOR 5W30', 'ANTICONGELANTE', 'LIQUIDO FRENOS', 'TAPETE', 'FUNDA VOLANTE', 'ALARMA', 'LAMP',
+    'LLANTA 265/70R17', 'ESPEJO LATERAL', 'FARO', 'CALAVERA', 'SOPORTE MOTOR', 'EMPAQUE', 'BASE', 'TORNILLO',
+]
+QUALIFIERS = ['', 'DER', 'IZQ', 'DEL', 'TRAS', 'SUP', 'INF', 'CROMADO', 'ORIGINAL', 'KIT', 'C/SENSOR']
+
+
+def synthetic_rows(rows: int, seed: int = 42, duplicate_ratio: float = 0.1):
+    """Genera (número de parte, descripción, existencias, precio)"""
+    rng = random.Random(seed)
+    emitted = []
+    for _ in range(rows):
+        if emitted and rng.random() < duplicate_ratio:
+            part_number, description = rng.choice(emitted[-1000:])
+        else:
+            part_number = rng.randrange(10000, 99999999)
+            description = f"{rng.choice(PARTS)} {rng.choice(QUALIFIERS)}".strip()
+            emitted.append((part_number, description))
+        stock = rng.choice([0, 1, 1, 2, 4, 10])
+        price = round(rng.lognormvariate(6, 1.2), 5)
+        yield part_number, description, stock, price
+
+
+def synthetic_path(directory: str, rows: int, seed: int, file_format: str) -> str:
+    return os.path.join(directory, f"existencias_{rows}_{seed}.{file_format}")
+
+
+def ensure_synthetic_file(directory: str, rows: int, seed: int = 42, file_format: str = 'xlsx',
+                          duplicate_ratio: float = 0.1) -> str:
+    """Crea el archivo si no existe (mismos parámetros = mismo contenido) y retorna su ruta"""
+    os.makedirs(directory, exist_ok=True)
+    path = synthetic_path(directory, rows, seed, file_format)
+    if os.path.exists(path):
+        return path
+
+    tmp_path = f"{path}.tmp"
+    if file_format == 'csv':
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADERS)
+            writer.writerows(synthetic_rows(rows, seed, duplicate_ratio))
+    else:
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet('Existencias')
+        ws.append(HEADERS)
+        for row in synthetic_rows(rows, seed, duplicate_ratio):
+            ws.append(row)
+        wb.save(tmp_path)
+    os.replace(tmp_path, path)
+    return path
@@ -9,21 +9,58 @@ Requisitos:
 
 Uso:
     python scripts/enrich_products_with_ai.py --input productos.xlsx --output productos_completos.xlsx
+    python scripts/enrich_products_with_ai.py --input productos.xlsx --workers 8 --rpm 500 --tpm 200000
 """
 
 import pandas as pd
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
 import json
 import os
 import sys
 import argparse
+import cProfile
+import pstats
 import time
-from typing import Dict, Optional, List
-import requests
-from io import BytesIO
-from PIL import Image
+from typing import Dict, Iterable, Iterator, Optional, List
+
+from enrichment.rate_limit import RateLimiter
+from enrichment.batch_files import (
+    batch_custom_id, build_batch_request, identity_hash, read_batch_results, write_batch_requests
+)
+from enrichment.breaker import (
+    DEFAULT_FAILURE_THRESHOLD, DEFAULT_RESET_TIMEOUT, CircuitBreaker, Deadline, ProviderUnavailable,
+    is_provider_failure, parse_duration
+)
+from enrichment.cache import (
+    EnrichmentCache, ImageSearchCache, prompt_version, DEFAULT_CACHE_DIR, DEFAULT_TTL_DAYS, DEFAULT_MAX_ENTRIES,
+    DEFAULT_IMAGE_TTL_DAYS, DEFAULT_IMAGE_NEGATIVE_TTL_DAYS, CACHE_MODE_USE, CACHE_MODE_REFRESH
+)
+from enrichment.classifier import Classification, KeywordClassifier
+from enrichment.dedup import DedupIndex
+from enrichment.delta import DEFAULT_PRICE_TOLERANCE, default_delta_path, export_stock_delta, rows_per_second
+from enrichment.derivatives import DEFAULT_PRIMARY_VARIANT, DEFAULT_STORAGE_PREFIX, DEFAULT_VARIANTS, DerivativeGenerator
+from enrichment.http import DEFAULT_MAX_RETRIES, HttpClient
+from enrichment.images import (
+    IMAGE_OK, DEFAULT_IMAGE_WORKERS, DEFAULT_MIN_WIDTH, ContentAddressedStore, ImageCheck, ImageVerifier,
+    SharedImageIndex
+)
+from enrichment.pipeline import DEFAULT_QUEUE_SIZE, Stage, StagePipeline, parse_stage_workers
+from enrichment.profiling import DEFAULT_SLOWEST_ROWS, Profiler
+from enrichment.prompts import PromptRegistry, PromptTemplate, load_field_config
+from enrichment.metrics import OP_IMAGE_SEARCH, OP_LLM, OP_ROW, MetricsCollector
+from enrichment.incremental import IncrementalIndex, carry_forward, load_previous
+from enrichment.journal import RunJournal, RetryQueue, row_key
+from enrichment.reader import DEFAULT_CHUNK_SIZE, InputReader, InputRecord, format_text, parse_number
+from enrichment.results import EnrichmentResultStore
+from enrichment.schema import (
+    ENRICHMENT_FIELDS, TECHNICAL_SPEC_FIELDS, batch_schema, compile_validator, enrichment_schema, fill_defaults, max_tokens_for,
+    repair_truncated_json, response_format
+)
+from enrichment.routing import (
+    DEFAULT_MIN_CONFIDENCE, DEFAULT_MIN_MATCHES, ROUTE_CACHE, ROUTE_LLM, ConfidenceRouter, load_part_rules
+)
+from enrichment.storage import STORAGE_ADAPTERS, create_storage
+from enrichment.vectorized import enrich_basic_frame, frame_rows
+from enrichment.writer import EXCEL_MAX_ROWS, EnrichedWorkbookWriter
 
 # Intentar importar OpenAI (opcional)
 try:
@@ -33,19 +70,6 @@ except ImportError:
     OPENAI_AVAILABLE = False
     print("⚠️  OpenAI no está disponible. Instala con: pip install openai")
 
-# Configuración de estilos para Excel
-HEADER_FILL = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-HEADER_FONT = Font(bold=True, color="FFFFFF", size=11)
-SUCCESS_FILL = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-WARNING_FILL = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-ERROR_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-BORDER = Border(
-    left=Side(style='thin'),
-    right=Side(style='thin'),
-    top=Side(style='thin'),
-    bottom=Side(style='thin')
-)
-
 # Tipos de producto válidos
 VALID_PRODUCT_TYPES = [
     'refaccion',
@@ -59,7 +83,11 @@ VALID_PRODUCT_TYPES = [
 PRODUCT_TYPE_KEYWORDS = {
     'refaccion': ['filtro', 'pastilla', 'disco', 'bujía', 'sensor', 'correa', 'manguera', 
                   'amortiguador', 'rotula', 'terminal', 'alternador', 'arrancador', 'batería',
-                  'radiador', 'termostato', 'bomba', 'embrague', 'junta', 'componente'],
+                  'radiador', 'termostato', 'bomba', 'embrague', 'junta', 'componente',
+                  'perno', 'tuerca', 'tornillo', 'retenedor', 'reten', 'sujetador', 'roldana', 'rondana',
+                  'llanta', 'tapon', 'empaque', 'soporte', 'buje', 'abrazadera', 'balata', 'sello',
+                  'cojinete', 'brazo', 'tubo', 'tirante', 'mecanismo', 'tanque', 'cilindro', 'rotor',
+                  'válvula', 'tensor', 'bobina', 'interruptor', 'módulo', 'eje', 'bisagra', 'manija'],
     'accesorio': ['audio', 'bocina', 'pantalla', 'led', 'alarma', 'cámara', 'spoiler', 
                   'alerón', 'calcomanía', 'vinilo', 'tapete', 'funda', 'organizador',
                   'portaequipaje', 'remolque', 'portabicicleta'],
@@ -69,46 +97,17 @@ PRODUCT_TYPE_KEYWORDS = {
     'fluido': ['aceite', 'líquido', 'liquido', 'refrigerante', 'aditivo', 'lubricante', 'fluido']
 }
 
-class ProductEnricher:
-    """Clase para enriquecer productos con IA"""
-    
-    def __init__(self, openai_api_key: Optional[str] = None, unsplash_api_key: Optional[str] = None):
-        self.openai_client = None
-        self.unsplash_api_key = unsplash_api_key or os.getenv('UNSPLASH_ACCESS_KEY')
-        
-        if OPENAI_AVAILABLE and openai_api_key:
-            self.openai_client = OpenAI(api_key=openai_api_key)
-        elif OPENAI_AVAILABLE:
-            # Intentar obtener de variable de entorno
-            api_key = os.getenv('OPENAI_API_KEY')
-            if api_key:
-                self.openai_client = OpenAI(api_key=api_key)
-    
-    def detect_product_type(self, name: str, part_number: str = "") -> str:
-        """Detecta el tipo de producto basado en el nombre y número de parte"""
-        text = f"{name} {part_number}".lower()
-        
-        # Contar coincidencias por tipo
-        scores = {}
-        for product_type, keywords in PRODUCT_TYPE_KEYWORDS.items():
-            score = sum(1 for keyword in keywords if keyword in text)
-            if score > 0:
-                scores[product_type] = score
-        
-        if scores:
-            # Retornar el tipo con mayor score
-            return max(scores, key=scores.get)
-        
-        # Por defecto, asumir refacción
-        return 'refaccion'
-    
-    def enrich_with_ai(self, name: str, part_number: str = "", price: float = 0) -> Dict:
-        """Enriquece un producto usando IA"""
-        if not self.openai_client:
-            return self._enrich_basic(name, part_number, price)
-        
-        try:
-            prompt = f"""Eres un experto en autopartes y productos automotrices. 
+def estimate_tokens(text: str) -> int:
+    """Estimación aproximada de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
+
+
+# Parámetros de la llamada a OpenAI
+AI_MODEL = "gpt-4o-mini"  # Usar modelo más económico
+AI_TEMPERATURE = 0.7
+AI_MAX_TOKENS = 500
+AI_SYSTEM_PROMPT = "Eres un experto en autopartes. Responde siempre en formato JSON válido."
+AI_PROMPT_TEMPLATE = """Eres un experto en autopartes y productos automotrices. 
 Analiza el siguiente producto y proporciona información detallada en formato JSON:
 
 Producto: {name}
@@ -131,41 +130,496 @@ Proporciona la siguiente información en formato JSON válido:
 
 Responde SOLO con el JSON, sin texto adicional."""
 
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",  # Usar modelo más económico
-                messages=[
-                    {"role": "system", "content": "Eres un experto en autopartes. Responde siempre en formato JSON válido."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=500
-            )
-            
-            content = response.choices[0].message.content.strip()
-            
-            # Limpiar el contenido si tiene markdown
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-            
-            data = json.loads(content)
-            
-            # Validar y completar datos
-            if 'product_type' not in data or data['product_type'] not in VALID_PRODUCT_TYPES:
-                data['product_type'] = self.detect_product_type(name, part_number)
+# Prompt para varios productos en un solo request: instrucciones fijas primero, productos al final
+AI_BATCH_MAX_TOKENS = 16000
+# Timeout máximo de un request a OpenAI cuando hay fecha límite (--deadline)
+AI_REQUEST_TIMEOUT = 60
+AI_BATCH_PROMPT_TEMPLATE = """Eres un experto en autopartes y productos automotrices.
+Analiza cada uno de los productos listados al final y proporciona información detallada.
+
+Responde con un arreglo JSON válido con exactamente un objeto por producto, en el mismo orden.
+Cada objeto debe tener esta forma:
+{{
+    "id": <el mismo id numérico del producto>,
+    "description": "Descripción detallada del producto (2-4 oraciones)",
+    "product_type": "refaccion|accesorio|servicio_instalacion|servicio_mantenimiento|fluido",
+    "suggested_category": "Categoría sugerida basada en el tipo de producto",
+    "technical_specs": {{
+        "marca_compatible": "Marcas de vehículos compatibles (si aplica)",
+        "modelos_compatibles": "Modelos de vehículos compatibles (si aplica)",
+        "años_compatibles": "Rango de años compatibles (si aplica)",
+        "especificaciones": "Otras especificaciones técnicas relevantes"
+    }},
+    "search_keywords": ["palabra1", "palabra2", "palabra3"]
+}}
+
+Responde SOLO con el arreglo JSON, sin texto adicional.
+
+Productos ({count}):
+{products}"""
+
+# Prompt para volver a pedir solo los campos inválidos o faltantes de una respuesta
+AI_FIELD_INSTRUCTIONS = {
+    "description": '"description": "Descripción detallada del producto (2-4 oraciones)"',
+    "product_type": '"product_type": "refaccion|accesorio|servicio_instalacion|servicio_mantenimiento|fluido"',
+    "suggested_category": '"suggested_category": "Categoría sugerida basada en el tipo de producto"',
+    "technical_specs": '"technical_specs": {"marca_compatible": "", "modelos_compatibles": "", '
+                       '"años_compatibles": "", "especificaciones": ""}',
+    "search_keywords": '"search_keywords": ["palabra1", "palabra2", "palabra3"]',
+}
+AI_FIELDS_PROMPT_TEMPLATE = """Eres un experto en autopartes y productos automotrices.
+Completa únicamente los siguientes campos del producto indicado al final, en un objeto JSON válido:
+{fields}
+
+Responde SOLO con el JSON, sin texto adicional.
+
+Producto: {name}
+Número de Parte: {part_number}
+Precio: ${price:.2f}"""
+
+# Esquema de la respuesta: se envía como response_format con --structured-output
+# y siempre se usa para validar (validador compilado una sola vez)
+AI_RESPONSE_SCHEMA = enrichment_schema(VALID_PRODUCT_TYPES)
+AI_BATCH_RESPONSE_SCHEMA = batch_schema(VALID_PRODUCT_TYPES)
+AI_STRUCTURED_MAX_TOKENS = max_tokens_for(ENRICHMENT_FIELDS)
+validate_enrichment = compile_validator(AI_RESPONSE_SCHEMA)
+
+# Identifica la versión del prompt para invalidar el caché cuando cambie
+PROMPT_VERSION = prompt_version(AI_MODEL, AI_TEMPERATURE, AI_MAX_TOKENS, AI_SYSTEM_PROMPT, AI_PROMPT_TEMPLATE)
+BATCH_PROMPT_VERSION = prompt_version(AI_MODEL, AI_TEMPERATURE, AI_SYSTEM_PROMPT, AI_BATCH_PROMPT_TEMPLATE)
+
+
+def strip_code_fences(content: str) -> str:
+    """Limpia el contenido si viene envuelto en bloques de código markdown"""
+    content = (content or "").strip()
+    if content.startswith("```json"):
+        content = content[7:]
+    if content.startswith("```"):
+        content = content[3:]
+    if content.endswith("```"):
+        content = content[:-3]
+    return content.strip()
+
+
+def parse_batch_response(content: str) -> Dict[int, Dict]:
+    """
+    Convierte la respuesta de un lote en {id: objeto}; ignora elementos sin id.
+    Una respuesta cortada conserva los elementos completos (lanza JSONDecodeError
+    si no hay nada recuperable).
+    """
+    data = repair_truncated_json(strip_code_fences(content))
+    if data is None:
+        raise json.JSONDecodeError("Respuesta de lote irrecuperable", content or "", 0)
+    if isinstance(data, dict):
+        # Algunos modelos envuelven el arreglo en un objeto
+        data = next((value for value in data.values() if isinstance(value, list)), [])
+    
+    elements = {}
+    for element in data if isinstance(data, list) else []:
+        if isinstance(element, dict):
+            try:
+                elements[int(element.get('id'))] = element
+            except (TypeError, ValueError):
+                continue
+    return elements
+
+
+# Configuración de campos por tipo de producto (catalog.product_type_field_config) para las plantillas de prompt
+DEFAULT_FIELD_CONFIG = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'database', 'agora', 'migration_product_types_refacciones.sql'
+))
+
+# Búsqueda de imágenes (la variable de entorno permite apuntar a un servidor de pruebas)
+UNSPLASH_SEARCH_URL = os.getenv('UNSPLASH_SEARCH_URL', "https://api.unsplash.com/search/photos")
+
+# Clasificador compilado una sola vez (sin acentos, con límites de palabra)
+# Los fluidos suelen venir pegados a la siguiente palabra ("ACEITEMINERAL-20W50")
+PRODUCT_TYPE_CLASSIFIER = KeywordClassifier(PRODUCT_TYPE_KEYWORDS, default_type='refaccion', prefix_types=('fluido',))
+
+
+class ProductEnricher:
+    """Clase para enriquecer productos con IA"""
+    
+    def __init__(self, openai_api_key: Optional[str] = None, unsplash_api_key: Optional[str] = None,
+                 rate_limiter: Optional[RateLimiter] = None, cache: Optional[EnrichmentCache] = None,
+                 http: Optional[HttpClient] = None, image_cache: Optional[ImageSearchCache] = None,
+                 metrics: Optional[MetricsCollector] = None, profiler: Optional[Profiler] = None,
+                 router: Optional[ConfidenceRouter] = None, structured_output: bool = False,
+                 prompts: Optional[PromptRegistry] = None, llm_breaker: Optional[CircuitBreaker] = None,
+                 image_breaker: Optional[CircuitBreaker] = None, deadline: Optional[Deadline] = None):
+        self.openai_client = None
+        self.unsplash_api_key = unsplash_api_key or os.getenv('UNSPLASH_ACCESS_KEY')
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.http = http or HttpClient()
+        self.image_cache = image_cache
+        self.image_quota_exhausted = False
+        self.metrics = metrics or MetricsCollector(model=AI_MODEL)
+        self.profiler = profiler or Profiler(enabled=False)
+        self.router = router
+        # Enviar el esquema JSON como response_format (structured outputs)
+        self.structured_output = structured_output
+        # Plantillas por tipo de producto (None = prompt general con todos los campos)
+        self.prompts = prompts
+        # Con el proveedor caído o pasada la fecha límite, las filas se posponen sin esperar a la red
+        self.llm_breaker = llm_breaker
+        self.image_breaker = image_breaker
+        self.deadline = deadline
+        
+        if OPENAI_AVAILABLE and openai_api_key:
+            self.openai_client = OpenAI(api_key=openai_api_key)
+        elif OPENAI_AVAILABLE:
+            # Intentar obtener de variable de entorno
+            api_key = os.getenv('OPENAI_API_KEY')
+            if api_key:
+                self.openai_client = OpenAI(api_key=api_key)
+    
+    def detect_product_type(self, name: str, part_number: str = "") -> str:
+        """Detecta el tipo de producto basado en el nombre y número de parte"""
+        # Sin coincidencias, el clasificador asume refacción
+        return PRODUCT_TYPE_CLASSIFIER.classify(name, part_number).product_type
+    
+    def classify_product(self, name: str, part_number: str = "") -> Classification:
+        """Tipo de producto con puntajes por tipo y confianza (0-1)"""
+        return PRODUCT_TYPE_CLASSIFIER.classify(name, part_number)
+    
+    def prompt_template(self, name: str, part_number: str = "") -> Optional[PromptTemplate]:
+        """Plantilla del tipo que sugiere el clasificador (la IA puede corregir el tipo)"""
+        if not self.prompts:
+            return None
+        return self.prompts.get(self.detect_product_type(name, part_number))
+    
+    @property
+    def prompt_version(self) -> str:
+        return self.prompts.version if self.prompts else PROMPT_VERSION
+    
+    @property
+    def batch_prompt_version(self) -> str:
+        return self.prompts.version if self.prompts else BATCH_PROMPT_VERSION
+    
+    def enrich_with_ai(self, name: str, part_number: str = "", price: float = 0, route: bool = True) -> Dict:
+        """
+        Enriquece un producto usando IA. Con un router, la fila se resuelve sin IA
+        si una fuente barata tiene suficiente confianza (route=False omite el ruteo,
+        p. ej. al reintentar individualmente una fila que ya se ruteó a la IA).
+        """
+        if not self.openai_client:
+            return self._enrich_basic(name, part_number, price)
+        
+        try:
+            cache_key, cached = self._cached(name, part_number, self.prompt_version, route)
+            if cached is not None:
+                return cached
             
+            if route:
+                routed = self._route(name, part_number, price)
+                if routed is not None:
+                    return routed
+        except Exception as e:
+            print(f"⚠️  Error con IA: {e}")
+            return self._enrich_fallback(name, part_number, price)
+        return self._enrich_single(name, part_number, price, cache_key)
+    
+    def _cached(self, name: str, part_number: str, version: str, route: bool = True):
+        """(llave, resultado guardado o None); sin caché la llave es None"""
+        if not self.cache:
+            return None, None
+        cache_key = EnrichmentCache.make_key(name, part_number, AI_MODEL, version)
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            self.metrics.increment('ai_cache_misses')
+            return cache_key, None
+        self.metrics.increment('ai_cache_hits')
+        if route and self.router:
+            self.router.record(ROUTE_CACHE)
+        cached['source'] = 'cache'
+        return cache_key, cached
+    
+    def _enrich_single(self, name: str, part_number: str = "", price: float = 0,
+                       cache_key: Optional[str] = None) -> Dict:
+        """Un request de IA para un producto (ya sin caché ni ruteo)"""
+        try:
+            template = self.prompt_template(name, part_number)
+            if template:
+                prompt, max_tokens, schema = template.render(name, part_number, price), template.max_tokens, template.schema
+            else:
+                prompt = AI_PROMPT_TEMPLATE.format(name=name, part_number=part_number, price=price)
+                max_tokens = AI_STRUCTURED_MAX_TOKENS if self.structured_output else AI_MAX_TOKENS
+                schema = AI_RESPONSE_SCHEMA
+            content = self._chat_completion(prompt, max_tokens, schema, 'product_enrichment')
+            data = self._parse_single_response(content, name, part_number, price, template)
+            if cache_key and data['source'] == 'ai':
+                self.cache.set(cache_key, data)
             return data
             
-        except json.JSONDecodeError as e:
-            print(f"⚠️  Error parseando JSON de IA: {e}")
-            return self._enrich_basic(name, part_number, price)
+        except ProviderUnavailable:
+            return self._enrich_deferred(name, part_number, price)
         except Exception as e:
             print(f"⚠️  Error con IA: {e}")
-            return self._enrich_basic(name, part_number, price)
+            return self._enrich_fallback(name, part_number, price)
+    
+    def _parse_single_response(self, content: str, name: str, part_number: str = "", price: float = 0,
+                               template: Optional[PromptTemplate] = None) -> Dict:
+        """Convierte la respuesta de un producto en datos validados (reparando un corte al final)"""
+        with self.profiler.span('parse_json'):
+            text = strip_code_fences(content)
+            try:
+                data = json.loads(text)
+            except json.JSONDecodeError:
+                data = repair_truncated_json(text)
+                if data is not None:
+                    self.metrics.increment('llm_repaired')
+        return self._complete_enrichment(data, name, part_number, price, template)
+    
+    def _complete_enrichment(self, data, name: str, part_number: str = "", price: float = 0,
+                             template: Optional[PromptTemplate] = None) -> Dict:
+        """
+        Valida los datos de la IA contra el esquema. Un product_type inválido se
+        corrige con el clasificador; los demás campos inválidos o faltantes se
+        vuelven a pedir (solo esos) y, si aún fallan, se completan en modo básico.
+        Sin descripción válida la fila cuenta como fallo de IA. Con `template` se
+        validan solo los campos que pide su tipo.
+        """
+        validate = template.validate if template else validate_enrichment
+        spec_fields = tuple(template.spec_fields) if template else TECHNICAL_SPEC_FIELDS
+        data = fill_defaults(data if isinstance(data, dict) else {}, spec_fields)
+        invalid = validate(data)
+        if 'product_type' in invalid:
+            data['product_type'] = self.detect_product_type(name, part_number)
+            invalid.remove('product_type')
+        
+        if invalid and self.openai_client:
+            self.metrics.increment('llm_field_requests')
+            self.metrics.increment('llm_fields_requested', len(invalid))
+            try:
+                fields = self._request_fields(invalid, name, part_number, price, template)
+                for field in invalid:
+                    if field in fields:
+                        data[field] = fields[field]
+                invalid = [field for field in validate(fill_defaults(data, spec_fields)) if field != 'product_type']
+            except ProviderUnavailable:
+                pass
+            except Exception as e:
+                print(f"⚠️  Error pidiendo campos faltantes a la IA: {e}")
+        
+        data['source'] = 'ai'
+        if invalid:
+            basic = self._enrich_basic(name, part_number, price)
+            for field in invalid:
+                data[field] = basic[field]
+            if 'description' in invalid:
+                self.metrics.increment('fallbacks')
+                data['source'] = 'fallback'
+        return data
+    
+    def _request_fields(self, fields: List[str], name: str, part_number: str = "", price: float = 0,
+                        template: Optional[PromptTemplate] = None) -> Dict:
+        """Pide a la IA solo `fields` del producto, con el tope de tokens justo para ellos"""
+        if template:
+            instructions = [template.instruction(field) for field in fields]
+            schema, max_tokens = template.field_schema(fields), template.field_max_tokens(fields)
+            spec_fields = tuple(template.spec_fields)
+        else:
+            instructions = [AI_FIELD_INSTRUCTIONS[field] for field in fields]
+            schema, max_tokens = enrichment_schema(VALID_PRODUCT_TYPES, fields), max_tokens_for(fields)
+            spec_fields = TECHNICAL_SPEC_FIELDS
+        prompt = AI_FIELDS_PROMPT_TEMPLATE.format(
+            fields="\n".join(instructions), name=name, part_number=part_number, price=float(price or 0)
+        )
+        content = self._chat_completion(prompt, max_tokens, schema, 'product_fields')
+        with self.profiler.span('parse_json'):
+            data = repair_truncated_json(content)
+        return fill_defaults(data, spec_fields) if isinstance(data, dict) else {}
+    
+    def _route(self, name: str, part_number: str = "", price: float = 0) -> Optional[Dict]:
+        """Datos básicos con el tipo decidido por el router, o None si la fila necesita la IA"""
+        if not self.router:
+            return None
+        decision = self.router.route(name, part_number)
+        if decision.route == ROUTE_LLM:
+            return None
+        data = self._enrich_basic(name, part_number, price)
+        data['product_type'] = decision.product_type
+        data['source'] = decision.route
+        return data
+    
+    def build_messages(self, prompt: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": AI_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def enrich_many(self, products: List[tuple]) -> List[Dict]:
+        """
+        Enriquece varios productos (name, part_number, price) en un solo request.
+        Los elementos que la IA no regresa o que no son válidos se reintentan
+        individualmente con `enrich_with_ai`. El resultado conserva el orden de entrada.
+        """
+        results, cache_keys = self.triage_many(products)
+        return self.complete_many(products, results, cache_keys)
+    
+    def triage_many(self, products: List[tuple]):
+        """
+        Resuelve sin IA lo que se pueda (caché, ruteo por confianza).
+        Retorna (resultados con None en los que necesitan la IA, llaves de caché por índice).
+        """
+        if not self.openai_client:
+            return [self.enrich_with_ai(*product) for product in products], {}
+        
+        # Un producto solo se pide con el prompt individual, varios con el de lotes
+        version = self.prompt_version if len(products) <= 1 else self.batch_prompt_version
+        results: List[Optional[Dict]] = [None] * len(products)
+        cache_keys: Dict[int, str] = {}
+        for i, (name, part_number, price) in enumerate(products):
+            try:
+                cache_key, cached = self._cached(name, part_number, version)
+                if cache_key:
+                    cache_keys[i] = cache_key
+                results[i] = cached if cached is not None else self._route(name, part_number, price)
+            except Exception as e:
+                print(f"⚠️  Error con IA: {e}")
+                results[i] = self._enrich_fallback(name, part_number, price)
+        return results, cache_keys
+    
+    def complete_many(self, products: List[tuple], results: List[Optional[Dict]],
+                      cache_keys: Dict[int, str]) -> List[Dict]:
+        """Pide a la IA los productos que `triage_many` dejó sin resolver (en sitio)"""
+        pending = [i for i, result in enumerate(results) if result is None]
+        if len(products) <= 1:
+            for i in pending:
+                results[i] = self._enrich_single(*products[i], cache_key=cache_keys.get(i))
+            return results
+        
+        # Con plantillas por tipo, cada tipo va en su propio request (prefijo compartido)
+        groups: Dict[Optional[str], List[int]] = {}
+        for i in pending:
+            template = self.prompt_template(*products[i][:2])
+            groups.setdefault(template.product_type if template else None, []).append(i)
+        for product_type, indices in groups.items():
+            template = self.prompts.get(product_type) if product_type else None
+            self._enrich_batch(products, indices, results, cache_keys, template)
+        
+        return results
+    
+    def _enrich_batch(self, products: List[tuple], indices: List[int], results: List[Optional[Dict]],
+                      cache_keys: Dict[int, str], template: Optional[PromptTemplate] = None):
+        """Un request con los productos `indices`; completa `results` en sitio"""
+        items = []
+        for i in indices:
+            name, part_number, price = products[i]
+            items.append(json.dumps(
+                {"id": i, "producto": name, "numero_de_parte": part_number, "precio": round(float(price or 0), 2)},
+                ensure_ascii=False
+            ))
+        if template:
+            prompt, per_item, schema = template.render_batch(items), template.max_tokens, template.batch_schema
+        else:
+            prompt = AI_BATCH_PROMPT_TEMPLATE.format(count=len(items), products="\n".join(items))
+            per_item = AI_STRUCTURED_MAX_TOKENS if self.structured_output else AI_MAX_TOKENS
+            schema = AI_BATCH_RESPONSE_SCHEMA
+        max_tokens = min(per_item * len(items), AI_BATCH_MAX_TOKENS)
+        
+        elements = {}
+        unavailable = False
+        try:
+            content = self._chat_completion(prompt, max_tokens, schema, 'product_enrichment_batch')
+            with self.profiler.span('parse_json'):
+                elements = parse_batch_response(content)
+        except ProviderUnavailable:
+            unavailable = True
+        except json.JSONDecodeError as e:
+            print(f"⚠️  Error parseando JSON del lote de IA: {e}")
+        except Exception as e:
+            print(f"⚠️  Error con IA (lote): {e}")
+        
+        for i in indices:
+            if unavailable:
+                results[i] = self._enrich_deferred(*products[i])
+                continue
+            data = elements.get(i)
+            if isinstance(data, dict):
+                # Los campos inválidos de un elemento se vuelven a pedir por separado
+                data.pop('id', None)
+                data = self._complete_enrichment(data, *products[i], template=template)
+                if i in cache_keys and data['source'] == 'ai':
+                    self.cache.set(cache_keys[i], data)
+                results[i] = data
+            else:
+                # Solo los elementos que faltan pagan un request individual completo
+                self.metrics.increment('llm_retries')
+                results[i] = self.enrich_with_ai(*products[i], route=False)
+    
+    def _chat_completion(self, prompt: str, max_tokens: int, schema: Optional[Dict] = None,
+                         schema_name: str = 'response') -> str:
+        """
+        Llama a OpenAI respetando el rate limiter y retorna el contenido sin markdown.
+        Con structured_output, `schema` se envía como response_format. Lanza
+        ProviderUnavailable sin llamar a la red si el circuito de OpenAI está
+        abierto o ya pasó la fecha límite.
+        """
+        options = {}
+        if self.deadline:
+            self.deadline.check()
+            remaining = self.deadline.remaining()
+            if remaining is not None:
+                options['timeout'] = max(1.0, min(AI_REQUEST_TIMEOUT, remaining))
+        if self.llm_breaker:
+            self.llm_breaker.check()
+        
+        reserved = 0
+        if self.rate_limiter:
+            reserved = self.rate_limiter.acquire(estimate_tokens(AI_SYSTEM_PROMPT + prompt) + max_tokens)
+        
+        if self.structured_output and schema:
+            options['response_format'] = response_format(schema_name, schema)
+        self.metrics.increment('llm_requests')
+        try:
+            with self.metrics.timed(OP_LLM), self.profiler.span('llm_request'):
+                response = self.openai_client.chat.completions.create(
+                    model=AI_MODEL,
+                    messages=self.build_messages(prompt),
+                    temperature=AI_TEMPERATURE,
+                    max_tokens=max_tokens,
+                    **options
+                )
+        except Exception as e:
+            self.metrics.increment('llm_errors')
+            if self.llm_breaker:
+                if is_provider_failure(e):
+                    self.llm_breaker.record_failure()
+                else:
+                    self.llm_breaker.record_success()
+            raise
+        if self.llm_breaker:
+            self.llm_breaker.record_success()
+        
+        usage = getattr(response, 'usage', None)
+        self.metrics.record_usage(usage, AI_MODEL)
+        if self.rate_limiter:
+            self.rate_limiter.settle(reserved, getattr(usage, 'total_tokens', None))
+        
+        return strip_code_fences(response.choices[0].message.content)
+    
+    def _enrich_fallback(self, name: str, part_number: str = "", price: float = 0) -> Dict:
+        """Enriquecimiento básico usado cuando la IA falla (se marca como fallo)"""
+        self.metrics.increment('fallbacks')
+        data = self._enrich_basic(name, part_number, price)
+        data['source'] = 'fallback'
+        return data
+    
+    def _enrich_deferred(self, name: str, part_number: str = "", price: float = 0) -> Dict:
+        """Modo básico para una fila que no se pidió a la IA (circuito abierto o fecha límite)"""
+        self.metrics.increment('llm_deferred')
+        data = self._enrich_basic(name, part_number, price)
+        data['source'] = 'deferred'
+        return data
+    
+    def image_search_blocked(self) -> bool:
+        """True si ahora no se buscarían imágenes por el circuito de Unsplash o la fecha límite"""
+        if not self.unsplash_api_key or self.image_quota_exhausted:
+            return False
+        return bool((self.deadline and self.deadline.expired())
+                    or (self.image_breaker and self.image_breaker.is_open()))
     
     def _enrich_basic(self, name: str, part_number: str = "", price: float = 0) -> Dict:
         """Enriquecimiento básico sin IA"""
@@ -181,7 +635,8 @@ Responde SOLO con el JSON, sin texto adicional."""
                 "años_compatibles": "",
                 "especificaciones": ""
             },
-            "search_keywords": [name.lower(), part_number] if part_number else [name.lower()]
+            "search_keywords": [name.lower(), part_number] if part_number else [name.lower()],
+            "source": "basic"
         }
     
     def search_image_url(self, name: str, part_number: str = "", keywords: List[str] = None, unsplash_api_key: Optional[str] = None) -> Optional[str]:
@@ -207,10 +662,21 @@ Responde SOLO con el JSON, sin texto adicional."""
         if not query:
             return None
         
-        # Intentar buscar en Unsplash si hay API key
-        if unsplash_api_key:
+        # Búsquedas equivalentes ya hechas (con o sin resultado) no gastan cuota
+        if self.image_cache:
+            found, cached_url = self.image_cache.lookup(query)
+            if found:
+                self.metrics.increment('image_cache_hits')
+                return cached_url
+        
+        # Intentar buscar en Unsplash si hay API key, queda cuota y el proveedor está disponible
+        if unsplash_api_key and not self.image_quota_exhausted:
+            if (self.deadline and self.deadline.expired()) or (self.image_breaker and not self.image_breaker.allow()):
+                self.metrics.increment('image_deferred')
+                return None
+            # Cada llamada permitida registra un resultado; si no, la prueba del semiabierto quedaría tomada
+            recorded = False
             try:
-                url = "https://api.unsplash.com/search/photos"
                 headers = {
                     "Authorization": f"Client-ID {unsplash_api_key}"
                 }
@@ -220,14 +686,47 @@ Responde SOLO con el JSON, sin texto adicional."""
                     "orientation": "landscape"
                 }
                 
-                response = requests.get(url, headers=headers, params=params, timeout=5)
+                request_options = {}
+                remaining = self.deadline.remaining() if self.deadline else None
+                if remaining is not None:
+                    request_options['timeout'] = max(1.0, min(self.http.timeout, remaining))
+                
+                self.metrics.increment('image_requests')
+                with self.metrics.timed(OP_IMAGE_SEARCH), self.profiler.span('image_search'):
+                    response = self.http.get(UNSPLASH_SEARCH_URL, headers=headers, params=params, **request_options)
+                if self.image_breaker:
+                    recorded = True
+                    if response.status_code == 429 or response.status_code >= 500:
+                        self.image_breaker.record_failure()
+                    else:
+                        self.image_breaker.record_success()
                 if response.status_code == 200:
                     data = response.json()
+                    image_url = None
                     if data.get('results') and len(data['results']) > 0:
                         image_url = data['results'][0]['urls']['regular']
-                        return image_url
+                    if self.image_cache:
+                        self.image_cache.store(query, image_url)
+                    return image_url
+                if response.status_code == 403 and response.headers.get('X-Ratelimit-Remaining') == '0':
+                    # Unsplash responde 403 al agotar la cuota por hora: no insistir en esta corrida
+                    if not self.image_quota_exhausted:
+                        self.image_quota_exhausted = True
+                        print("    ⚠️  Cuota de Unsplash agotada; se omiten las búsquedas restantes")
+                else:
+                    print(f"    ⚠️  Unsplash respondió {response.status_code}")
             except Exception as e:
+                if self.image_breaker and not recorded:
+                    recorded = True
+                    # Un error que no es del proveedor (p. ej. al armar el request) no indica que esté caído
+                    if is_provider_failure(e):
+                        self.image_breaker.record_failure()
+                    else:
+                        self.image_breaker.record_success()
                 print(f"    ⚠️  Error buscando imagen en Unsplash: {e}")
+            finally:
+                if self.image_breaker and not recorded:
+                    self.image_breaker.release()
         
         # Si no hay API key o falló, retornar None
         # El usuario puede agregar URLs manualmente
@@ -246,165 +745,562 @@ Responde SOLO con el JSON, sin texto adicional."""
         return "|".join(parts)
 
 
-def read_input_excel(file_path: str) -> pd.DataFrame:
-    """Lee el Excel de entrada y normaliza las columnas"""
+class BatchResultsEnricher(ProductEnricher):
+    """
+    Enricher sin llamadas a la red: toma las respuestas de un archivo de resultados
+    batch (ver --ingest-batch). Las filas sin respuesta válida usan el modo básico.
+    """
+    
+    def __init__(self, batch_results: Dict[str, Optional[str]]):
+        super().__init__(openai_api_key=None, unsplash_api_key=None)
+        self.openai_client = None
+        self.unsplash_api_key = None
+        self.batch_results = batch_results
+    
+    def enrich_with_ai(self, name: str, part_number: str = "", price: float = 0, route: bool = True) -> Dict:
+        content = self.batch_results.get(identity_hash(row_key(name, part_number)))
+        if content is None:
+            return self._enrich_fallback(name, part_number, price)
+        return self._parse_single_response(content, name, part_number, price,
+                                           self.prompt_template(name, part_number))
+
+
+def prepare_batch_file(records: Iterable[InputRecord], enricher: ProductEnricher, path: str) -> int:
+    """Escribe un request de chat por fila en formato batch (sin llamadas a la red)"""
+    def requests_for_rows():
+        for position, record in enumerate(records):
+            template = enricher.prompt_template(record.name, record.part_number)
+            if template:
+                prompt, max_tokens, schema = (template.render(record.name, record.part_number, record.price),
+                                              template.max_tokens, template.schema)
+            else:
+                prompt = AI_PROMPT_TEMPLATE.format(name=record.name, part_number=record.part_number, price=record.price)
+                max_tokens = AI_STRUCTURED_MAX_TOKENS if enricher.structured_output else AI_MAX_TOKENS
+                schema = AI_RESPONSE_SCHEMA
+            yield build_batch_request(
+                batch_custom_id(position, row_key(record.name, record.part_number)),
+                AI_MODEL,
+                enricher.build_messages(prompt),
+                AI_TEMPERATURE,
+                max_tokens,
+                response_format('product_enrichment', schema) if enricher.structured_output else None
+            )
+    
+    return write_batch_requests(path, requests_for_rows())
+
+
+def read_input_excel(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> InputReader:
+    """
+    Abre el Excel (o CSV) de entrada y normaliza las columnas.
+    Retorna un lector en streaming de registros tipados (ver enrichment/reader.py).
+    """
     try:
-        df = pd.read_excel(file_path)
-        
-        # Normalizar nombres de columnas (case-insensitive, sin espacios)
-        df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
-        
-        # Mapear posibles nombres de columnas
-        column_mapping = {
-            'numero_de_parte': 'part_number',
-            'número_de_parte': 'part_number',
-            'part_number': 'part_number',
-            'partnumber': 'part_number',
-            'sku': 'part_number',
-            'codigo': 'part_number',
-            'código': 'part_number',
-            'nombre': 'name',
-            'name': 'name',
-            'producto': 'name',
-            'descripcion': 'name',
-            'existencia': 'stock',
-            'stock': 'stock',
-            'inventario': 'stock',
-            'cantidad': 'stock',
-            'precio': 'price',
-            'price': 'price',
-            'precio_unitario': 'price',
-            'costo': 'price'
-        }
-        
-        # Renombrar columnas
-        df = df.rename(columns=column_mapping)
-        
-        # Validar columnas requeridas
-        required_columns = ['name', 'price']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            raise ValueError(f"Faltan columnas requeridas: {', '.join(missing_columns)}")
-        
-        return df
-        
+        return InputReader(file_path, chunk_size=chunk_size)
     except Exception as e:
         raise Exception(f"Error leyendo Excel: {e}")
 
 
-def create_enriched_excel(df: pd.DataFrame, enricher: ProductEnricher, output_path: str, search_images: bool = True):
-    """Crea un Excel enriquecido con toda la información"""
-    
-    # Crear workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Productos Enriquecidos"
-    
-    # Definir columnas del Excel de salida
-    columns = [
-        ("name", "Nombre del Producto", True),
-        ("sku", "SKU (Número de Parte)", False),
-        ("description", "Descripción", False),
-        ("image_url", "URL de Imagen", False),
-        ("price", "Precio Base", True),
-        ("product_type", "Tipo de Producto", True),
-        ("category_slug", "Slug de Categoría", False),
-        ("is_available", "Disponible", False),
-        ("is_featured", "Destacado", False),
-        ("display_order", "Orden de Visualización", False),
-        ("technical_specs", "Especificaciones Técnicas", False),
-        ("stock", "Existencia Original", False),
+def records_from_dataframe(df: pd.DataFrame) -> Iterator[InputRecord]:
+    """Convierte un DataFrame ya normalizado (columnas name, price, ...) en registros tipados"""
+    columns = set(df.columns)
+    for row in df.itertuples(index=False):
+        values = row._asdict()
+        price = parse_number(values.get('price'))
+        yield InputRecord(
+            name=format_text(values.get('name')),
+            part_number=format_text(values.get('part_number')) if 'part_number' in columns else '',
+            price=price if price is not None else 0.0,
+            stock=parse_number(values.get('stock')) if 'stock' in columns else None,
+        )
+
+
+def enrich_row(record: InputRecord, enricher: ProductEnricher, search_images: bool = True,
+               enriched_data: Optional[Dict] = None) -> Dict:
+    """
+    Enriquece una fila del Excel de entrada (IA + imagen + specs).
+    Si ya se tiene `enriched_data` (p. ej. de un lote), no se vuelve a llamar a la IA.
+    """
+    # Enriquecer con IA
+    if enriched_data is None:
+        enriched_data = enricher.enrich_with_ai(record.name, record.part_number, record.price)
+    
+    # Buscar imagen (opcional)
+    image_url = find_row_image(record, enricher, enriched_data) if search_images else None
+    
+    # Formatear especificaciones técnicas
+    tech_specs = enricher.format_technical_specs(enriched_data.get('technical_specs', {}))
+    return row_result(record, enriched_data, image_url, tech_specs)
+
+
+def find_row_image(record: InputRecord, enricher: ProductEnricher, enriched_data: Dict) -> Optional[str]:
+    return enricher.search_image_url(
+        record.name,
+        record.part_number,
+        enriched_data.get('search_keywords', []),
+        enricher.unsplash_api_key
+    )
+
+
+def row_result(record: InputRecord, enriched_data: Dict, image_url: Optional[str], tech_specs: str = "") -> Dict:
+    name, part_number, price, stock = record
+    return {
+        "name": name,
+        "part_number": part_number,
+        "price": price,
+        "stock": stock,
+        "enriched_data": enriched_data,
+        "image_url": image_url,
+        "tech_specs": tech_specs,
+        "is_available": stock_is_available(stock),
+    }
+
+
+# Filas que van al archivo de reintentos: fallos de IA y filas pospuestas (proveedor caído o fecha límite)
+RETRY_SOURCES = ('fallback', 'deferred')
+
+
+# Etapas del pipeline de enriquecimiento (la lectura y la escritura van aparte)
+STAGE_CLASSIFY = 'classify'
+STAGE_LLM = 'llm'
+STAGE_IMAGE = 'image'
+STAGE_FORMAT = 'format'
+PIPELINE_STAGES = (STAGE_CLASSIFY, STAGE_LLM, STAGE_IMAGE, STAGE_FORMAT)
+
+
+def resolve_stage_workers(workers: int, overrides: Optional[Dict[str, int]] = None,
+                          images: bool = True) -> Dict[str, int]:
+    """
+    Workers por etapa: las que esperan la red (IA, imágenes) usan `workers`;
+    clasificar y formatear son CPU y con un hilo basta. `overrides` tiene prioridad.
+    """
+    resolved = {
+        STAGE_CLASSIFY: 1,
+        STAGE_LLM: workers,
+        STAGE_IMAGE: workers if images else 1,
+        STAGE_FORMAT: 1,
+    }
+    resolved.update(overrides or {})
+    return resolved
+
+
+class RowGroup:
+    """Filas que recorren juntas el pipeline (un lote de la IA)"""
+    
+    __slots__ = ('rows', 'outcomes', 'pending', 'enriched', 'cache_keys', 'results', 'started')
+    
+    def __init__(self, rows: List[tuple]):
+        # (posición, registro, representante) por fila
+        self.rows = rows
+        # (resultado o registro, reutilizado, representante) por fila, para el escritor
+        self.outcomes: List[Optional[tuple]] = [None] * len(rows)
+        # (índice, posición, registro, llave) de las filas que se enriquecen en esta corrida
+        self.pending: List[tuple] = []
+        self.enriched: List[Optional[Dict]] = []
+        self.cache_keys: Dict[int, str] = {}
+        self.results: List[Dict] = []
+        self.started = 0.0
+    
+    def positions(self) -> List[int]:
+        return [position for _, position, _, _ in self.pending]
+    
+    def products(self) -> List[tuple]:
+        return [(record.name, record.part_number, record.price) for _, _, record, _ in self.pending]
+
+
+def stock_is_available(stock: Optional[float]) -> bool:
+    """Disponibilidad basada en stock (sin existencia registrada se asume disponible)"""
+    return stock is None or stock > 0
+
+
+def apply_image_check(result: Dict, check: Optional[ImageCheck]):
+    """Agrega a un resultado la revisión de su imagen; una imagen rota se descarta"""
+    if check is None:
+        return
+    result['image_status'] = check.status
+    if check.status == IMAGE_OK:
+        result['image_sha256'] = check.sha256
+        result['image_dhash'] = check.dhash
+        result['image_path'] = check.path
+    else:
+        result['image_status'] = f"{check.status}: {check.reason}"
+        result['rejected_image_url'] = result['image_url']
+        result['image_url'] = None
+
+
+def apply_derivatives(result: Dict, paths: Dict[str, str], primary: str):
+    """Reemplaza la URL original por la ruta de la variante principal en el almacenamiento"""
+    result['source_image_url'] = result['image_url']
+    result['image_variants'] = paths
+    result['image_url'] = paths[primary]
+
+
+def image_check_label(result: Dict) -> str:
+    """Texto de la columna de revisión de imagen"""
+    if result.get('image_shared_with'):
+        return f"compartida con {result['image_shared_with']}"
+    return result.get('image_status', '')
+
+
+# Campos del representante que se copian a sus duplicados (los que usan la fila del Excel y el resumen)
+FAN_OUT_FIELDS = (
+    'name', 'part_number', 'image_url', 'tech_specs', 'image_status', 'image_shared_with',
+    'rejected_image_url', 'image_deferred', 'carried_forward', 'duplicate_of',
+)
+FAN_OUT_ENRICHED_FIELDS = ('description', 'product_type', 'source')
+
+
+def fan_out_fields(result: Dict) -> Dict:
+    """Lo que se conserva de un representante mientras dura la corrida (no el resultado completo)"""
+    kept = {field: result[field] for field in FAN_OUT_FIELDS if field in result}
+    enriched_data = result.get('enriched_data', {})
+    kept['enriched_data'] = {field: enriched_data[field] for field in FAN_OUT_ENRICHED_FIELDS
+                             if field in enriched_data}
+    return kept
+
+
+def fan_out_result(representative: Dict, record: InputRecord) -> Dict:
+    """Copia el enriquecimiento de un representante a una fila duplicada, con su propio precio y stock"""
+    return {
+        **fan_out_fields(representative),
+        "name": record.name,
+        "part_number": record.part_number,
+        "price": record.price,
+        "stock": record.stock,
+        "is_available": stock_is_available(record.stock),
+        "duplicate_of": representative.get("duplicate_of", representative["part_number"] or representative["name"]),
+    }
+
+
+# Columnas del Excel de salida: (campo, encabezado, requerido)
+OUTPUT_COLUMNS = [
+    ("name", "Nombre del Producto", True),
+    ("sku", "SKU (Número de Parte)", False),
+    ("description", "Descripción", False),
+    ("image_url", "URL de Imagen", False),
+    ("price", "Precio Base", True),
+    ("product_type", "Tipo de Producto", True),
+    ("category_slug", "Slug de Categoría", False),
+    ("is_available", "Disponible", False),
+    ("is_featured", "Destacado", False),
+    ("display_order", "Orden de Visualización", False),
+    ("technical_specs", "Especificaciones Técnicas", False),
+    ("stock", "Existencia Original", False),
+    ("image_check", "Revisión de Imagen", False),
+]
+
+
+# Hoja de productos de la corrida anterior que ya no aparecen (modo incremental)
+REMOVED_COLUMNS = ["SKU (Número de Parte)", "Nombre del Producto", "Precio Anterior", "Existencia Anterior"]
+
+
+def result_to_row(result: Dict) -> list:
+    """Valores de una fila enriquecida en el orden de OUTPUT_COLUMNS"""
+    stock = result['stock']
+    return [
+        result['name'],
+        result['part_number'] if result['part_number'] else "",
+        result['enriched_data'].get('description', ''),
+        result['image_url'] if result['image_url'] else "",
+        result['price'],
+        result['enriched_data'].get('product_type', 'refaccion'),
+        "",  # category_slug - el usuario puede completarlo
+        "true" if result['is_available'] else "false",
+        "false",
+        0,
+        result['tech_specs'],
+        stock if stock is not None else "",
+        image_check_label(result),
     ]
+
+
+def create_enriched_excel(products, enricher: ProductEnricher, output_path: str, search_images: bool = True,
+                          workers: int = 1, journal: Optional[RunJournal] = None,
+                          retry_queue: Optional[RetryQueue] = None, retry_failed: bool = False,
+                          batch_size: int = 1, total: Optional[int] = None,
+                          rows_per_sheet: int = EXCEL_MAX_ROWS, rows_per_file: Optional[int] = None,
+                          dedup: bool = True, image_verifier: Optional[ImageVerifier] = None,
+                          derivatives: Optional[DerivativeGenerator] = None,
+                          stage_workers: Optional[Dict[str, int]] = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+                          previous: Optional[IncrementalIndex] = None):
+    """
+    Crea un Excel enriquecido con toda la información.
+    `products` puede ser un lector/iterable de InputRecord o un DataFrame normalizado.
+    Las filas recorren un pipeline por etapas (clasificar, IA, imágenes, formato) unidas por
+    colas acotadas de `queue_size` grupos, cada etapa con sus propios hilos: la búsqueda de
+    imágenes de un grupo se traslapa con la IA del siguiente y la memoria no crece con la
+    entrada. Las etapas de red usan `workers` hilos salvo lo indicado en `stage_workers`;
+    el escritor recibe las filas en el orden de entrada.
+    Con batch_size > 1 se envían hasta batch_size productos por request a la IA.
+    Cada fila terminada se registra en `journal`; las filas ya registradas se reutilizan.
+    Con retry_failed, solo se vuelven a enriquecer las filas pendientes en `retry_queue`.
+    Con `previous` (modo incremental), las filas sin cambios respecto a la corrida anterior
+    copian su enriquecimiento con el precio y la existencia nuevos; solo las nuevas o
+    cambiadas se enriquecen. Los productos que ya no aparecen van a la hoja "Productos Eliminados".
+    Las filas se escriben en streaming; salidas grandes se reparten según rows_per_sheet/rows_per_file.
+    Con dedup, las filas equivalentes (mismo número de parte o nombre normalizado) se enriquecen
+    una sola vez y el resultado se copia a las demás, conservando su precio y existencia.
+    Con image_verifier, las imágenes encontradas se descargan y validan; las rotas se descartan
+    y los productos que terminan con la misma imagen se marcan en "Revisión de Imagen".
+    Con derivatives (requiere image_verifier), se generan variantes redimensionadas de cada
+    imagen válida y "URL de Imagen" apunta a la variante principal en el almacenamiento.
+    """
     
-    # Escribir encabezados
-    for col_idx, (field, header, required) in enumerate(columns, start=1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.font = HEADER_FONT
-        cell.fill = HEADER_FILL
-        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        cell.border = BORDER
-        ws.column_dimensions[get_column_letter(col_idx)].width = 25
+    writer = EnrichedWorkbookWriter(output_path, OUTPUT_COLUMNS, rows_per_sheet=rows_per_sheet,
+                                    rows_per_file=rows_per_file)
     
     # Procesar cada producto
-    total_products = len(df)
-    print(f"\n📦 Procesando {total_products} productos...")
-    
-    for idx, row in df.iterrows():
-        product_num = idx + 1
-        print(f"  [{product_num}/{total_products}] Procesando: {row.get('name', 'N/A')}")
-        
-        # Obtener datos básicos
-        name = str(row.get('name', '')).strip()
-        part_number = str(row.get('part_number', row.get('sku', ''))).strip()
-        price = float(row.get('price', 0))
-        stock = row.get('stock', row.get('existencia', ''))
-        
-        # Enriquecer con IA
-        enriched_data = enricher.enrich_with_ai(name, part_number, price)
-        
-        # Buscar imagen (opcional)
-        image_url = None
-        if search_images:
-            image_url = enricher.search_image_url(
-                name, 
-                part_number, 
-                enriched_data.get('search_keywords', []),
-                enricher.unsplash_api_key
-            )
-            if image_url:
-                print(f"    ✅ Imagen encontrada")
+    if isinstance(products, pd.DataFrame):
+        total = len(products)
+        products = records_from_dataframe(products)
+    elif total is None:
+        total = getattr(products, 'estimated_rows', None)
+    print(f"\n📦 Procesando {total if total is not None else '?'} productos...")
+    
+    profiler = enricher.profiler
+    stage_workers = resolve_stage_workers(workers, stage_workers, search_images or image_verifier is not None)
+    
+    def classify_group(group: RowGroup) -> RowGroup:
+        """Filas del journal y duplicados; caché y ruteo por confianza de las demás"""
+        for i, (position, record, representative) in enumerate(group.rows):
+            # Los duplicados se completan al escribir, con el resultado de su representante
+            if representative is not None:
+                group.outcomes[i] = (record, False, representative)
+                continue
+            
+            key = row_key(record.name, record.part_number)
+            carried = None
+            if previous:
+                # Toda fila se registra en el índice, para detectar los productos eliminados
+                _, carried = previous.lookup(record.name, record.part_number)
+            
+            # Reutilizar filas ya completadas en una corrida anterior
+            retry = retry_failed and retry_queue is not None and position in retry_queue.pending
+            if journal and not retry:
+                saved = journal.get(position, key)
+                if saved is not None:
+                    group.outcomes[i] = (saved, True, None)
+                    continue
+            if carried is not None and not retry:
+                result = carry_forward(carried, record.name, record.part_number, record.price, record.stock,
+                                       stock_is_available(record.stock))
+                # En el journal, para que la siguiente corrida incremental tenga todas las filas
+                if journal:
+                    journal.append(position, key, result)
+                group.outcomes[i] = (result, True, None)
+                continue
+            group.pending.append((i, position, record, key))
         
-        # Formatear especificaciones técnicas
-        tech_specs = enricher.format_technical_specs(enriched_data.get('technical_specs', {}))
+        if not group.pending:
+            return group
+        if profiler.enabled:
+            for _, position, record, _ in group.pending:
+                profiler.label(position, f"{record.part_number} {record.name}".strip())
+        group.started = time.perf_counter()
+        with profiler.span('classify', rows=group.positions()):
+            group.enriched, group.cache_keys = enricher.triage_many(group.products())
+        return group
+    
+    def llm_group(group: RowGroup) -> RowGroup:
+        """Un request (o uno por tipo) con las filas que la IA debe completar"""
+        if group.pending and None in group.enriched:
+            with profiler.span('ai', rows=group.positions()):
+                enricher.complete_many(group.products(), group.enriched, group.cache_keys)
+        return group
+    
+    def image_group(group: RowGroup) -> RowGroup:
+        """Búsqueda, revisión y variantes de las imágenes del grupo"""
+        if not group.pending:
+            return group
+        for (_, position, record, _), enriched_data in zip(group.pending, group.enriched):
+            with profiler.span('row', rows=(position,)):
+                image_url = find_row_image(record, enricher, enriched_data) if search_images else None
+                result = row_result(record, enriched_data, image_url)
+                if search_images and image_url is None and enricher.image_search_blocked():
+                    result['image_deferred'] = True
+                group.results.append(result)
         
-        # Determinar disponibilidad basada en stock
-        is_available = True
-        if pd.notna(stock):
-            try:
-                stock_num = float(stock)
-                is_available = stock_num > 0
-            except:
-                pass
+        # Descargar y revisar las imágenes del grupo en paralelo
+        if image_verifier:
+            with profiler.span('image_verify', rows=group.positions()):
+                checks = image_verifier.verify_many([result['image_url'] for result in group.results])
+            for result, check in zip(group.results, checks):
+                apply_image_check(result, check)
         
-        # Escribir fila
-        row_num = idx + 2
-        values = [
-            name,
-            part_number if part_number else "",
-            enriched_data.get('description', ''),
-            image_url if image_url else "",
-            price,
-            enriched_data.get('product_type', 'refaccion'),
-            "",  # category_slug - el usuario puede completarlo
-            "true" if is_available else "false",
-            "false",
-            0,
-            tech_specs,
-            stock if pd.notna(stock) else ""
-        ]
+        # Variantes redimensionadas (pool de procesos) y subida al almacenamiento
+        if derivatives:
+            verified = [result for result in group.results if result.get('image_path')]
+            with profiler.span('image_derivatives', rows=group.positions()):
+                variant_paths = derivatives.process_many([(result['image_path'], result['image_sha256'])
+                                                          for result in verified])
+            for result, paths in zip(verified, variant_paths):
+                apply_derivatives(result, paths, derivatives.primary)
+        return group
+    
+    def format_group(group: RowGroup) -> RowGroup:
+        """Especificaciones en texto, journal y archivo de reintentos"""
+        if not group.pending:
+            return group
+        with profiler.span('format', rows=group.positions()):
+            for result in group.results:
+                result['tech_specs'] = enricher.format_technical_specs(
+                    result['enriched_data'].get('technical_specs', {})
+                )
         
-        for col_idx, value in enumerate(values, start=1):
-            cell = ws.cell(row=row_num, column=col_idx, value=value)
-            cell.border = BORDER
-            cell.alignment = Alignment(horizontal='left', vertical='top', wrap_text=True)
-            
-            # Colorear según estado
-            if col_idx == 8:  # is_available
-                if value == "true":
-                    cell.fill = SUCCESS_FILL
+        # Cada fila del grupo queda lista cuando termina el grupo completo
+        elapsed = time.perf_counter() - group.started
+        for _ in group.results:
+            enricher.metrics.observe(OP_ROW, elapsed)
+        
+        for (i, position, record, key), result in zip(group.pending, group.results):
+            if journal:
+                journal.append(position, key, result)
+            if retry_queue is not None:
+                if result['enriched_data'].get('source') in RETRY_SOURCES or result.get('image_deferred'):
+                    retry_queue.add(position, key, record.name, record.part_number)
+                else:
+                    retry_queue.resolve(position)
+            group.outcomes[i] = (result, False, None)
+        return group
+    
+    def chunked(items, size):
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield RowGroup(chunk)
+                chunk = []
+        if chunk:
+            yield RowGroup(chunk)
+    
+    dedup_index = DedupIndex() if dedup else None
+    
+    def assign_representatives(records):
+        for position, record in enumerate(records):
+            representative = None
+            if dedup_index:
+                representative = dedup_index.assign(position, record.name, record.part_number)
+            yield position, record, representative
+    
+    groups = chunked(assign_representatives(profiler.timed_iter('read_input', products)), max(1, batch_size))
+    stages = [
+        Stage(STAGE_CLASSIFY, classify_group, stage_workers[STAGE_CLASSIFY]),
+        Stage(STAGE_LLM, llm_group, stage_workers[STAGE_LLM]),
+        Stage(STAGE_IMAGE, image_group, stage_workers[STAGE_IMAGE]),
+        Stage(STAGE_FORMAT, format_group, stage_workers[STAGE_FORMAT]),
+    ]
+    pipeline = StagePipeline(groups, stages, queue_size=queue_size)
+    print(f"⚡ Pipeline por etapas: {', '.join(f'{stage.name} {stage.workers}' for stage in stages)} workers, "
+          f"hasta {pipeline.max_in_flight} grupos en vuelo")
+    if batch_size > 1:
+        print(f"📚 Modo por lotes: hasta {batch_size} productos por request")
+    results = (outcome for group in pipeline for outcome in group.outcomes)
+    pipeline_started = time.perf_counter()
+    
+    store = EnrichmentResultStore()
+    reused_count = 0
+    # Campos de los representantes que se copian a sus duplicados (ver FAN_OUT_FIELDS)
+    group_results: Dict[int, Dict] = {}
+    shared_images = SharedImageIndex() if image_verifier else None
+    try:
+        for position, (outcome, reused, representative) in enumerate(results):
+            product_num = position + 1
+            if representative is not None:
+                # `outcome` es el registro de entrada del duplicado
+                result = fan_out_result(group_results[representative], outcome)
+            else:
+                result = outcome
+                if shared_images and result.get('image_sha256'):
+                    result['image_shared_with'] = shared_images.assign(
+                        result['part_number'] or result['name'], result['image_sha256'], result.get('image_dhash', '')
+                    )
+                if dedup_index:
+                    group_results[position] = fan_out_fields(result)
+                if reused:
+                    if not result.get('carried_forward'):
+                        reused_count += 1
                 else:
-                    cell.fill = WARNING_FILL
+                    print(f"  [{product_num}/{total or '?'}] Procesado: {result['name'] or 'N/A'}")
+                    if result['image_url']:
+                        print(f"    ✅ Imagen encontrada")
+            
+            # Escribir fila
+            if profiler.enabled:
+                write_started = time.perf_counter()
+                writer.append(result_to_row(result))
+                profiler.add('write_row', time.perf_counter() - write_started)
+            else:
+                writer.append(result_to_row(result))
+            
+            store.add(position, result)
+    finally:
+        pipeline.close()
+    pipeline_elapsed = time.perf_counter() - pipeline_started
     
-    # Crear hoja de resumen
-    ws_summary = wb.create_sheet("Resumen", 0)
-    ws_summary.column_dimensions['A'].width = 30
-    ws_summary.column_dimensions['B'].width = 50
+    # Contadores que solo se conocen al final de la corrida
+    enricher.metrics.set_counter('rows', len(store))
+    http_retries = enricher.http.stats()['retries']
+    if image_verifier:
+        http_retries += image_verifier.http.stats()['retries']
+    enricher.metrics.set_counter('http_retries', http_retries)
+    enricher.metrics.set_counter('duplicate_rows', dedup_index.duplicates if dedup_index else 0)
+    enricher.metrics.set_counter('journal_rows', reused_count)
+    if previous:
+        incremental = previous.report()
+        for status, count in incremental.items():
+            enricher.metrics.set_counter(f'incremental_{status}', count)
+        store.incremental = incremental
+        writer.write_table("Productos Eliminados", REMOVED_COLUMNS,
+                           [[row.part_number, row.name, row.price, row.stock] for row in previous.removed()])
+    for prefix, breaker in (('llm', enricher.llm_breaker), ('image', enricher.image_breaker)):
+        if breaker:
+            for name, value in breaker.stats().items():
+                enricher.metrics.set_counter(f'breaker_{prefix}_{name}', value)
+    if enricher.deadline:
+        enricher.metrics.set_counter('deadline_reached', int(enricher.deadline.remaining() == 0))
+    stage_stats = pipeline.stats()
+    for stats in stage_stats:
+        enricher.metrics.set_counter(f'stage_{stats.name}_busy_seconds', round(stats.busy_seconds, 3))
+        enricher.metrics.set_counter(f'stage_{stats.name}_blocked_seconds', round(stats.blocked_seconds, 3))
+    if enricher.router:
+        for route, count in enricher.router.report().items():
+            enricher.metrics.set_counter(f'route_{route}', count)
     
+    summary = finish_workbook(writer, store, enricher.metrics, profiler)
+    print(f"   - Total de productos: {len(store)}")
+    if reused_count:
+        print(f"   - Recuperados del journal: {reused_count}")
+    if previous:
+        print(f"   - Incremental: {incremental['new']} nuevos, {incremental['changed']} cambiados, "
+              f"{incremental['unchanged']} sin cambios, {incremental['removed']} eliminados")
+    if dedup_index and dedup_index.duplicates:
+        print(f"   - Deduplicación: {dedup_index.groups} productos únicos para {dedup_index.rows} filas "
+              f"({dedup_index.ratio:.2f} filas por producto)")
+    print(f"   - Tipos de producto: {len(summary['product_types'])}")
+    if summary['failures']:
+        print(f"   - Fallos de IA (modo básico): {summary['failures']}")
+    if summary['deferred'] or summary['images_deferred']:
+        print(f"   - Pospuestos para re-enriquecer: {summary['deferred']} sin IA, "
+              f"{summary['images_deferred']} sin búsqueda de imagen")
+    if image_verifier:
+        print(f"   - Imágenes descartadas: {summary['images_rejected']}, compartidas: {summary['images_shared']}")
+    if enricher.router:
+        routes = enricher.router.report()
+        print(f"   - Ruteo: {', '.join(f'{route} {count}' for route, count in routes.items())} "
+              f"({enricher.router.llm_avoided_ratio():.1%} sin llamar a la IA)")
+    # Ocupación por worker: la etapa más ocupada es el cuello de botella
+    elapsed = max(pipeline_elapsed, 1e-9)
+    print("   - Etapas: " + ", ".join(
+        f"{stats.name} {stats.busy_seconds / (elapsed * stats.workers):.0%}" for stats in stage_stats
+    ) + " de ocupación")
+
+
+def finish_workbook(writer: EnrichedWorkbookWriter, store: EnrichmentResultStore,
+                    metrics: Optional[MetricsCollector] = None, profiler: Optional[Profiler] = None) -> Dict:
+    """Agrega la hoja de resumen (y la de métricas), guarda los archivos y retorna los agregados"""
     summary_data = [
         ["RESUMEN DE ENRIQUECIMIENTO", ""],
         ["", ""],
-        ["Total de productos procesados:", total_products],
+        ["Total de productos procesados:", len(store)],
         ["Fecha de procesamiento:", pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")],
         ["", ""],
         ["NOTAS:", ""],
@@ -413,32 +1309,77 @@ def create_enriched_excel(df: pd.DataFrame, enricher: ProductEnricher, output_pa
         ["", "• Verifica que los tipos de producto sean correctos"],
         ["", "• Ajusta las descripciones si es necesario"],
         ["", ""],
-        ["TIPOS DE PRODUCTO ENCONTRADOS:", ""],
     ]
     
-    # Contar tipos de producto
-    product_types = {}
-    for idx, row in df.iterrows():
-        name = str(row.get('name', '')).strip()
-        part_number = str(row.get('part_number', row.get('sku', ''))).strip()
-        enriched_data = enricher.enrich_with_ai(name, part_number, float(row.get('price', 0)))
-        product_type = enriched_data.get('product_type', 'refaccion')
-        product_types[product_type] = product_types.get(product_type, 0) + 1
+    # Agregados calculados una sola vez a partir de los resultados ya obtenidos
+    summary = store.summary()
+    summary_data.extend(store.summary_rows(summary))
+    
+    writer.write_summary(summary_data)
+    if metrics:
+        metrics.finish()
+        writer.write_table("Métricas", ["Métrica", "Operación", "Valor"], metrics.summary_rows())
     
-    for product_type, count in sorted(product_types.items()):
-        summary_data.append(["", f"  • {product_type}: {count} productos"])
+    # Guardar archivo(s)
+    with (profiler or Profiler()).span('save_workbook'):
+        paths = writer.close()
+    print(f"\n✅ Excel enriquecido guardado en: {', '.join(paths)}")
+    return summary
+
+
+def create_basic_excel(reader: InputReader, output_path: str, rows_per_sheet: int = EXCEL_MAX_ROWS,
+                       rows_per_file: Optional[int] = None, metrics: Optional[MetricsCollector] = None,
+                       profiler: Optional[Profiler] = None):
+    """
+    Modo --no-ai sin imágenes: enriquece por bloques con operaciones de columnas
+    (clasificación, descripción, disponibilidad) en lugar de fila por fila.
+    """
+    writer = EnrichedWorkbookWriter(output_path, OUTPUT_COLUMNS, rows_per_sheet=rows_per_sheet,
+                                    rows_per_file=rows_per_file)
+    fields = [field for field, _, _ in OUTPUT_COLUMNS]
+    store = EnrichmentResultStore()
+    profiler = profiler or Profiler()
     
-    for row_idx, (label, value) in enumerate(summary_data, start=1):
-        ws_summary.cell(row=row_idx, column=1, value=label)
-        ws_summary.cell(row=row_idx, column=2, value=value)
-        if row_idx == 1:
-            ws_summary.cell(row=row_idx, column=1).font = Font(bold=True, size=14)
+    total = reader.estimated_rows
+    print(f"\n📦 Procesando {total if total is not None else '?'} productos (modo básico por bloques)...")
+    for chunk in profiler.timed_iter('read_input', reader.iter_chunks()):
+        with profiler.span('classify_chunk'):
+            frame = enrich_basic_frame(pd.DataFrame.from_records(chunk, columns=InputRecord._fields),
+                                       PRODUCT_TYPE_CLASSIFIER)
+        with profiler.span('write_chunk'):
+            for values in frame_rows(frame, fields):
+                writer.append(values)
+        store.add_many(frame['product_type'], frame['price'], frame['image_url'] != '', 'basic')
+        print(f"  [{len(store)}/{total or '?'}] productos procesados")
     
-    # Guardar archivo
-    wb.save(output_path)
-    print(f"\n✅ Excel enriquecido guardado en: {output_path}")
-    print(f"   - Total de productos: {total_products}")
-    print(f"   - Tipos de producto: {len(product_types)}")
+    if metrics:
+        metrics.set_counter('rows', len(store))
+    summary = finish_workbook(writer, store, metrics, profiler)
+    print(f"   - Total de productos: {len(store)}")
+    print(f"   - Tipos de producto: {len(summary['product_types'])}")
+
+
+def write_profile_reports(profiler: Profiler, output_path: str, top: int,
+                          cpu_profile: Optional[cProfile.Profile] = None):
+    """Escribe el trace (formato Chrome), el reporte de filas lentas y, si aplica, el pstats"""
+    trace_path = f"{output_path}.trace.json"
+    slowest_path = f"{output_path}.slowest.txt"
+    profiler.write_chrome_trace(trace_path)
+    profiler.write_slowest_report(slowest_path, top)
+    
+    print("\n⏱️  Perfil por etapa (segundos acumulados entre hilos):")
+    for name, count, seconds in profiler.stage_totals():
+        print(f"   - {name}: {seconds:.3f} s en {count} llamadas ({seconds / count * 1000:.2f} ms c/u)")
+    if profiler.dropped_events:
+        print(f"   ({profiler.dropped_events} eventos no se guardaron en el trace por el límite de memoria)")
+    print(f"   Trace: {trace_path} (abrir en chrome://tracing o ui.perfetto.dev)")
+    print(f"   Filas más lentas: {slowest_path}")
+    
+    if cpu_profile:
+        pstats_path = f"{output_path}.pstats"
+        cpu_profile.dump_stats(pstats_path)
+        print(f"   cProfile (hilo principal): {pstats_path}")
+        pstats.Stats(cpu_profile).sort_stats('cumulative').print_stats(15)
 
 
 def main():
@@ -475,6 +1416,287 @@ def main():
         action='store_true',
         help='No buscar imágenes automáticamente'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Número de productos a enriquecer en paralelo (default: 1, secuencial)'
+    )
+    parser.add_argument(
+        '--stage-workers',
+        default='',
+        help='Workers por etapa del pipeline, p. ej. "llm=8,image=4,classify=1,format=1" '
+             '(default: --workers para llm e image, 1 para classify y format)'
+    )
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help=f'Grupos de filas en espera entre etapas del pipeline (default: {DEFAULT_QUEUE_SIZE})'
+    )
+    parser.add_argument(
+        '--rpm',
+        type=float,
+        help='Límite de requests por minuto a OpenAI, compartido entre workers'
+    )
+    parser.add_argument(
+        '--tpm',
+        type=float,
+        help='Límite de tokens por minuto a OpenAI, compartido entre workers'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=1,
+        help='Productos por request a la IA (default: 1). Valores como 10-20 reducen requests y tokens de instrucciones'
+    )
+    parser.add_argument(
+        '--structured-output',
+        action='store_true',
+        help='Enviar el esquema JSON de la respuesta a OpenAI (structured outputs) con un tope de tokens más ajustado'
+    )
+    parser.add_argument(
+        '--no-type-prompts',
+        action='store_true',
+        help='Usar el prompt único con todos los campos en lugar de una plantilla por tipo de producto'
+    )
+    parser.add_argument(
+        '--field-config',
+        default=DEFAULT_FIELD_CONFIG,
+        help='SQL o CSV exportado de catalog.product_type_field_config para las plantillas por tipo '
+             '(default: database/agora/migration_product_types_refacciones.sql)'
+    )
+    parser.add_argument(
+        '--route',
+        action='store_true',
+        help='Llamar a la IA solo en las filas que el clasificador por palabras clave no resuelve con confianza'
+    )
+    parser.add_argument(
+        '--route-min-confidence',
+        type=float,
+        default=DEFAULT_MIN_CONFIDENCE,
+        help=f'Confianza mínima (0-1) del clasificador para omitir la IA (default: {DEFAULT_MIN_CONFIDENCE})'
+    )
+    parser.add_argument(
+        '--route-min-matches',
+        type=int,
+        default=DEFAULT_MIN_MATCHES,
+        help=f'Palabras clave mínimas del tipo ganador para omitir la IA (default: {DEFAULT_MIN_MATCHES})'
+    )
+    parser.add_argument(
+        '--part-rules',
+        help='CSV con reglas patron,tipo_producto por número de parte; las filas que coinciden no usan la IA'
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=DEFAULT_CACHE_DIR,
+        help=f'Directorio del caché de resultados de IA (default: {DEFAULT_CACHE_DIR})'
+    )
+    parser.add_argument(
+        '--cache-ttl-days',
+        type=float,
+        default=DEFAULT_TTL_DAYS,
+        help=f'Días de vigencia de las entradas del caché (default: {DEFAULT_TTL_DAYS})'
+    )
+    parser.add_argument(
+        '--cache-max-entries',
+        type=int,
+        default=DEFAULT_MAX_ENTRIES,
+        help=f'Máximo de entradas en el caché; se eliminan las menos usadas (default: {DEFAULT_MAX_ENTRIES})'
+    )
+    parser.add_argument(
+        '--image-cache-ttl-days',
+        type=float,
+        default=DEFAULT_IMAGE_TTL_DAYS,
+        help=f'Días que se reutiliza una búsqueda de imagen con resultado (default: {DEFAULT_IMAGE_TTL_DAYS})'
+    )
+    parser.add_argument(
+        '--image-negative-ttl-days',
+        type=float,
+        default=DEFAULT_IMAGE_NEGATIVE_TTL_DAYS,
+        help=f'Días que se recuerda una búsqueda de imagen sin resultados (default: {DEFAULT_IMAGE_NEGATIVE_TTL_DAYS})'
+    )
+    parser.add_argument(
+        '--verify-images',
+        action='store_true',
+        help='Descargar las imágenes encontradas, descartar las rotas o pequeñas y marcar las repetidas'
+    )
+    parser.add_argument(
+        '--image-dir',
+        help='Directorio (por hash de contenido) donde guardar las imágenes verificadas (default: <cache-dir>/images)'
+    )
+    parser.add_argument(
+        '--image-min-size',
+        type=int,
+        default=DEFAULT_MIN_WIDTH,
+        help=f'Ancho y alto mínimos en pixeles de una imagen válida (default: {DEFAULT_MIN_WIDTH})'
+    )
+    parser.add_argument(
+        '--image-workers',
+        type=int,
+        default=DEFAULT_IMAGE_WORKERS,
+        help=f'Descargas de imágenes en paralelo (default: {DEFAULT_IMAGE_WORKERS})'
+    )
+    parser.add_argument(
+        '--derivatives',
+        action='store_true',
+        help='Generar variantes WebP/JPEG redimensionadas de las imágenes verificadas (implica --verify-images)'
+    )
+    parser.add_argument(
+        '--storage',
+        choices=sorted(STORAGE_ADAPTERS),
+        default='local',
+        help='Almacenamiento de las variantes (default: local)'
+    )
+    parser.add_argument(
+        '--storage-dir',
+        help='Directorio del almacenamiento local (default: <directorio del output>/storage)'
+    )
+    parser.add_argument(
+        '--storage-prefix',
+        default=DEFAULT_STORAGE_PREFIX,
+        help=f'Prefijo de las rutas de las variantes (default: {DEFAULT_STORAGE_PREFIX})'
+    )
+    parser.add_argument(
+        '--storage-base-url',
+        help='URL pública a anteponer a las rutas (default: rutas relativas al bucket)'
+    )
+    parser.add_argument(
+        '--image-url-variant',
+        choices=[variant.name for variant in DEFAULT_VARIANTS],
+        default=DEFAULT_PRIMARY_VARIANT,
+        help=f'Variante cuya ruta se escribe en "URL de Imagen" (default: {DEFAULT_PRIMARY_VARIANT})'
+    )
+    parser.add_argument(
+        '--derivative-processes',
+        type=int,
+        help='Procesos para generar variantes (default: número de CPUs)'
+    )
+    parser.add_argument(
+        '--http-retries',
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help=f'Reintentos ante 429/5xx o errores de red en la búsqueda de imágenes (default: {DEFAULT_MAX_RETRIES})'
+    )
+    parser.add_argument(
+        '--previous',
+        nargs='+',
+        metavar='ARCHIVO',
+        help='Modo incremental: journal (<salida>.journal.jsonl) de la corrida anterior; solo se enriquecen '
+             'las filas nuevas, cambiadas o que habían quedado en modo básico o fallado. No acepta el Excel '
+             'enriquecido porque no guarda el origen de cada fila'
+    )
+    parser.add_argument(
+        '--stock-delta',
+        metavar='CATALOGO',
+        help='Modo delta (sin IA): comparar la hoja nueva contra el catálogo actual (Excel enriquecido anterior '
+             'o CSV exportado de catalog.products) y escribir solo los cambios de precio y disponibilidad'
+    )
+    parser.add_argument(
+        '--delta-output',
+        help='Archivo delta: JSONL si termina en .jsonl, si no CSV (default: <input>.delta.csv)'
+    )
+    parser.add_argument(
+        '--price-tolerance',
+        type=float,
+        default=DEFAULT_PRICE_TOLERANCE,
+        help=f'Diferencia mínima de precio que cuenta como cambio (default: {DEFAULT_PRICE_TOLERANCE:g})'
+    )
+    parser.add_argument(
+        '--deadline',
+        help='Tiempo máximo para llamar a OpenAI y Unsplash (p. ej. 90, 45m, 2h); después, las filas restantes '
+             'se completan sin IA ni imágenes y quedan en el archivo de reintentos'
+    )
+    parser.add_argument(
+        '--breaker-failures',
+        type=int,
+        default=DEFAULT_FAILURE_THRESHOLD,
+        help=f'Fallos consecutivos de un proveedor que abren su circuito (default: {DEFAULT_FAILURE_THRESHOLD}, '
+             '0 = sin circuit breaker)'
+    )
+    parser.add_argument(
+        '--breaker-reset',
+        type=float,
+        default=DEFAULT_RESET_TIMEOUT,
+        help=f'Segundos con el circuito abierto antes de una llamada de prueba (default: {DEFAULT_RESET_TIMEOUT:g})'
+    )
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='No leer ni escribir el caché de resultados de IA'
+    )
+    cache_group.add_argument(
+        '--refresh-cache',
+        action='store_true',
+        help='Ignorar el caché existente y volver a consultar la IA (los resultados nuevos se guardan)'
+    )
+    batch_group = parser.add_mutually_exclusive_group()
+    batch_group.add_argument(
+        '--prepare-batch',
+        metavar='REQUESTS_JSONL',
+        help='Fase 1 (offline): escribir un request por fila en formato batch de OpenAI y terminar'
+    )
+    batch_group.add_argument(
+        '--ingest-batch',
+        metavar='RESULTS_JSONL',
+        help='Fase 2 (offline): generar el Excel a partir del archivo de resultados batch, sin llamadas a la red'
+    )
+    parser.add_argument(
+        '--no-dedup',
+        action='store_true',
+        help='Enriquecer cada fila aunque repita el número de parte o nombre de otra'
+    )
+    parser.add_argument(
+        '--rows-per-sheet',
+        type=int,
+        default=EXCEL_MAX_ROWS,
+        help='Máximo de productos por hoja; el resto continúa en hojas adicionales'
+    )
+    parser.add_argument(
+        '--rows-per-file',
+        type=int,
+        help='Máximo de productos por archivo; el resto se guarda en <output>_parte2.xlsx, etc.'
+    )
+    parser.add_argument(
+        '--journal',
+        help='Archivo JSONL donde se registra cada fila terminada (default: <output>.journal.jsonl)'
+    )
+    parser.add_argument(
+        '--retry-file',
+        help='Archivo JSONL con las filas cuya IA falló (default: <output>.retry.jsonl)'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continuar una corrida interrumpida: las filas ya registradas en el journal no se reprocesan'
+    )
+    parser.add_argument(
+        '--retry-failed',
+        action='store_true',
+        help='Reintentar solo las filas del archivo de reintentos; el resto se toma del journal'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Medir cada etapa y escribir <output>.trace.json (formato Chrome) y <output>.slowest.txt'
+    )
+    parser.add_argument(
+        '--profile-top',
+        type=int,
+        default=DEFAULT_SLOWEST_ROWS,
+        help=f'Filas incluidas en el reporte de filas más lentas (default: {DEFAULT_SLOWEST_ROWS})'
+    )
+    parser.add_argument(
+        '--profile-cpu',
+        action='store_true',
+        help='Además, perfilar con cProfile el hilo principal y guardar <output>.pstats'
+    )
+    parser.add_argument(
+        '--metrics-file',
+        help='Archivo de métricas de la corrida: JSON si termina en .json, si no OpenMetrics '
+             '(default: <output>.metrics.prom)'
+    )
     
     args = parser.parse_args()
     
@@ -483,30 +1705,247 @@ def main():
         print(f"❌ Error: El archivo {args.input} no existe")
         sys.exit(1)
     
+    # Modo delta de precio/disponibilidad: no crea enricher ni usa la red
+    if args.stock_delta:
+        if not os.path.exists(args.stock_delta):
+            print(f"❌ Error: El archivo {args.stock_delta} no existe")
+            sys.exit(1)
+        delta_path = args.delta_output or default_delta_path(args.input)
+        print(f"📉 Modo delta: {args.input} contra {args.stock_delta}")
+        try:
+            report, timings = export_stock_delta(args.input, args.stock_delta, delta_path, args.price_tolerance)
+        except (OSError, ValueError) as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+        speed = rows_per_second(report.matched + report.new_skus, timings)
+        print(f"✅ {len(report.delta)} SKUs con cambios escritos en: {delta_path}")
+        print(f"   • Precio cambiado: {report.price_changes}")
+        print(f"   • Disponibilidad cambiada: {report.availability_changes}")
+        print(f"   • SKUs en ambos: {report.matched}")
+        print(f"   • SKUs nuevos (no están en el catálogo, requieren enriquecimiento): {report.new_skus}")
+        print(f"   • SKUs del catálogo ausentes en la hoja: {report.missing_skus}")
+        if report.rows_without_sku:
+            print(f"   • Filas sin SKU (omitidas): {report.rows_without_sku}")
+        print("   ⏱️  " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+              + (f" ({speed:,.0f} SKUs/s)" if speed else ""))
+        return
+    
+    if args.workers < 1:
+        print("❌ Error: --workers debe ser al menos 1")
+        sys.exit(1)
+    if args.batch_size < 1:
+        print("❌ Error: --batch-size debe ser al menos 1")
+        sys.exit(1)
+    if args.queue_size < 1:
+        print("❌ Error: --queue-size debe ser al menos 1")
+        sys.exit(1)
+    try:
+        # La fecha límite cuenta desde el inicio de la corrida
+        deadline = Deadline(parse_duration(args.deadline) if args.deadline else None)
+    except ValueError as e:
+        print(f"❌ Error en --deadline: {e}")
+        sys.exit(1)
+    try:
+        stage_workers = parse_stage_workers(args.stage_workers, PIPELINE_STAGES)
+    except ValueError as e:
+        print(f"❌ Error en --stage-workers: {e}")
+        sys.exit(1)
+    
+    journal_path = args.journal or f"{args.output}.journal.jsonl"
+    retry_path = args.retry_file or f"{args.output}.retry.jsonl"
+    metrics_path = args.metrics_file or f"{args.output}.metrics.prom"
+    resume = args.resume or args.retry_failed
+    if resume and not os.path.exists(journal_path):
+        print(f"❌ Error: No existe el journal {journal_path} para continuar la corrida")
+        sys.exit(1)
+    
+    rate_limiter = RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    
+    prompts = None
+    field_config = None
+    if not args.no_type_prompts:
+        try:
+            field_config = load_field_config(args.field_config)
+        except (OSError, ValueError) as e:
+            if args.field_config != DEFAULT_FIELD_CONFIG:
+                print(f"❌ Error leyendo la configuración de campos: {e}")
+                sys.exit(1)
+            # Sin la configuración del repositorio (p. ej. copia suelta del script) se usa el prompt único
+            print(f"⚠️  No se pudo leer la configuración de campos ({e}); se usa el prompt único")
+    if field_config is not None:
+        configured = [product_type for product_type in VALID_PRODUCT_TYPES if product_type in field_config]
+        if not configured:
+            print(f"⚠️  {args.field_config} no configura ninguno de los tipos {', '.join(VALID_PRODUCT_TYPES)}; "
+                  "se piden todos los campos")
+        prompts = PromptRegistry(field_config, VALID_PRODUCT_TYPES)
+        print(f"🧩 Plantillas por tipo de producto: {len(configured)} tipos configurados en {args.field_config}")
+        for product_type, info in prompts.describe().items():
+            specs = f" ({', '.join(info['technical_specs'])})" if info['technical_specs'] else ""
+            print(f"   • {product_type}: {', '.join(info['fields'])}{specs} — max_tokens {info['max_tokens']}")
+    
+    # Modo batch offline: preparar requests
+    if args.prepare_batch:
+        try:
+            print(f"📖 Leyendo archivo: {args.input}")
+            reader = read_input_excel(args.input)
+            count = prepare_batch_file(reader, ProductEnricher(structured_output=args.structured_output, prompts=prompts),
+                                       args.prepare_batch)
+            print(f"✅ {count} requests escritos en: {args.prepare_batch}")
+            print("   Súbelo como trabajo batch y después usa --ingest-batch con el archivo de resultados")
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+        return
+    
     # Inicializar enricher
-    if args.no_ai:
+    if args.ingest_batch:
+        if not os.path.exists(args.ingest_batch):
+            print(f"❌ Error: El archivo {args.ingest_batch} no existe")
+            sys.exit(1)
+        print(f"📥 Modo ingest: usando resultados de {args.ingest_batch} (sin llamadas a la red)")
+        enricher = BatchResultsEnricher(read_batch_results(args.ingest_batch))
+        enricher.prompts = prompts
+        args.no_images = True
+    elif args.no_ai:
         print("ℹ️  Modo básico: No se usará IA")
         enricher = ProductEnricher(openai_api_key=None, unsplash_api_key=None if args.no_images else args.unsplash_key)
+        # Sin API key explícita el enricher toma OPENAI_API_KEY del entorno
+        enricher.openai_client = None
     else:
-        enricher = ProductEnricher(openai_api_key=args.openai_key, unsplash_api_key=None if args.no_images else args.unsplash_key)
+        enricher = ProductEnricher(openai_api_key=args.openai_key, unsplash_api_key=None if args.no_images else args.unsplash_key,
+                                   rate_limiter=rate_limiter if rate_limiter.enabled else None,
+                                   structured_output=args.structured_output, prompts=prompts)
         if not enricher.openai_client:
             print("⚠️  OpenAI no está disponible. Usando modo básico.")
             print("   Para usar IA, configura OPENAI_API_KEY o usa --openai-key")
+        if enricher.openai_client and (args.route or args.part_rules):
+            try:
+                rules = load_part_rules(args.part_rules, VALID_PRODUCT_TYPES) if args.part_rules else []
+            except (OSError, ValueError) as e:
+                print(f"❌ Error en las reglas por número de parte: {e}")
+                sys.exit(1)
+            enricher.router = ConfidenceRouter(PRODUCT_TYPE_CLASSIFIER, rules, use_classifier=args.route,
+                                               min_confidence=args.route_min_confidence,
+                                               min_matches=args.route_min_matches)
+            print(f"🧭 Ruteo por confianza: {len(rules)} reglas por número de parte"
+                  + (f", clasificador con confianza >= {args.route_min_confidence:g}" if args.route else ""))
+        if enricher.openai_client and not args.no_cache:
+            cache_mode = CACHE_MODE_REFRESH if args.refresh_cache else CACHE_MODE_USE
+            enricher.cache = EnrichmentCache(args.cache_dir, ttl_days=args.cache_ttl_days,
+                                             max_entries=args.cache_max_entries, mode=cache_mode)
+            print(f"💾 Caché de IA: {enricher.cache.path}" + (" (refrescando)" if args.refresh_cache else ""))
+    
+    if args.breaker_failures > 0:
+        enricher.llm_breaker = CircuitBreaker('OpenAI', args.breaker_failures, args.breaker_reset)
+        enricher.image_breaker = CircuitBreaker('Unsplash', args.breaker_failures, args.breaker_reset)
+    if args.deadline:
+        enricher.deadline = deadline
+        print(f"⏰ Fecha límite para proveedores: {deadline.seconds:g}s")
     
     if not args.no_images and not enricher.unsplash_api_key:
         print("ℹ️  Búsqueda de imágenes deshabilitada (no hay API key de Unsplash)")
         print("   Para buscar imágenes, configura UNSPLASH_ACCESS_KEY o usa --unsplash-key")
     elif not args.no_images:
         print("✅ Búsqueda de imágenes habilitada")
+        # Un pool de conexiones por worker; la cuota de Unsplash se cuida con el caché de búsquedas
+        enricher.http = HttpClient(pool_size=max(args.workers, 1), max_retries=args.http_retries)
+        if not args.no_cache:
+            enricher.image_cache = ImageSearchCache(
+                args.cache_dir, ttl_days=args.image_cache_ttl_days, negative_ttl_days=args.image_negative_ttl_days,
+                max_entries=args.cache_max_entries,
+                mode=CACHE_MODE_REFRESH if args.refresh_cache else CACHE_MODE_USE
+            )
+    
+    enricher.profiler = Profiler(enabled=args.profile or args.profile_cpu)
+    cpu_profile = cProfile.Profile() if args.profile_cpu else None
+    if cpu_profile:
+        cpu_profile.enable()
     
     try:
+        # La corrida anterior se carga completa antes de abrir (y truncar) la salida y el journal
+        previous = None
+        if args.previous:
+            try:
+                previous = load_previous(args.previous)
+            except (OSError, ValueError) as e:
+                print(f"❌ Error leyendo la corrida anterior: {e}")
+                sys.exit(1)
+            print(f"🔄 Modo incremental: {previous.previous_rows} filas ({len(previous)} productos) "
+                  f"en la corrida anterior")
+        
         # Leer Excel de entrada
         print(f"📖 Leyendo archivo: {args.input}")
-        df = read_input_excel(args.input)
-        print(f"✅ Archivo leído: {len(df)} productos encontrados")
+        with enricher.profiler.span('open_input'):
+            reader = read_input_excel(args.input)
+        if reader.estimated_rows is not None:
+            print(f"✅ Archivo abierto: ~{reader.estimated_rows} productos encontrados")
+        
+        # Sin IA ni imágenes no hay llamadas a la red: enriquecer por bloques
+        if not enricher.openai_client and not enricher.unsplash_api_key and not args.ingest_batch and not previous:
+            create_basic_excel(reader, args.output, rows_per_sheet=args.rows_per_sheet,
+                               rows_per_file=args.rows_per_file, metrics=enricher.metrics,
+                               profiler=enricher.profiler)
+            enricher.metrics.write(metrics_path)
+            print(f"📈 Métricas: {metrics_path}")
+            if reader.invalid_prices:
+                print(f"⚠️  {reader.invalid_prices} filas con precio vacío o no numérico (se usó 0)")
+            print("\n🎉 Proceso completado exitosamente!")
+            return
+        
+        image_verifier = None
+        derivatives = None
+        if (args.verify_images or args.derivatives) and not args.no_images and enricher.unsplash_api_key:
+            image_dir = args.image_dir or os.path.join(args.cache_dir, 'images')
+            image_verifier = ImageVerifier(
+                ContentAddressedStore(image_dir),
+                http=HttpClient(pool_size=args.image_workers, max_retries=args.http_retries),
+                min_width=args.image_min_size, min_height=args.image_min_size, workers=args.image_workers,
+                metrics=enricher.metrics
+            )
+            print(f"🔎 Verificación de imágenes: {image_dir}")
+            if args.derivatives:
+                storage_dir = args.storage_dir or os.path.join(os.path.dirname(os.path.abspath(args.output)), 'storage')
+                storage = create_storage(args.storage, root=storage_dir, public_base_url=args.storage_base_url)
+                derivatives = DerivativeGenerator(storage, prefix=args.storage_prefix, primary=args.image_url_variant,
+                                                  processes=args.derivative_processes)
+                print(f"🗂️  Variantes de imágenes: {storage_dir}")
+        
+        journal = RunJournal(journal_path, resume=resume)
+        retry_queue = RetryQueue(retry_path, resume=resume)
+        if resume:
+            print(f"♻️  Continuando corrida: {len(journal.completed)} filas en el journal")
+        if args.retry_failed:
+            print(f"🔁 Reintentando {len(retry_queue.pending)} filas con errores de IA o pospuestas")
         
         # Crear Excel enriquecido
-        create_enriched_excel(df, enricher, args.output, search_images=not args.no_images)
+        try:
+            create_enriched_excel(reader, enricher, args.output, search_images=not args.no_images, workers=args.workers,
+                                  journal=journal, retry_queue=retry_queue, retry_failed=args.retry_failed,
+                                  batch_size=args.batch_size, rows_per_sheet=args.rows_per_sheet,
+                                  rows_per_file=args.rows_per_file, dedup=not args.no_dedup,
+                                  image_verifier=image_verifier, derivatives=derivatives,
+                                  stage_workers=stage_workers, queue_size=args.queue_size, previous=previous)
+        finally:
+            if image_verifier:
+                image_verifier.close()
+            if derivatives:
+                derivatives.close()
+                print(f"🗂️  Variantes: {derivatives.generated} imágenes procesadas, {derivatives.reused} ya existían")
+            journal.close()
+            failed = retry_queue.close()
+            if reader.invalid_prices:
+                print(f"⚠️  {reader.invalid_prices} filas con precio vacío o no numérico (se usó 0)")
+            if failed:
+                print(f"⚠️  {failed} filas con errores de IA o pospuestas en {retry_path} (usa --retry-failed para reintentarlas)")
+        
+        metrics_summary = enricher.metrics.summary()
+        enricher.metrics.write(metrics_path, metrics_summary)
+        counters = metrics_summary['counters']
+        print(f"\n📈 Métricas: {metrics_path}")
+        print(f"   - {metrics_summary['rows_per_second']:.1f} filas/s, {int(counters.get('llm_requests', 0))} requests de IA, "
+              f"{int(counters.get('prompt_tokens', 0) + counters.get('completion_tokens', 0))} tokens "
+              f"({int(counters.get('cached_prompt_tokens', 0))} de entrada desde el caché de prompts), "
+              f"costo estimado ${counters.get('cost_usd', 0):.4f} USD")
         
         print("\n🎉 Proceso completado exitosamente!")
         print(f"\n📋 Próximos pasos:")
@@ -515,9 +1954,31 @@ def main():
         print(f"   3. Asigna categorías usando catalogo_categorias.csv")
         print(f"   4. Importa el archivo usando el sistema de carga masiva")
         
+    except KeyboardInterrupt:
+        print(f"\n⏹️  Proceso interrumpido. Las filas terminadas están en {journal_path}")
+        print("   Usa --resume para continuar sin reprocesarlas")
+        sys.exit(130)
     except Exception as e:
         print(f"❌ Error: {e}")
         sys.exit(1)
+    finally:
+        if cpu_profile:
+            cpu_profile.disable()
+        if enricher.profiler.enabled:
+            write_profile_reports(enricher.profiler, args.output, args.profile_top, cpu_profile)
+        if enricher.cache:
+            stats = enricher.cache.stats()
+            enricher.cache.close()
+            print(f"\n💾 Caché: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%})")
+        if enricher.image_cache:
+            stats = enricher.image_cache.stats()
+            enricher.image_cache.close()
+            print(f"🖼️  Caché de imágenes: {stats['hits']} hits ({stats['negative_hits']} sin resultado), "
+                  f"{stats['misses']} misses")
+        http_stats = enricher.http.stats()
+        if http_stats['requests']:
+            print(f"🌐 Unsplash: {http_stats['requests']} requests, {http_stats['retries']} reintentos")
+        enricher.http.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,3 @@
+"""
+Módulos de soporte para scripts/enrich_products_with_ai.py
+"""
@@ -0,0 +1,81 @@
+"""
+Archivos JSONL en el formato de trabajos batch de OpenAI (/v1/chat/completions).
+
+`prepare` genera un request por fila con un custom_id estable; `ingest` lee el
+archivo de resultados que regresa el proveedor. Ninguna de las dos fases hace
+llamadas a la red.
+"""
+
+import hashlib
+import json
+from typing import Dict, Iterable, Optional
+
+from enrichment.journal import read_jsonl
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+
+
+def batch_custom_id(position: int, key: str) -> str:
+    """custom_id estable: posición de la fila + hash de su identidad"""
+    return f"row-{position:07d}-{identity_hash(key)}"
+
+
+def identity_hash(key: str) -> str:
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+
+def hash_from_custom_id(custom_id: str) -> Optional[str]:
+    parts = str(custom_id or '').split('-')
+    return parts[2] if len(parts) == 3 and parts[0] == 'row' else None
+
+
+def build_batch_request(custom_id: str, model: str, messages: list, temperature: float, max_tokens: int,
+                        response_format: Optional[Dict] = None) -> Dict:
+    body = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    if response_format:
+        body["response_format"] = response_format
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": body,
+    }
+
+
+def write_batch_requests(path: str, requests: Iterable[Dict]) -> int:
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def read_batch_results(path: str) -> Dict[str, Optional[str]]:
+    """
+    Lee un JSONL de resultados y retorna {hash de identidad: contenido del mensaje}.
+    Las líneas con error o status distinto de 200 se registran con contenido None.
+    """
+    contents: Dict[str, Optional[str]] = {}
+    for record in read_jsonl(path):
+        key_hash = hash_from_custom_id(record.get('custom_id'))
+        if not key_hash:
+            continue
+
+        content = None
+        response = record.get('response') or {}
+        if not record.get('error') and response.get('status_code', 200) == 200:
+            try:
+                content = response['body']['choices'][0]['message']['content']
+            except (KeyError, IndexError, TypeError):
+                content = None
+
+        # Si una identidad se repite, conservar la primera respuesta válida
+        if contents.get(key_hash) is None:
+            contents[key_hash] = content
+    return contents
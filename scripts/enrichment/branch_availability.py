@@ -0,0 +1,425 @@
+"""
+Disponibilidad por sucursal en bloque a través de la API de productos.
+
+El backend actualiza la disponibilidad de un producto en varias sucursales con
+POST /api/catalog/products/:id/branch-availability y un cuerpo
+`BulkUpdateProductBranchAvailabilityDto` ({"availabilities": [...]}). Este
+módulo convierte una hoja de existencias (o el delta de `--stock-delta`) en
+esos cuerpos:
+
+1. Cada SKU se cruza con un índice local (CSV exportado de la base de datos)
+   que da el id del producto, sus sucursales y el estado actual de cada una.
+2. Las filas se agrupan por producto y se parten en cuerpos con un máximo de
+   sucursales y de bytes.
+3. Un enviador aplica los cuerpos con un pool de conexiones, varios hilos y
+   reintentos, y deja un reporte por request.
+
+El endpoint reemplaza el registro completo de cada sucursal: `price` (NULL =
+precio global) y las clasificaciones asignadas. Por eso el índice debe traer
+esos datos para conservarlos, o hay que aceptar explícitamente que se borren.
+"""
+
+import csv
+import itertools
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import pandas as pd
+import requests
+
+from enrichment.delta import normalize_sku_series, parse_bool_series, read_csv_table, read_stock_frame
+from enrichment.http import HttpClient
+from enrichment.journal import read_jsonl, to_jsonable
+
+ENDPOINT_PATH = '/catalog/products/{product_id}/branch-availability'
+
+DEFAULT_API_URL = 'http://localhost:3000/api'
+DEFAULT_MAX_BRANCHES_PER_REQUEST = 50
+DEFAULT_MAX_BODY_BYTES = 256 * 1024
+DEFAULT_SENDER_WORKERS = 8
+
+# Precio por sucursal en el cuerpo: el del índice (se conserva) o el de la hoja
+BRANCH_PRICE_KEEP = 'keep'
+BRANCH_PRICE_SHEET = 'sheet'
+BRANCH_PRICE_MODES = (BRANCH_PRICE_KEEP, BRANCH_PRICE_SHEET)
+
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+
+# Encabezados aceptados en el índice de SKUs
+INDEX_COLUMN_MAPPING = {
+    'sku': 'sku',
+    'part_number': 'sku',
+    'id': 'product_id',
+    'product_id': 'product_id',
+    'branch_id': 'branch_id',
+    'business_id': 'branch_id',
+    'price': 'price',
+    'branch_price': 'price',
+    'stock': 'stock',
+    'is_enabled': 'is_enabled',
+    'classification_ids': 'classification_ids',
+}
+
+# Arreglo de Postgres ({a,b}) o lista separada por | , ;
+_LIST_SEPARATORS = re.compile(r'[|,;\s]+')
+
+
+def parse_id_list(value) -> List[str]:
+    if value is None or (isinstance(value, float) and value != value):
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value if item]
+    return [item for item in _LIST_SEPARATORS.split(str(value).strip().strip('{}[]')) if item]
+
+
+def read_sku_index(path: str) -> pd.DataFrame:
+    """
+    Índice local SKU -> producto (y sucursal). Una fila por producto, o por
+    producto y sucursal si trae `branch_id`; `price`, `stock`, `is_enabled` y
+    `classification_ids` son el estado actual de esa sucursal.
+    """
+    raw = read_csv_table(path)
+    raw.columns = [INDEX_COLUMN_MAPPING.get(str(column).strip().lower(), column) for column in raw.columns]
+    raw = raw.loc[:, ~raw.columns.duplicated()]
+    missing = [column for column in ('sku', 'product_id') if column not in raw.columns]
+    if missing:
+        raise ValueError(f"{path}: faltan columnas {', '.join(missing)}")
+
+    index = pd.DataFrame({
+        'sku_key': normalize_sku_series(raw['sku']),
+        'product_id': raw['product_id'].str.strip(),
+    })
+    if 'branch_id' in raw.columns:
+        index['branch_id'] = raw['branch_id'].str.strip()
+    if 'price' in raw.columns:
+        index['price'] = pd.to_numeric(raw['price'], errors='coerce').round(2)
+    if 'stock' in raw.columns:
+        index['stock'] = pd.to_numeric(raw['stock'], errors='coerce')
+    if 'is_enabled' in raw.columns:
+        index['is_enabled'] = parse_bool_series(raw['is_enabled'])
+    if 'classification_ids' in raw.columns:
+        index['classification_ids'] = raw['classification_ids']
+    index = index[(index['sku_key'] != '') & (index['product_id'] != '')]
+    keys = ['product_id', 'branch_id'] if 'branch_id' in index.columns else ['product_id']
+    return index.drop_duplicates(keys)
+
+
+def read_stock_updates(path: str) -> pd.DataFrame:
+    """
+    Existencias por SKU normalizado (sku, price, stock), desde la hoja de
+    existencias o desde un archivo delta (CSV con columna `changes` o JSONL).
+    """
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        frame = pd.DataFrame(list(read_jsonl(path)))
+    elif path.lower().endswith('.csv') and 'changes' in pd.read_csv(path, nrows=0).columns:
+        frame = pd.read_csv(path, dtype={'sku': str, 'product_id': str})
+    else:
+        stock, _ = read_stock_frame(path)
+        return stock
+
+    if frame.empty:
+        return pd.DataFrame(columns=['sku', 'price', 'stock', 'product_id'])
+    if 'sku' not in frame.columns or 'stock' not in frame.columns:
+        raise ValueError(f"{path}: el delta debe tener columnas sku y stock")
+    frame['sku_key'] = normalize_sku_series(frame['sku'])
+    frame['price'] = pd.to_numeric(frame.get('price'), errors='coerce')
+    frame['stock'] = pd.to_numeric(frame['stock'], errors='coerce')
+    return frame[frame['sku_key'] != ''].drop_duplicates('sku_key').set_index('sku_key')
+
+
+class BranchUpdatePlan(NamedTuple):
+    updates: pd.DataFrame
+    skus: int
+    skus_without_product: int
+    unchanged: int
+    has_classifications: bool
+
+
+def plan_branch_updates(stock: pd.DataFrame, index: Optional[pd.DataFrame] = None,
+                        branches: Sequence[str] = (), branch_price: str = BRANCH_PRICE_KEEP,
+                        disable_out_of_stock: bool = False, skip_unchanged: bool = True,
+                        reset_missing_fields: bool = False) -> BranchUpdatePlan:
+    """
+    Una fila por (producto, sucursal) con el estado a enviar. Sin índice, el
+    id del producto sale del delta (exportación de la base de datos) y las
+    sucursales de `branches`.
+    """
+    if branch_price not in BRANCH_PRICE_MODES:
+        raise ValueError(f"modo de precio inválido '{branch_price}' (opciones: {', '.join(BRANCH_PRICE_MODES)})")
+    new = stock.rename(columns={'price': 'new_price', 'stock': 'new_stock'})
+    if index is None:
+        if 'product_id' not in new.columns:
+            raise ValueError("sin índice de SKUs, la entrada debe ser un delta con product_id")
+        index = new[['product_id']].dropna().reset_index()
+        new = new.drop(columns=['product_id'])
+    else:
+        new = new.drop(columns=['product_id'], errors='ignore')
+
+    if 'branch_id' not in index.columns:
+        if not branches:
+            raise ValueError("el índice no trae branch_id: indica las sucursales con --branch")
+        index = index.merge(pd.DataFrame({'branch_id': list(branches)}), how='cross')
+    elif branches:
+        index = index[index['branch_id'].isin(branches)]
+    index = index[index['branch_id'].fillna('') != '']
+
+    # Campos que el endpoint sobrescribe y que el índice no permite conservar
+    keeps_price = branch_price == BRANCH_PRICE_SHEET or 'price' in index.columns
+    has_classifications = 'classification_ids' in index.columns
+    if not reset_missing_fields and not (keeps_price and has_classifications):
+        lost = [name for name, kept in (('price', keeps_price), ('classification_ids', has_classifications))
+                if not kept]
+        raise ValueError(
+            f"el índice no trae {', '.join(lost)}: el endpoint los reemplazaría por vacío en cada sucursal. "
+            "Inclúyelos en el índice o confirma con --reset-missing-fields"
+        )
+
+    joined = index.merge(new[['sku', 'new_price', 'new_stock']], left_on='sku_key', right_index=True, how='inner')
+    new_stock = joined['new_stock'].clip(lower=0).round().astype('Int64')
+    is_enabled = (new_stock.isna() | (new_stock > 0)).astype(bool) if disable_out_of_stock \
+        else pd.Series(True, index=joined.index)
+    if branch_price == BRANCH_PRICE_SHEET:
+        price = joined['new_price'].round(2)
+    else:
+        price = joined['price'] if 'price' in joined.columns else pd.Series(float('nan'), index=joined.index)
+
+    updates = pd.DataFrame({
+        'sku': joined['sku'],
+        'product_id': joined['product_id'],
+        'branch_id': joined['branch_id'],
+        'is_enabled': is_enabled,
+        'price': price,
+        'stock': new_stock,
+    })
+    if has_classifications:
+        updates['classification_ids'] = joined['classification_ids']
+
+    unchanged = pd.Series(False, index=joined.index)
+    if skip_unchanged and 'stock' in joined.columns:
+        previous_stock = joined['stock'].round().astype('Int64')
+        same_stock = (previous_stock == new_stock).fillna(False) | (previous_stock.isna() & new_stock.isna())
+        previous_enabled = joined['is_enabled'] if 'is_enabled' in joined.columns else True
+        same_price = branch_price == BRANCH_PRICE_KEEP or (
+            ((joined['price'] - price).abs() < 0.005) | (joined['price'].isna() & price.isna())
+            if 'price' in joined.columns else False
+        )
+        unchanged = same_stock & (previous_enabled == is_enabled) & same_price
+    updates = updates[~unchanged.values]
+
+    return BranchUpdatePlan(
+        updates=updates.reset_index(drop=True),
+        skus=len(new),
+        skus_without_product=int((~new.index.isin(index['sku_key'])).sum()),
+        unchanged=int(unchanged.sum()),
+        has_classifications=has_classifications,
+    )
+
+
+# Tamaño de un elemento sin clasificaciones y de cada clasificación (UUID entre comillas), en bytes
+_ENTRY_BYTES = 160
+_CLASSIFICATION_BYTES = 40
+
+
+def _nullable(values: pd.Series) -> List:
+    """Columna como lista de tipos nativos, con None en lugar de NaN/NA"""
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def _availabilities(updates: pd.DataFrame, has_classifications: bool) -> List[Dict]:
+    """Elementos de `UpdateProductBranchAvailabilityDto`, armados por columnas"""
+    prices = [None if price is None else float(price) for price in _nullable(updates['price'])]
+    stocks = [None if stock is None else int(stock) for stock in _nullable(updates['stock'])]
+    entries = [
+        {"branch_id": branch_id, "is_enabled": bool(is_enabled), "price": price, "stock": stock}
+        for branch_id, is_enabled, price, stock in zip(updates['branch_id'].tolist(), updates['is_enabled'].tolist(),
+                                                       prices, stocks)
+    ]
+    if has_classifications:
+        parsed: Dict[str, List[str]] = {}
+        for entry, value in zip(entries, updates['classification_ids'].tolist()):
+            if value not in parsed:
+                parsed[value] = parse_id_list(value)
+            entry["classification_ids"] = list(parsed[value])
+    return entries
+
+
+def iter_payloads(plan: BranchUpdatePlan, max_branches: int = DEFAULT_MAX_BRANCHES_PER_REQUEST,
+                  max_body_bytes: int = DEFAULT_MAX_BODY_BYTES) -> Iterator[Dict]:
+    """
+    Un cuerpo por producto; si el producto tiene más sucursales que
+    `max_branches` o el cuerpo pasaría de `max_body_bytes` (estimado), se parte
+    en varios (cada request es su propia transacción en el backend).
+    """
+    max_branches = max(1, max_branches)
+    # Filas del mismo producto juntas, en el orden en que aparece cada producto
+    codes, _ = pd.factorize(plan.updates['product_id'])
+    updates = plan.updates.iloc[codes.argsort(kind='stable')]
+    entries = _availabilities(updates, plan.has_classifications)
+    rows = zip(updates['product_id'].tolist(), updates['sku'].tolist(), entries)
+    for product_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+        chunks: List[List[Dict]] = [[]]
+        size = 0
+        sku = None
+        for _, row_sku, entry in group:
+            sku = sku or row_sku
+            entry_size = _ENTRY_BYTES + _CLASSIFICATION_BYTES * len(entry.get("classification_ids", ()))
+            if chunks[-1] and (len(chunks[-1]) >= max_branches or size + entry_size > max_body_bytes):
+                chunks.append([])
+                size = 0
+            chunks[-1].append(entry)
+            size += entry_size
+        for part, availabilities in enumerate(chunks, 1):
+            yield {
+                "product_id": product_id,
+                "sku": sku,
+                "part": part,
+                "parts": len(chunks),
+                "body": {"availabilities": availabilities},
+            }
+
+
+def write_payloads(payloads: Iterable[Dict], path: str) -> Tuple[int, int]:
+    """JSONL con un request por línea; retorna (requests, sucursales)"""
+    requests_count = branches = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for payload in payloads:
+            f.write(json.dumps(payload, ensure_ascii=False) + '\n')
+            requests_count += 1
+            branches += len(payload['body']['availabilities'])
+    return requests_count, branches
+
+
+class SendResult(NamedTuple):
+    product_id: str
+    sku: str
+    part: int
+    branches: int
+    status: str
+    http_status: Optional[int]
+    error: str
+    seconds: float
+
+
+REPORT_COLUMNS = list(SendResult._fields)
+
+
+def _error_message(response: requests.Response) -> str:
+    """Mensaje de error de Nest ({"message": ...}) o el inicio del cuerpo"""
+    try:
+        message = response.json().get('message')
+    except (ValueError, AttributeError):
+        message = None
+    if isinstance(message, list):
+        message = '; '.join(str(item) for item in message)
+    return str(message or response.text[:200] or response.reason)
+
+
+class BranchAvailabilitySender:
+    """
+    Aplica los cuerpos con varios hilos sobre un HttpClient compartido (pool de
+    conexiones y reintentos con backoff en 429/5xx y errores de red). El
+    endpoint es un upsert, así que repetir un request no duplica datos.
+    """
+
+    def __init__(self, api_url: str = DEFAULT_API_URL, token: Optional[str] = None,
+                 workers: int = DEFAULT_SENDER_WORKERS, client: Optional[HttpClient] = None):
+        self.api_url = api_url.rstrip('/')
+        self.workers = max(1, workers)
+        self.client = client or HttpClient(pool_size=self.workers)
+        self.headers = {'Content-Type': 'application/json'}
+        if token:
+            self.headers['Authorization'] = f"Bearer {token}"
+
+    def url_for(self, product_id: str) -> str:
+        return self.api_url + ENDPOINT_PATH.format(product_id=product_id)
+
+    def send_one(self, payload: Dict) -> SendResult:
+        started = time.perf_counter()
+        http_status, error = None, ''
+        try:
+            response = self.client.post(self.url_for(payload['product_id']), json=payload['body'],
+                                        headers=self.headers)
+            http_status = response.status_code
+            if not response.ok:
+                error = _error_message(response)
+            response.close()
+        except requests.RequestException as e:
+            error = f"{type(e).__name__}: {e}"
+        return SendResult(
+            product_id=payload['product_id'],
+            sku=payload.get('sku', ''),
+            part=payload.get('part', 1),
+            branches=len(payload['body']['availabilities']),
+            status=STATUS_OK if http_status is not None and 200 <= http_status < 300 else STATUS_FAILED,
+            http_status=http_status,
+            error=error,
+            seconds=round(time.perf_counter() - started, 3),
+        )
+
+    def send(self, payloads: Iterable[Dict]) -> Iterator[Tuple[Dict, SendResult]]:
+        """(cuerpo, resultado) en el orden de entrada; como mucho 2x workers requests pendientes"""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = []
+            for payload in payloads:
+                pending.append((payload, executor.submit(self.send_one, payload)))
+                if len(pending) >= self.workers * 2:
+                    payload, future = pending.pop(0)
+                    yield payload, future.result()
+            for payload, future in pending:
+                yield payload, future.result()
+
+    def close(self):
+        self.client.close()
+
+
+class SendReport(NamedTuple):
+    sent: int
+    failed: int
+    branches: int
+    seconds: float
+    http_requests: int
+    retries: int
+    statuses: Dict[str, int]
+
+
+def apply_payloads(payloads: Iterable[Dict], sender: BranchAvailabilitySender, report_path: str,
+                   failed_path: Optional[str] = None) -> SendReport:
+    """
+    Envía los cuerpos y escribe el reporte CSV (una fila por request). Los
+    cuerpos que fallaron se guardan en `failed_path` para reenviarlos después.
+    """
+    started = time.perf_counter()
+    sent = failed = branches = 0
+    statuses: Dict[str, int] = {}
+    failed_file = None
+    with open(report_path, 'w', encoding='utf-8', newline='') as report:
+        writer = csv.writer(report)
+        writer.writerow(REPORT_COLUMNS)
+        try:
+            for payload, result in sender.send(payloads):
+                key = str(result.http_status or 'network')
+                statuses[key] = statuses.get(key, 0) + 1
+                writer.writerow(result)
+                if result.status == STATUS_OK:
+                    sent += 1
+                    branches += result.branches
+                    continue
+                failed += 1
+                if failed_path:
+                    if failed_file is None:
+                        failed_file = open(failed_path, 'w', encoding='utf-8')
+                    failed_file.write(json.dumps(to_jsonable(payload), ensure_ascii=False) + '\n')
+        finally:
+            if failed_file is not None:
+                failed_file.close()
+    stats = sender.client.stats()
+    if failed_path and not failed and os.path.exists(failed_path):
+        # Un archivo de fallidos viejo ya no aplica
+        os.remove(failed_path)
+    return SendReport(sent, failed, branches, time.perf_counter() - started,
+                      stats['requests'], stats['retries'], statuses)
@@ -0,0 +1,179 @@
+"""
+Circuit breaker por proveedor y fecha límite de la corrida.
+
+Cuando OpenAI o Unsplash están caídos, cada fila esperaría el timeout completo
+(más los reintentos) antes de seguir con la siguiente. El circuit breaker
+cuenta los fallos consecutivos de un proveedor y, al llegar a K, se abre: las
+llamadas siguientes fallan de inmediato sin tocar la red. Pasado
+`reset_timeout`, el circuito queda semiabierto y deja pasar una sola llamada
+de prueba; si funciona se cierra, si falla se vuelve a abrir.
+
+`Deadline` marca el momento a partir del cual ya no se llama a ningún
+proveedor: las filas restantes se completan sin red y quedan marcadas para
+volver a enriquecerse después.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+# Errores de red del cliente de OpenAI (sin importar el paquete, que es opcional)
+NETWORK_ERROR_NAMES = ('APIConnectionError', 'APITimeoutError')
+
+
+class ProviderUnavailable(Exception):
+    """La llamada no se hizo: el proveedor no está disponible en esta corrida"""
+
+
+class CircuitOpenError(ProviderUnavailable):
+    pass
+
+
+class DeadlineExceeded(ProviderUnavailable):
+    pass
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Errores que indican un proveedor degradado: red, timeouts, 429 y 5xx.
+    Un error del request (p. ej. 400) o al interpretar la respuesta no abre el circuito.
+    """
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is None:
+        return isinstance(error, (ConnectionError, TimeoutError, requests.RequestException)) or any(
+            cls.__name__ in NETWORK_ERROR_NAMES for cls in type(error).__mro__
+        )
+    return status == 429 or status >= 500
+
+
+class CircuitBreaker:
+    """Estado del circuito de un proveedor, seguro para varios hilos"""
+
+    def __init__(self, name: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """True si la llamada puede hacerse (en semiabierto, solo una prueba a la vez)"""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def is_open(self) -> bool:
+        """Consulta sin consumir la llamada de prueba: True si hoy se rechazaría"""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return False
+            if self.state == STATE_OPEN:
+                return self._clock() - self._opened_at < self.reset_timeout
+            return self._probe_in_flight
+
+    def record_success(self):
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                print(f"    ✅ {self.name} respondió de nuevo; circuito cerrado")
+            self.state = STATE_CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def release(self):
+        """Libera la llamada de prueba sin registrar resultado (la llamada no llegó a evaluarse)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == STATE_HALF_OPEN or (
+                self.state == STATE_CLOSED and self.consecutive_failures >= self.failure_threshold
+            ):
+                if self.state == STATE_CLOSED:
+                    self.opened += 1
+                    print(f"    ⚠️  Circuito de {self.name} abierto tras {self.consecutive_failures} fallos "
+                          f"consecutivos; se prueba de nuevo en {self.reset_timeout:g}s")
+                self.state = STATE_OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+
+    def check(self):
+        """Lanza CircuitOpenError si la llamada no debe hacerse"""
+        if not self.allow():
+            raise CircuitOpenError(f"circuito de {self.name} abierto")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"opened": self.opened, "rejected": self.rejected, "open": int(self.state != STATE_CLOSED)}
+
+
+class Deadline:
+    """Momento límite para llamar a proveedores (None = sin límite)"""
+
+    def __init__(self, seconds: Optional[float], clock=time.monotonic):
+        self._clock = clock
+        self.seconds = seconds
+        self._ends_at = clock() + seconds if seconds is not None else None
+        self._announced = False
+        self._lock = threading.Lock()
+
+    def expired(self) -> bool:
+        if self._ends_at is None or self._clock() < self._ends_at:
+            return False
+        with self._lock:
+            if not self._announced:
+                self._announced = True
+                print(f"    ⏰ Fecha límite de {self.seconds:g}s alcanzada: las filas restantes se completan sin "
+                      "IA ni búsqueda de imágenes y quedan para re-enriquecer")
+        return True
+
+    def remaining(self) -> Optional[float]:
+        if self._ends_at is None:
+            return None
+        return max(0.0, self._ends_at - self._clock())
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded("fecha límite de la corrida alcanzada")
+
+
+def parse_duration(text: str) -> float:
+    """Segundos de una duración como '90', '45s', '30m' o '2h'"""
+    text = (text or '').strip().lower()
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    multiplier = units.get(text[-1:], None)
+    number = text[:-1] if multiplier else text
+    try:
+        seconds = float(number) * (multiplier or 1)
+    except ValueError:
+        raise ValueError(f"duración inválida '{text}' (ejemplos: 90, 45s, 30m, 2h)")
+    if seconds <= 0:
+        raise ValueError(f"la duración debe ser mayor a cero: '{text}'")
+    return seconds
@@ -0,0 +1,253 @@
+"""
+Caché persistente (SQLite) de resultados de enriquecimiento con IA.
+
+La llave combina el nombre y número de parte normalizados, el modelo y un
+hash de la versión del prompt, de modo que un cambio en el prompt invalida
+automáticamente las entradas anteriores. Soporta TTL, límite de entradas
+(se descartan las menos usadas recientemente) y contadores de hits/misses.
+
+`ImageSearchCache` reutiliza el mismo esquema para las búsquedas de imágenes.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'agora-enrich')
+DEFAULT_TTL_DAYS = 90
+DEFAULT_MAX_ENTRIES = 200000
+# Accesos (hits) acumulados en memoria antes de escribirlos en su propia transacción
+ACCESS_FLUSH_EVERY = 500
+
+# Modos de uso del caché
+CACHE_MODE_USE = 'use'          # leer y escribir
+CACHE_MODE_REFRESH = 'refresh'  # ignorar lo guardado, pero escribir resultados nuevos
+CACHE_MODE_BYPASS = 'bypass'    # no leer ni escribir
+
+
+def strip_accents(text: str) -> str:
+    """Remueve acentos (NFKD) conservando el resto de los caracteres"""
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def normalize_name(name: str) -> str:
+    """Nombre en minúsculas, sin acentos y con espacios colapsados"""
+    return ' '.join(strip_accents(str(name or '')).lower().split())
+
+
+def normalize_part_number(part_number: str) -> str:
+    """Número de parte en mayúsculas y sin separadores (espacios, guiones, puntos)"""
+    return re.sub(r'[^0-9A-Z]', '', strip_accents(str(part_number or '')).upper())
+
+
+def prompt_version(*parts) -> str:
+    """Hash corto que identifica una versión del prompt y sus parámetros"""
+    digest = hashlib.sha256('\x1f'.join(str(p) for p in parts).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class EnrichmentCache:
+    """Caché clave-valor en SQLite, seguro para varios hilos"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl_days: Optional[float] = DEFAULT_TTL_DAYS,
+                 max_entries: Optional[int] = DEFAULT_MAX_ENTRIES, mode: str = CACHE_MODE_USE,
+                 filename: str = 'enrichment.sqlite3'):
+        self.mode = mode
+        self.ttl_seconds = ttl_days * 86400 if ttl_days else None
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        # key -> último acceso, pendiente de escribir (un hit no abre una transacción de escritura)
+        self._pending_access: Dict[str, float] = {}
+
+        if mode == CACHE_MODE_BYPASS:
+            return
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, filename)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)')
+        self._conn.commit()
+        self.prune()
+        # Si la corrida termina sin llamar a close (p. ej. una excepción), confirmar lo pendiente
+        atexit.register(self.close)
+
+    @staticmethod
+    def make_key(name: str, part_number: str, model: str, version: str) -> str:
+        raw = '\x1f'.join([normalize_name(name), normalize_part_number(part_number), model, version])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self._conn or self.mode != CACHE_MODE_USE:
+            return None
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT value, created_at FROM entries WHERE key = ?', (key,)).fetchone()
+            if row and (self.ttl_seconds is None or now - row[1] <= self.ttl_seconds):
+                self._pending_access[key] = now
+                if len(self._pending_access) >= ACCESS_FLUSH_EVERY:
+                    self._flush_access()
+                    self._conn.commit()
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Dict):
+        if not self._conn:
+            return
+
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, payload, now, now)
+            )
+            self.writes += 1
+            self._flush_access()
+            # Cada resultado costó un request: se confirma de inmediato (en WAL es barato)
+            self._conn.commit()
+
+    def _flush_access(self):
+        """Escribe los accesos pendientes en la transacción actual (llamar con el lock tomado)"""
+        if self._pending_access:
+            self._conn.executemany('UPDATE entries SET accessed_at = ? WHERE key = ?',
+                                   [(accessed_at, key) for key, accessed_at in self._pending_access.items()])
+            self._pending_access.clear()
+
+    def prune(self) -> int:
+        """Elimina entradas vencidas y las menos usadas si se excede el límite"""
+        if not self._conn:
+            return 0
+
+        removed = 0
+        with self._lock:
+            # Los accesos recientes cuentan para decidir qué entradas descartar
+            self._flush_access()
+            if self.ttl_seconds is not None:
+                cursor = self._conn.execute('DELETE FROM entries WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+                removed += cursor.rowcount
+            if self.max_entries:
+                count = self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+                excess = count - self.max_entries
+                if excess > 0:
+                    cursor = self._conn.execute(
+                        'DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)',
+                        (excess,)
+                    )
+                    removed += cursor.rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        if not self._conn:
+            return
+        self.prune()
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+
+DEFAULT_IMAGE_TTL_DAYS = 30
+DEFAULT_IMAGE_NEGATIVE_TTL_DAYS = 3
+# Cambiar si cambian los parámetros de la búsqueda (orientación, resultados por página, ...)
+IMAGE_QUERY_VERSION = 'unsplash-v1'
+
+
+def normalize_image_query(query: str) -> str:
+    """Términos únicos, sin acentos y ordenados: el orden no cambia la búsqueda"""
+    return ' '.join(sorted(set(normalize_name(query).split())))
+
+
+class ImageSearchCache(EnrichmentCache):
+    """
+    Caché de búsqueda → URL de imagen. También guarda las búsquedas sin
+    resultados, con un TTL más corto, para no volver a gastar cuota en ellas.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl_days: Optional[float] = DEFAULT_IMAGE_TTL_DAYS,
+                 negative_ttl_days: Optional[float] = DEFAULT_IMAGE_NEGATIVE_TTL_DAYS,
+                 max_entries: Optional[int] = DEFAULT_MAX_ENTRIES, mode: str = CACHE_MODE_USE):
+        self.negative_ttl_seconds = negative_ttl_days * 86400 if negative_ttl_days else None
+        self.negative_hits = 0
+        super().__init__(cache_dir, ttl_days=ttl_days, max_entries=max_entries, mode=mode,
+                         filename='image_search.sqlite3')
+
+    @staticmethod
+    def make_query_key(query: str) -> str:
+        raw = '\x1f'.join([normalize_image_query(query), IMAGE_QUERY_VERSION])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, query: str) -> Tuple[bool, Optional[str]]:
+        """(encontrado, url); url es None si la búsqueda se guardó sin resultados"""
+        cached = self.get(self.make_query_key(query))
+        if cached is None:
+            return False, None
+        if cached.get('url') is None:
+            with self._lock:
+                self.negative_hits += 1
+        return True, cached.get('url')
+
+    def store(self, query: str, url: Optional[str]):
+        self.set(self.make_query_key(query), {"url": url})
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = super().get(key)
+        if value is None or value.get('url') is not None or self.negative_ttl_seconds is None:
+            return value
+        # Resultado negativo: aplicar el TTL corto
+        with self._lock:
+            row = self._conn.execute('SELECT created_at FROM entries WHERE key = ?', (key,)).fetchone()
+            if row and time.time() - row[0] <= self.negative_ttl_seconds:
+                return value
+            self.hits -= 1
+            self.misses += 1
+        return None
+
+    def prune(self) -> int:
+        removed = 0
+        if self._conn and self.negative_ttl_seconds is not None:
+            with self._lock:
+                cursor = self._conn.execute(
+                    'DELETE FROM entries WHERE value = ? AND created_at < ?',
+                    (json.dumps({"url": None}), time.time() - self.negative_ttl_seconds)
+                )
+                removed += cursor.rowcount
+        return removed + super().prune()
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats["negative_hits"] = self.negative_hits
+        return stats
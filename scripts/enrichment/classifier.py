@@ -0,0 +1,197 @@
+"""
+Clasificador de tipo de producto por palabras clave, precompilado.
+
+Todas las palabras clave se combinan en una sola expresión regular con
+límites de palabra (acepta plurales simples: filtro/filtros), y el texto se
+normaliza sin acentos ni mayúsculas antes de buscar. Las palabras de los tipos
+en `prefix_types` también coinciden como prefijo, porque las hojas de
+existencias suelen pegar palabras ("ACEITEMINERAL"). Retorna el tipo con
+mayor puntaje, los puntajes por tipo y una confianza entre 0 y 1. En empate
+gana el tipo cuya palabra aparece primero en el texto (el sustantivo
+principal: "SELLO ... LIQUIDO" es un sello), sin depender del orden en que
+se declaran los tipos.
+
+`classify_batch` clasifica una columna completa con operaciones de pandas:
+separa los textos en palabras, busca cada palabra distinta una sola vez y
+calcula puntajes y desempates por columnas, con el mismo resultado que
+`classify_folded` fila por fila.
+"""
+
+import re
+import string
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Un número de parte sin letras no puede contener palabras clave
+_HAS_LETTERS = re.compile(r'[^\W\d_]')
+# Separador de textos en `classify_batch`; no es carácter de palabra
+_TEXT_SEPARATOR = '\x00'
+# El texto normalizado es ASCII: \w equivale a [0-9A-Za-z_] y el resto de los bytes separa palabras
+_WORD_BYTES = frozenset(string.ascii_letters.encode() + string.digits.encode() + b'_' + _TEXT_SEPARATOR.encode())
+_SPLIT_TABLE = bytes(byte if byte in _WORD_BYTES else ord(' ') for byte in range(256))
+
+
+class Classification(NamedTuple):
+    product_type: str
+    confidence: float
+    scores: Dict[str, int]
+
+
+def fold_text(text) -> str:
+    """Texto en minúsculas y sin acentos (ASCII)"""
+    text = str(text or '')
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return text.lower()
+
+
+def _as_list(values: Sequence) -> list:
+    """Lista de Python (iterar una Series de pandas elemento por elemento es lento)"""
+    return values.tolist() if hasattr(values, 'tolist') else list(values)
+
+
+class KeywordClassifier:
+    """Clasificador compilado a partir de {tipo: [palabras clave]}"""
+
+    def __init__(self, keywords: Dict[str, List[str]], default_type: str = 'refaccion',
+                 prefix_types: Sequence[str] = ()):
+        self.default_type = default_type
+        self.types = list(keywords)
+        # Cada palabra normalizada apunta a los tipos en los que aparece
+        self._keyword_types: Dict[str, Tuple[str, ...]] = {}
+        prefixes = set()
+        for product_type, words in keywords.items():
+            for word in words:
+                folded = fold_text(word).strip()
+                if folded:
+                    current = self._keyword_types.get(folded, ())
+                    if product_type not in current:
+                        self._keyword_types[folded] = current + (product_type,)
+                    if product_type in prefix_types:
+                        prefixes.add(folded)
+
+        # Las palabras más largas primero, para que la alternación prefiera la coincidencia más específica
+        def alternation(words) -> str:
+            return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+        exact = alternation(set(self._keyword_types) - prefixes)
+        pattern = rf'\b({exact})(?:s|es)?\b' if exact else ''
+        if prefixes:
+            pattern = '|'.join(filter(None, [pattern, rf'\b({alternation(prefixes)})\w*']))
+        self._pattern = re.compile(pattern)
+        # Con palabras clave de una sola palabra, cada palabra del texto coincide (o no) por sí sola
+        self._single_words = all(re.fullmatch(r'\w+', word) for word in self._keyword_types)
+
+    def classify_folded(self, folded: str) -> Classification:
+        """Clasifica un texto ya normalizado con `fold_text`"""
+        # Palabra -> posición de su primera aparición
+        matched: Dict[str, int] = {}
+        for match in self._pattern.finditer(folded):
+            word = next(group for group in match.groups() if group)
+            matched.setdefault(word, match.start())
+        if not matched:
+            return Classification(self.default_type, 0.0, {})
+
+        scores: Dict[str, int] = {}
+        first_position: Dict[str, int] = {}
+        for word, position in matched.items():
+            for product_type in self._keyword_types[word]:
+                scores[product_type] = scores.get(product_type, 0) + 1
+                first_position[product_type] = min(position, first_position.get(product_type, position))
+
+        # Mayor puntaje; en empate, la palabra que aparece primero y después el nombre del tipo
+        best = min(scores, key=lambda t: (-scores[t], first_position[t], t))
+        return Classification(best, scores[best] / sum(scores.values()), scores)
+
+    def classify(self, name: str, part_number: str = "") -> Classification:
+        return self.classify_folded(fold_text(f"{name} {part_number}"))
+
+    def _keyword_ids(self, words: List[bytes]) -> np.ndarray:
+        """Índice de la palabra clave con la que coincide cada palabra ASCII (-1 si ninguna)"""
+        # Sobre bytes, \w de la expresión regular es ASCII: igual que en el texto normalizado
+        pattern = re.compile(self._pattern.pattern.encode('ascii'))
+        keyword_index = {keyword.encode('ascii'): i for i, keyword in enumerate(self._keyword_types)}
+        # Filtro barato antes de la expresión regular: las dos primeras letras de alguna palabra clave
+        heads = {keyword[:2] for keyword in keyword_index}
+        ids = np.full(len(words), -1, dtype=np.int64)
+        for i, word in enumerate(words):
+            if word[:2] not in heads:
+                continue
+            match = pattern.match(word)
+            if match:
+                ids[i] = keyword_index[next(group for group in match.groups() if group)]
+        return ids
+
+    def classify_batch(self, names: Sequence, part_numbers: Optional[Sequence] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Clasifica una columna completa. Los números de parte sin letras se
+        ignoran (no pueden contener palabras clave ni deben impedir reutilizar
+        el resultado de un nombre repetido). Retorna (tipos, confianzas)
+        alineados con `names`.
+        """
+        names = ['' if name is None or name != name else str(name) for name in _as_list(names)]
+        if part_numbers is not None:
+            names = [
+                f"{name} {part}" if part and part == part and not str(part).isdigit() and _HAS_LETTERS.search(str(part))
+                else name
+                for name, part in zip(names, _as_list(part_numbers))
+            ]
+        # Las hojas de existencias repiten mucho las descripciones
+        codes, texts = pd.factorize(np.asarray(names, dtype=object))
+        texts = texts.tolist()
+        types = np.full(len(texts), self.default_type, dtype=object)
+        confidences = np.zeros(len(texts))
+        if not texts:
+            return types[codes], confidences[codes]
+
+        if not self._single_words:
+            for i, text in enumerate(texts):
+                result = self.classify_folded(fold_text(text))
+                types[i], confidences[i] = result.product_type, result.confidence
+            return types[codes], confidences[codes]
+
+        # Todos los textos en una sola cadena, con el separador como palabra propia. La normalización
+        # es carácter por carácter, así que equivale a normalizar cada texto; las palabras salen de
+        # `bytes.split` en lugar de una expresión regular
+        joined = _TEXT_SEPARATOR.join(texts)
+        if joined.count(_TEXT_SEPARATOR) != len(texts) - 1:
+            joined = _TEXT_SEPARATOR.join(text.replace(_TEXT_SEPARATOR, ' ') for text in texts)
+        blob = fold_text(joined.replace(_TEXT_SEPARATOR, f' {_TEXT_SEPARATOR} ')).encode('ascii')
+        tokens = blob.translate(_SPLIT_TABLE).split()
+        token_codes, unique_tokens = pd.factorize(np.asarray(tokens, dtype=object))
+        unique_tokens = unique_tokens.tolist()
+        separators = np.zeros(len(unique_tokens), dtype=bool)
+        separator = _TEXT_SEPARATOR.encode('ascii')
+        if separator in unique_tokens:
+            separators[unique_tokens.index(separator)] = True
+        is_separator = separators[token_codes]
+        text_ids = np.cumsum(is_separator)
+        keyword_ids = self._keyword_ids(unique_tokens)[token_codes]
+
+        # Una fila por palabra clave encontrada: (texto, palabra clave, posición)
+        found = (keyword_ids >= 0) & ~is_separator
+        hits = pd.DataFrame({'text': text_ids[found], 'keyword': keyword_ids[found],
+                             'position': np.flatnonzero(found)})
+        # Cada palabra clave cuenta una vez por texto, en su primera aparición
+        hits = hits.drop_duplicates(['text', 'keyword'])
+        if hits.empty:
+            return types[codes], confidences[codes]
+
+        # Una fila por (texto, tipo) de cada palabra clave encontrada
+        keyword_types = list(self._keyword_types.values())
+        hits['type'] = [keyword_types[keyword] for keyword in hits['keyword'].tolist()]
+        hits = hits.explode('type')
+        scores = hits.groupby(['text', 'type'], sort=False).agg(
+            score=('keyword', 'size'), first_position=('position', 'min')
+        ).reset_index()
+        scores['confidence'] = scores['score'] / scores.groupby('text')['score'].transform('sum')
+
+        # Mayor puntaje; en empate, la palabra que aparece primero y después el nombre del tipo
+        best = scores.sort_values(['text', 'score', 'first_position', 'type'],
+                                  ascending=[True, False, True, True]).drop_duplicates('text')
+        best_texts = best['text'].to_numpy()
+        types[best_texts] = best['type'].to_numpy()
+        confidences[best_texts] = best['confidence'].to_numpy()
+        return types[codes], confidences[codes]
@@ -0,0 +1,53 @@
+"""
+Deduplicación de filas antes del enriquecimiento.
+
+Las hojas de existencias repiten el mismo producto con pequeñas diferencias
+(mayúsculas, espacios, formato del número de parte) o lo listan una vez por
+ubicación. Se agrupan las filas equivalentes, se enriquece solo la primera de
+cada grupo (representante) y su resultado se copia al resto.
+"""
+
+from typing import Dict, Optional, Tuple
+
+from enrichment.cache import normalize_name, normalize_part_number
+
+
+def dedup_key(name: str, part_number: str) -> Tuple[str, str]:
+    """
+    Identidad de un producto: el número de parte normalizado si existe;
+    si no, el nombre normalizado.
+    """
+    normalized_part = normalize_part_number(part_number)
+    if normalized_part:
+        return ('part', normalized_part)
+    return ('name', normalize_name(name))
+
+
+class DedupIndex:
+    """Asigna a cada fila la posición de su representante (primera aparición)"""
+
+    def __init__(self):
+        self._representatives: Dict[Tuple[str, str], int] = {}
+        self.rows = 0
+
+    def assign(self, position: int, name: str, part_number: str) -> Optional[int]:
+        """Retorna None si la fila es representante, o la posición de su representante"""
+        self.rows += 1
+        key = dedup_key(name, part_number)
+        representative = self._representatives.get(key)
+        if representative is None:
+            self._representatives[key] = position
+        return representative
+
+    @property
+    def groups(self) -> int:
+        return len(self._representatives)
+
+    @property
+    def duplicates(self) -> int:
+        return self.rows - self.groups
+
+    @property
+    def ratio(self) -> float:
+        """Filas por grupo (1.0 = sin duplicados)"""
+        return self.rows / self.groups if self.groups else 1.0
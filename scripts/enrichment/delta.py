@@ -0,0 +1,252 @@
+"""
+Delta de precio y disponibilidad, sin re-enriquecer.
+
+La mayoría de las actualizaciones diarias solo cambian existencias y precios.
+Este módulo compara la hoja de existencias nueva contra el estado actual del
+catálogo (la salida enriquecida anterior o una exportación CSV de
+catalog.products), ambos indexados por SKU normalizado, y calcula con
+operaciones de pandas por columnas qué precios cambiaron y qué productos
+cambiaron de disponibilidad. El resultado es un archivo compacto (CSV o JSONL)
+listo para aplicarse en bloque. No usa la IA ni la red.
+"""
+
+import csv
+import os
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from enrichment.incremental import workbook_paths
+from enrichment.reader import InputReader
+
+# Diferencia mínima de precio que cuenta como cambio (los precios se guardan con 2 decimales)
+DEFAULT_PRICE_TOLERANCE = 0.005
+
+CHANGE_PRICE = 'price'
+CHANGE_AVAILABILITY = 'availability'
+
+# Columnas del archivo delta, en orden
+DELTA_COLUMNS = [
+    'sku', 'product_id', 'price', 'previous_price', 'is_available', 'previous_is_available', 'stock', 'changes',
+]
+
+# Encabezados aceptados en el estado del catálogo (exportación de catalog.products o Excel enriquecido)
+CATALOG_COLUMN_MAPPING = {
+    'sku': 'sku',
+    'sku (número de parte)': 'sku',
+    'part_number': 'sku',
+    'id': 'product_id',
+    'product_id': 'product_id',
+    'price': 'price',
+    'base_price': 'price',
+    'precio base': 'price',
+    'is_available': 'is_available',
+    'disponible': 'is_available',
+    'stock': 'stock',
+    'existencia original': 'stock',
+}
+
+_TRUE_VALUES = ['true', 't', '1', '1.0', 'yes', 'si', 'sí', 'verdadero']
+
+
+def read_csv_table(path: str) -> pd.DataFrame:
+    """CSV como texto (sin NaN), detectando el separador como `InputReader`"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(8192)
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t|').delimiter
+    except csv.Error:
+        delimiter = ','
+    return pd.read_csv(path, dtype=str, keep_default_na=False, sep=delimiter, encoding='utf-8-sig')
+
+
+def normalize_sku_series(skus: pd.Series) -> pd.Series:
+    """Versión por columnas de `normalize_part_number`: mayúsculas, sin acentos ni separadores"""
+    text = skus.fillna('').astype(str).str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+    return text.str.upper().str.replace(r'[^0-9A-Z]', '', regex=True)
+
+
+def parse_bool_series(values: pd.Series) -> pd.Series:
+    if values.dtype == bool:
+        return values
+    return values.fillna('').astype(str).str.strip().str.lower().isin(_TRUE_VALUES)
+
+
+def available_from_stock(stock: pd.Series) -> pd.Series:
+    """
+    Disponibilidad por existencia como booleano con nulos: sin existencia
+    registrada queda NA (no se sabe), y el delta conserva la del catálogo.
+    """
+    return (stock > 0).astype('boolean').mask(stock.isna())
+
+
+def read_stock_frame(path: str) -> Tuple[pd.DataFrame, int]:
+    """
+    Hoja de existencias nueva -> DataFrame indexado por SKU normalizado con
+    price, stock e is_available. Las filas repetidas de un SKU (p. ej. una por
+    ubicación) suman su existencia y toman el primer precio válido.
+    Retorna también cuántas filas no tenían SKU (no se pueden aplicar por SKU).
+    """
+    reader = InputReader(path)
+    if 'part_number' not in reader.columns:
+        raise ValueError("La hoja de existencias no tiene columna de número de parte / SKU")
+    if 'stock' not in reader.columns:
+        raise ValueError("La hoja de existencias no tiene columna de existencias: no se puede comparar la disponibilidad")
+    records = list(reader)
+    frame = pd.DataFrame.from_records(records, columns=['name', 'part_number', 'price', 'stock'])
+    # El lector usa 0 para precios vacíos o no numéricos: no son un precio nuevo
+    frame['price'] = frame['price'].where(frame['price'] > 0)
+    frame['stock'] = pd.to_numeric(frame['stock'], errors='coerce')
+    frame['sku_key'] = normalize_sku_series(frame['part_number'])
+    without_sku = int((frame['sku_key'] == '').sum())
+    frame = frame[frame['sku_key'] != '']
+
+    groups = frame.groupby('sku_key', sort=False)
+    grouped = groups[['part_number', 'price']].first().rename(columns={'part_number': 'sku'})
+    # Sin ninguna existencia registrada el SKU queda sin existencia (no en 0)
+    grouped['stock'] = groups['stock'].sum(min_count=1)
+    grouped['is_available'] = available_from_stock(grouped['stock'])
+    return grouped, without_sku
+
+
+def _catalog_rows_from_workbook(path: str) -> pd.DataFrame:
+    """Columnas del catálogo leídas del Excel enriquecido anterior (y sus partes)"""
+    frames = []
+    for workbook_path in workbook_paths(path):
+        wb = openpyxl.load_workbook(workbook_path, read_only=True, data_only=True)
+        try:
+            for ws in wb.worksheets:
+                rows = ws.iter_rows(values_only=True)
+                header = next(rows, None)
+                fields = [CATALOG_COLUMN_MAPPING.get(str(cell).strip().lower()) if cell is not None else None
+                          for cell in header or ()]
+                if 'sku' not in fields or 'price' not in fields:
+                    continue
+                indexes = {field: idx for idx, field in reversed(list(enumerate(fields))) if field}
+                data = [[row[idx] if idx < len(row) else None for idx in indexes.values()] for row in rows if row]
+                frames.append(pd.DataFrame(data, columns=list(indexes)))
+        finally:
+            wb.close()
+    if not frames:
+        raise ValueError(f"{path}: no tiene hojas con columnas de SKU y precio")
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_catalog_frame(path: str) -> pd.DataFrame:
+    """
+    Estado actual del catálogo -> DataFrame indexado por SKU normalizado con
+    price, is_available y (si existe) product_id. Acepta el Excel enriquecido
+    anterior o un CSV exportado de catalog.products (sku, price, is_available, id).
+    """
+    if os.path.splitext(path)[1].lower() in ('.csv', '.txt'):
+        raw = read_csv_table(path)
+        raw.columns = [CATALOG_COLUMN_MAPPING.get(str(column).strip().lower(), column) for column in raw.columns]
+        raw = raw.loc[:, ~raw.columns.duplicated()]
+    else:
+        raw = _catalog_rows_from_workbook(path)
+    missing = [column for column in ('sku', 'price') if column not in raw.columns]
+    if missing:
+        raise ValueError(f"{path}: faltan columnas {', '.join(missing)}")
+
+    catalog = pd.DataFrame({
+        'sku_key': normalize_sku_series(raw['sku']),
+        # catalog.products guarda DECIMAL(10,2)
+        'price': pd.to_numeric(raw['price'], errors='coerce').round(2),
+        'is_available': (parse_bool_series(raw['is_available']) if 'is_available' in raw.columns
+                         else pd.Series(True, index=raw.index)),
+        'product_id': raw['product_id'].replace('', None) if 'product_id' in raw.columns else None,
+    })
+    catalog = catalog[catalog['sku_key'] != '']
+    return catalog.drop_duplicates('sku_key').set_index('sku_key')
+
+
+class DeltaReport(NamedTuple):
+    delta: pd.DataFrame
+    matched: int
+    price_changes: int
+    availability_changes: int
+    new_skus: int
+    missing_skus: int
+    rows_without_sku: int
+
+
+def compute_delta(stock: pd.DataFrame, catalog: pd.DataFrame,
+                  price_tolerance: float = DEFAULT_PRICE_TOLERANCE, rows_without_sku: int = 0) -> DeltaReport:
+    """SKUs del catálogo cuyo precio o disponibilidad cambió en la hoja nueva"""
+    joined = stock.join(catalog, how='inner', lsuffix='', rsuffix='_previous')
+    new_price = joined['price'].round(2)
+    previous_price = joined['price_previous']
+    price_changed = new_price.notna() & (previous_price.isna() | ((new_price - previous_price).abs() > price_tolerance))
+    # Sin existencia registrada se conserva la disponibilidad del catálogo
+    is_available = joined['is_available'].fillna(joined['is_available_previous']).astype(bool)
+    availability_changed = is_available != joined['is_available_previous']
+    changed = price_changed | availability_changed
+
+    changes = np.where(price_changed & availability_changed, f"{CHANGE_PRICE}|{CHANGE_AVAILABILITY}",
+                       np.where(price_changed, CHANGE_PRICE, CHANGE_AVAILABILITY))
+    stock_values = joined['stock'].round().astype('Int64')
+    delta = pd.DataFrame({
+        'sku': joined['sku'],
+        'product_id': joined['product_id'] if 'product_id' in joined.columns else None,
+        # Sin cambio de precio se conserva el precio del catálogo
+        'price': new_price.where(price_changed, previous_price),
+        'previous_price': previous_price,
+        'is_available': is_available,
+        'previous_is_available': joined['is_available_previous'],
+        'stock': stock_values,
+        'changes': changes,
+    }, index=joined.index)[changed.values]
+
+    return DeltaReport(
+        delta=delta[DELTA_COLUMNS].reset_index(drop=True),
+        matched=len(joined),
+        price_changes=int(price_changed.sum()),
+        availability_changes=int(availability_changed.sum()),
+        new_skus=int((~stock.index.isin(catalog.index)).sum()),
+        missing_skus=int((~catalog.index.isin(stock.index)).sum()),
+        rows_without_sku=rows_without_sku,
+    )
+
+
+def write_delta(delta: pd.DataFrame, path: str) -> str:
+    """CSV o JSONL según la extensión de `path`"""
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        delta.to_json(path, orient='records', lines=True, force_ascii=False)
+    else:
+        delta.to_csv(path, index=False)
+    return path
+
+
+def export_stock_delta(input_path: str, catalog_path: str, output_path: str,
+                       price_tolerance: float = DEFAULT_PRICE_TOLERANCE) -> Tuple[DeltaReport, Dict[str, float]]:
+    """Lee, compara y escribe el delta; retorna el reporte y los segundos por etapa"""
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    stock, without_sku = read_stock_frame(input_path)
+    timings['read_input'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    catalog = read_catalog_frame(catalog_path)
+    timings['read_catalog'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    report = compute_delta(stock, catalog, price_tolerance, without_sku)
+    timings['compute'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    write_delta(report.delta, output_path)
+    timings['write'] = time.perf_counter() - started
+    return report, timings
+
+
+def default_delta_path(input_path: str, extension: str = '.csv') -> str:
+    base, _ = os.path.splitext(input_path)
+    return f"{base}.delta{extension}"
+
+
+def rows_per_second(rows: int, timings: Dict[str, float]) -> Optional[float]:
+    total = sum(timings.values())
+    return rows / total if total > 0 else None
@@ -0,0 +1,132 @@
+"""
+Variantes redimensionadas (miniaturas, WebP/JPEG) de las imágenes verificadas.
+
+El redimensionado y la compresión usan CPU, así que se hacen en un pool de
+procesos; la subida al almacenamiento (E/S) se hace desde los hilos que ya
+procesan las filas. Cada variante se nombra con el hash de contenido de la
+imagen original, de modo que al repetir una corrida las variantes que ya
+existen en el almacenamiento no se vuelven a generar ni a subir.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from enrichment.storage import StorageAdapter
+
+DEFAULT_STORAGE_PREFIX = 'products/enriched'
+
+
+class Variant(NamedTuple):
+    name: str
+    max_size: int      # lado mayor en pixeles
+    format: str        # 'WEBP' o 'JPEG'
+    quality: int = 82
+
+
+DEFAULT_VARIANTS = (
+    Variant('thumb', 320, 'WEBP'),
+    Variant('medium', 800, 'WEBP'),
+    Variant('large', 1600, 'JPEG', 85),
+)
+# Variante cuya ruta se escribe en la columna "URL de Imagen"
+DEFAULT_PRIMARY_VARIANT = 'medium'
+
+VARIANT_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+VARIANT_CONTENT_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+
+def variant_key(prefix: str, sha256: str, variant: Variant) -> str:
+    """Llave de almacenamiento de una variante: <prefix>/ab/<hash>-<variante>.<ext>"""
+    return f"{prefix}/{sha256[:2]}/{sha256}-{variant.name}.{VARIANT_EXTENSIONS[variant.format]}"
+
+
+def render_variants(source_path: str, variants: Tuple[Variant, ...]) -> List[bytes]:
+    """
+    Genera los bytes de cada variante (se ejecuta en un proceso del pool).
+    Nunca se amplía la imagen; JPEG no admite transparencia, se aplana sobre blanco.
+    """
+    rendered = []
+    with Image.open(source_path) as source:
+        source.load()
+        has_alpha = source.mode in ('RGBA', 'LA') or (source.mode == 'P' and 'transparency' in source.info)
+        base = source.convert('RGBA' if has_alpha else 'RGB')
+
+    for variant in variants:
+        image = base.copy()
+        image.thumbnail((variant.max_size, variant.max_size), Image.LANCZOS)
+        if variant.format == 'JPEG' and image.mode == 'RGBA':
+            flattened = Image.new('RGB', image.size, (255, 255, 255))
+            flattened.paste(image, mask=image.split()[3])
+            image = flattened
+        buffer = BytesIO()
+        options = {'quality': variant.quality}
+        if variant.format == 'JPEG':
+            options.update(optimize=True, progressive=True)
+        else:
+            options['method'] = 4
+        image.save(buffer, variant.format, **options)
+        rendered.append(buffer.getvalue())
+    return rendered
+
+
+class DerivativeGenerator:
+    """Genera y sube las variantes de una imagen; seguro para llamarse desde varios hilos"""
+
+    def __init__(self, storage: StorageAdapter, variants: Tuple[Variant, ...] = DEFAULT_VARIANTS,
+                 prefix: str = DEFAULT_STORAGE_PREFIX, primary: str = DEFAULT_PRIMARY_VARIANT,
+                 processes: Optional[int] = None):
+        if primary not in {variant.name for variant in variants}:
+            raise ValueError(f"La variante principal '{primary}' no está en la lista de variantes")
+        self.storage = storage
+        self.variants = tuple(variants)
+        self.prefix = prefix.strip('/')
+        self.primary = primary
+        # El pool se crea cuando ya hay hilos (HTTP, IA) corriendo: fork copiaría locks tomados
+        self._pool = ProcessPoolExecutor(max_workers=processes or os.cpu_count() or 1,
+                                         mp_context=multiprocessing.get_context('spawn'))
+        self.generated = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    def process_many(self, images: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+        """
+        Recibe (ruta local, sha256) por imagen y retorna {variante: ruta en el almacenamiento}
+        para cada una. Solo se generan las variantes que faltan; todas se envían al pool antes
+        de esperar resultados.
+        """
+        jobs = []
+        submitted = set()
+        for source_path, sha256 in images:
+            keys = [variant_key(self.prefix, sha256, variant) for variant in self.variants]
+            missing = [i for i, key in enumerate(keys) if not self.storage.exists(key)]
+            future = None
+            # La misma imagen puede venir varias veces en el grupo: generarla una sola vez
+            if missing and sha256 not in submitted:
+                submitted.add(sha256)
+                future = self._pool.submit(render_variants, source_path, tuple(self.variants[i] for i in missing))
+            jobs.append((keys, missing, future))
+
+        paths = []
+        for keys, missing, future in jobs:
+            if future is not None:
+                for i, data in zip(missing, future.result()):
+                    self.storage.upload(keys[i], data, VARIANT_CONTENT_TYPES[self.variants[i].format])
+            with self._lock:
+                if future is not None:
+                    self.generated += 1
+                else:
+                    self.reused += 1
+            paths.append({variant.name: self.storage.url_for(key) for variant, key in zip(self.variants, keys)})
+        return paths
+
+    def process(self, source_path: str, sha256: str) -> Dict[str, str]:
+        return self.process_many([(source_path, sha256)])[0]
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,107 @@
+"""
+Cliente HTTP compartido para APIs externas (Unsplash, el backend y similares).
+
+Usa una sola `requests.Session` con pool de conexiones, de modo que las
+búsquedas reutilizan la conexión TCP/TLS en lugar de abrir una nueva por
+request. Los errores transitorios (429, 5xx, timeouts, conexión caída) se
+reintentan un número acotado de veces con backoff exponencial y jitter,
+respetando `Retry-After` cuando el servidor lo envía.
+"""
+
+import random
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_TIMEOUT = 10
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+
+# Códigos que vale la pena reintentar
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Segundos indicados en el header Retry-After (solo formato numérico)"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class HttpClient:
+    """Sesión HTTP con pool de conexiones y reintentos con backoff, segura para varios hilos"""
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, max_retries: int = DEFAULT_MAX_RETRIES,
+                 timeout: float = DEFAULT_TIMEOUT, backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX):
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.requests = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        # Los reintentos se manejan aquí (con jitter y Retry-After), no en urllib3
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def backoff_delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """Espera antes del reintento `attempt` (0 = primer reintento), con jitter completo"""
+        if response is not None:
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Request con reintentos. Retorna la última respuesta (aunque sea un error HTTP);
+        lanza la excepción de red si se agotan los reintentos. Solo usar con
+        requests idempotentes: un POST se reintenta igual que un GET.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            with self._lock:
+                self.requests += 1
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                delay = self.backoff_delay(attempt, response)
+                response.close()
+
+            with self._lock:
+                self.retries += 1
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        return {"requests": self.requests, "retries": self.retries}
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,247 @@
+"""
+Verificación de imágenes candidatas y detección de imágenes repetidas.
+
+Las URLs encontradas se descargan en paralelo, se decodifican con Pillow y se
+valida que cumplan dimensiones mínimas. De cada imagen se calcula un hash de
+contenido (SHA-256) y un hash perceptual (dHash de 64 bits); los bytes se
+guardan en un directorio direccionado por contenido, de modo que la misma
+imagen se almacena una sola vez. Con los hashes se marcan los productos que
+terminaron con la misma imagen (idéntica o casi idéntica).
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, List, NamedTuple, Optional
+
+from PIL import Image, UnidentifiedImageError
+
+from enrichment.http import HttpClient
+from enrichment.metrics import OP_IMAGE_DOWNLOAD, MetricsCollector
+
+DEFAULT_MIN_WIDTH = 200
+DEFAULT_MIN_HEIGHT = 200
+DEFAULT_MAX_BYTES = 15 * 1024 * 1024
+_DOWNLOAD_CHUNK_BYTES = 64 * 1024
+DEFAULT_IMAGE_WORKERS = 8
+# Bits distintos (de 64) para considerar dos imágenes casi idénticas
+DEFAULT_DHASH_DISTANCE = 3
+
+# Estados de la revisión
+IMAGE_OK = 'ok'
+IMAGE_REJECTED = 'descartada'
+
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+
+
+class ImageCheck(NamedTuple):
+    url: str
+    status: str
+    reason: str = ''
+    sha256: str = ''
+    dhash: str = ''
+    width: int = 0
+    height: int = 0
+    path: str = ''
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """Hash perceptual por diferencias: compara cada pixel con su vecino derecho"""
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class ContentAddressedStore:
+    """Directorio donde cada archivo se nombra por el SHA-256 de su contenido (ab/abcdef....ext)"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, sha256: str, extension: str) -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}.{extension}")
+
+    def save(self, data: bytes, sha256: str, extension: str) -> str:
+        """Guarda los bytes si no existen; la escritura es atómica (archivo temporal + rename)"""
+        path = self.path_for(sha256, extension)
+        if os.path.exists(path):
+            return path
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+
+class ImageVerifier:
+    """
+    Descarga y valida imágenes en paralelo. Cada URL se procesa una sola vez
+    por corrida aunque aparezca en varios productos (si dos hilos la piden a
+    la vez, el segundo espera la descarga del primero).
+    """
+
+    def __init__(self, store: ContentAddressedStore, http: Optional[HttpClient] = None,
+                 min_width: int = DEFAULT_MIN_WIDTH, min_height: int = DEFAULT_MIN_HEIGHT,
+                 max_bytes: int = DEFAULT_MAX_BYTES, workers: int = DEFAULT_IMAGE_WORKERS,
+                 metrics: Optional[MetricsCollector] = None):
+        self.store = store
+        self.http = http or HttpClient(pool_size=workers)
+        self.min_width = min_width
+        self.min_height = min_height
+        self.max_bytes = max_bytes
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._checked: Dict[str, ImageCheck] = {}
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _reject(self, url: str, reason: str) -> ImageCheck:
+        return ImageCheck(url=url, status=IMAGE_REJECTED, reason=reason)
+
+    def _download(self, url: str):
+        """(bytes, motivo de rechazo); la descarga se corta en cuanto pasa de `max_bytes`"""
+        try:
+            response = self.http.get(url, stream=True)
+        except Exception as e:
+            return None, f"error de red ({type(e).__name__})"
+        try:
+            if response.status_code != 200:
+                return None, f"HTTP {response.status_code}"
+            declared = response.headers.get('Content-Length')
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                return None, f"demasiado grande ({int(declared) // 1024} KB)"
+            buffer = BytesIO()
+            for chunk in response.iter_content(_DOWNLOAD_CHUNK_BYTES):
+                buffer.write(chunk)
+                if buffer.tell() > self.max_bytes:
+                    return None, f"demasiado grande (más de {self.max_bytes // 1024} KB)"
+            return buffer.getvalue(), ''
+        except Exception as e:
+            return None, f"error de red ({type(e).__name__})"
+        finally:
+            response.close()
+
+    def _download_and_check(self, url: str) -> ImageCheck:
+        data, reason = self._download(url)
+        if reason:
+            return self._reject(url, reason)
+        if not data:
+            return self._reject(url, "respuesta vacía")
+
+        try:
+            with Image.open(BytesIO(data)) as image:
+                image.load()
+                width, height = image.size
+                image_format = image.format
+                perceptual = dhash(image)
+        except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError) as e:
+            return self._reject(url, f"no decodifica ({type(e).__name__})")
+
+        if width < self.min_width or height < self.min_height:
+            return self._reject(url, f"muy pequeña ({width}x{height})")
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.store.save(data, sha256, FORMAT_EXTENSIONS.get(image_format, 'img'))
+        return ImageCheck(url=url, status=IMAGE_OK, sha256=sha256, dhash=f"{perceptual:016x}",
+                          width=width, height=height, path=path)
+
+    def verify(self, url: str) -> ImageCheck:
+        with self._lock:
+            cached = self._checked.get(url)
+            if cached is not None:
+                return cached
+            pending = self._in_flight.get(url)
+            if pending is None:
+                owner = self._in_flight[url] = Future()
+        if pending is not None:
+            return pending.result()
+
+        try:
+            if self.metrics:
+                with self.metrics.timed(OP_IMAGE_DOWNLOAD):
+                    check = self._download_and_check(url)
+                self.metrics.increment('images_rejected' if check.status != IMAGE_OK else 'images_verified')
+            else:
+                check = self._download_and_check(url)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[url]
+            owner.set_exception(e)
+            raise
+        with self._lock:
+            self._checked[url] = check
+            del self._in_flight[url]
+        owner.set_result(check)
+        return check
+
+    def verify_many(self, urls: List[Optional[str]]) -> List[Optional[ImageCheck]]:
+        """Verifica varias URLs en paralelo; las posiciones sin URL retornan None"""
+        futures = [self._executor.submit(self.verify, url) if url else None for url in urls]
+        return [future.result() if future else None for future in futures]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class SharedImageIndex:
+    """
+    Detecta productos con la misma imagen: mismo SHA-256, o dHash a
+    `max_distance` bits o menos. El dHash se divide en bandas de 16 bits; dos
+    hashes a distancia <= 3 comparten al menos una banda (principio del
+    palomar), así que solo se comparan los candidatos de la misma banda.
+    """
+
+    BANDS = 4
+
+    def __init__(self, max_distance: int = DEFAULT_DHASH_DISTANCE):
+        self.max_distance = max_distance
+        self._by_sha: Dict[str, str] = {}
+        self._bands: List[Dict[int, List[tuple]]] = [{} for _ in range(self.BANDS)]
+        self.shared = 0
+
+    def _band_values(self, value: int) -> List[int]:
+        return [(value >> (16 * i)) & 0xFFFF for i in range(self.BANDS)]
+
+    def assign(self, label: str, sha256: str, dhash_hex: str) -> Optional[str]:
+        """Registra la imagen de un producto; retorna la etiqueta del primer producto con la misma imagen"""
+        owner = self._by_sha.get(sha256)
+        if owner is None and dhash_hex and self.max_distance > 0:
+            value = int(dhash_hex, 16)
+            for band, band_value in zip(self._bands, self._band_values(value)):
+                for other_value, other_label in band.get(band_value, ()):
+                    if hamming_distance(value, other_value) <= self.max_distance:
+                        owner = other_label
+                        break
+                if owner is not None:
+                    break
+
+        if owner is not None:
+            self.shared += 1
+            return owner
+
+        self._by_sha[sha256] = label
+        if dhash_hex:
+            value = int(dhash_hex, 16)
+            for band, band_value in zip(self._bands, self._band_values(value)):
+                band.setdefault(band_value, []).append((value, label))
+        return None
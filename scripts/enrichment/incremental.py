@@ -0,0 +1,155 @@
+"""
+Re-enriquecimiento incremental contra la corrida anterior.
+
+Los distribuidores mandan una hoja de existencias nueva cada pocos días y casi
+todo es igual a la anterior: cambian precios y existencias, aparecen unos
+cuantos productos y desaparecen otros. En modo incremental se carga el
+journal de la corrida anterior y cada fila nueva se compara por número de
+parte más una huella del contenido (el nombre normalizado):
+
+- Sin cambios: se copia el enriquecimiento anterior con el precio y la
+  existencia nuevos, sin llamar a la IA ni buscar imagen.
+- Nueva o cambiada (mismo número de parte con otro nombre, o un resultado
+  anterior que había fallado o quedado en modo básico): se enriquece
+  normalmente.
+- Las filas de la corrida anterior cuyo producto ya no aparece se listan como
+  eliminadas.
+
+El Excel enriquecido no sirve como corrida anterior: no guarda el origen de
+cada fila (IA, básico, fallido), así que no se sabría cuáles re-enriquecer.
+"""
+
+import glob
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from enrichment.cache import normalize_name
+from enrichment.dedup import dedup_key
+from enrichment.journal import read_jsonl
+
+STATUS_NEW = 'new'
+STATUS_CHANGED = 'changed'
+STATUS_UNCHANGED = 'unchanged'
+STATUS_REMOVED = 'removed'
+
+# Resultados anteriores que no se copian: se vuelven a enriquecer
+RETRY_SOURCES = ('fallback', 'deferred', 'basic')
+JOURNAL_EXTENSIONS = ('.jsonl', '.json')
+# Campos de la corrida anterior que no aplican a la fila nueva
+_STALE_FIELDS = ('duplicate_of', 'image_shared_with')
+
+
+def content_fingerprint(name: str) -> str:
+    """Huella del contenido que alimenta el enriquecimiento (precio y existencia no cuentan)"""
+    return hashlib.sha256(normalize_name(name).encode('utf-8')).hexdigest()[:16]
+
+
+class PreviousRow(NamedTuple):
+    name: str
+    part_number: str
+    price: object
+    stock: object
+    result: Dict
+
+
+def workbook_paths(path: str) -> List[str]:
+    """El Excel indicado más sus partes (`<base>_parteN.xlsx`) si la salida se repartió"""
+    base, ext = os.path.splitext(path)
+    parts = glob.glob(f"{glob.escape(base)}_parte*{ext}")
+
+    def part_number(part_path: str) -> int:
+        match = re.search(r'_parte(\d+)', part_path)
+        return int(match.group(1)) if match else 0
+    return [path] + sorted(parts, key=part_number)
+
+
+def read_previous_journal(path: str) -> Iterator[PreviousRow]:
+    """Filas del journal de una corrida anterior (la última entrada por posición gana)"""
+    latest: Dict[int, Dict] = {}
+    for record in read_jsonl(path):
+        if isinstance(record.get('result'), dict):
+            latest[record.get('position', len(latest))] = record['result']
+    for position in sorted(latest):
+        result = latest[position]
+        yield PreviousRow(result.get('name', ''), result.get('part_number', ''), result.get('price'),
+                          result.get('stock'), result)
+
+
+class IncrementalIndex:
+    """Resultados de la corrida anterior por producto y huella; seguro para varios hilos"""
+
+    def __init__(self, rows: Iterator[PreviousRow]):
+        # identidad del producto -> {huella: fila anterior}
+        self._index: Dict[Tuple[str, str], Dict[str, PreviousRow]] = {}
+        self.previous_rows = 0
+        for row in rows:
+            self.previous_rows += 1
+            entries = self._index.setdefault(dedup_key(row.name, row.part_number), {})
+            # Con filas repetidas en la corrida anterior, la primera basta
+            entries.setdefault(content_fingerprint(row.name), row)
+        self._seen = set()
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {STATUS_NEW: 0, STATUS_CHANGED: 0, STATUS_UNCHANGED: 0}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def lookup(self, name: str, part_number: str) -> Tuple[str, Optional[Dict]]:
+        """(estado, resultado anterior si la fila no cambió) y registra la fila como vista"""
+        key = dedup_key(name, part_number)
+        entries = self._index.get(key)
+        previous = entries.get(content_fingerprint(name)) if entries else None
+        if entries is None:
+            status = STATUS_NEW
+        elif previous is None or previous.result.get('enriched_data', {}).get('source') in RETRY_SOURCES:
+            status = STATUS_CHANGED
+        else:
+            status = STATUS_UNCHANGED
+        with self._lock:
+            self._seen.add(key)
+            self.counts[status] += 1
+        return status, previous.result if status == STATUS_UNCHANGED else None
+
+    def removed(self) -> List[PreviousRow]:
+        """Filas anteriores cuyo producto no apareció en la hoja nueva"""
+        with self._lock:
+            seen = set(self._seen)
+        return [row for key, entries in self._index.items() if key not in seen for row in entries.values()]
+
+    def report(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self.counts)
+        counts[STATUS_REMOVED] = len(self.removed())
+        return counts
+
+
+def carry_forward(previous: Dict, name: str, part_number: str, price, stock, is_available: bool) -> Dict:
+    """Resultado anterior con los datos de la fila nueva (precio, existencia, disponibilidad)"""
+    result = {key: value for key, value in previous.items() if key not in _STALE_FIELDS}
+    result.update({
+        "name": name,
+        "part_number": part_number,
+        "price": price,
+        "stock": stock,
+        "is_available": is_available,
+        "carried_forward": True,
+    })
+    return result
+
+
+def load_previous(paths: Sequence[str]) -> IncrementalIndex:
+    """Índice a partir de los journals (.jsonl) de la corrida anterior"""
+    for path in paths:
+        if not path.lower().endswith(JOURNAL_EXTENSIONS):
+            raise ValueError(f"{path}: usa el journal de la corrida anterior (<salida>.journal.jsonl); "
+                             "el Excel enriquecido no guarda qué filas quedaron en modo básico o fallaron")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"no existe {path}")
+
+    def rows() -> Iterator[PreviousRow]:
+        for path in paths:
+            yield from read_previous_journal(path)
+    return IncrementalIndex(rows())
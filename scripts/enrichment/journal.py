@@ -0,0 +1,129 @@
+"""
+Journal de filas completadas y cola de reintentos (dead-letter) para corridas largas.
+
+El journal es un archivo JSONL de solo-agregar: cada fila terminada se escribe
+en cuanto se completa, así que una interrupción no pierde el trabajo hecho.
+Las filas cuya IA falló (y se completaron en modo básico) se agregan a un
+archivo de reintentos que puede procesarse por separado.
+"""
+
+import json
+import math
+import os
+import threading
+from typing import Dict, Iterable, Optional
+
+from enrichment.cache import normalize_name, normalize_part_number
+
+
+def row_key(name: str, part_number: str) -> str:
+    """Identidad de una fila, para verificar que el journal corresponde al mismo Excel"""
+    return f"{normalize_part_number(part_number)}|{normalize_name(name)}"
+
+
+def to_jsonable(value):
+    """Convierte valores de pandas/numpy (NaN, int64, etc.) a tipos JSON"""
+    if isinstance(value, dict):
+        return {k: to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class _JsonlAppender:
+    """Archivo JSONL de solo-agregar, seguro para varios hilos"""
+
+    def __init__(self, path: str, truncate: bool = False):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'w' if truncate else 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict):
+        line = json.dumps(to_jsonable(record), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def read_jsonl(path: str) -> Iterable[Dict]:
+    """Lee un JSONL ignorando líneas incompletas (p. ej. la última tras un corte)"""
+    if not path or not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+class RunJournal:
+    """Journal de filas completadas, indexado por posición en el Excel de entrada"""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.completed: Dict[int, Dict] = {}
+        if resume:
+            for record in read_jsonl(path):
+                # Si una fila aparece varias veces (reintentos), la última gana
+                self.completed[record['position']] = record
+        self._writer = _JsonlAppender(path, truncate=not resume)
+
+    def get(self, position: int, key: str) -> Optional[Dict]:
+        """Resultado guardado de la fila, solo si corresponde al mismo producto"""
+        record = self.completed.get(position)
+        if record and record.get('key') == key:
+            return record['result']
+        return None
+
+    def append(self, position: int, key: str, result: Dict):
+        self._writer.write({"position": position, "key": key, "result": result})
+
+    def close(self):
+        self._writer.close()
+
+
+class RetryQueue:
+    """Filas que cayeron a `_enrich_basic` por errores de IA y deben reintentarse"""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.pending: Dict[int, Dict] = {}
+        if resume:
+            for record in read_jsonl(path):
+                self.pending[record['position']] = record
+        self._writer = _JsonlAppender(path, truncate=not resume)
+        self._failed_now: Dict[int, Dict] = {}
+
+    def add(self, position: int, key: str, name: str, part_number: str):
+        record = {"position": position, "key": key, "name": name, "part_number": part_number}
+        self._failed_now[position] = record
+        self._writer.write(record)
+
+    def resolve(self, position: int):
+        """Marca una fila pendiente como reintentada con éxito"""
+        self.pending.pop(position, None)
+
+    def close(self):
+        """Reescribe el archivo solo con las filas que siguen fallando"""
+        self._writer.close()
+        remaining = dict(self.pending)
+        remaining.update(self._failed_now)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for position in sorted(remaining):
+                f.write(json.dumps(to_jsonable(remaining[position]), ensure_ascii=False) + '\n')
+        return len(remaining)
@@ -0,0 +1,209 @@
+"""
+Métricas de una corrida de enriquecimiento.
+
+Registra la latencia de cada llamada externa (IA, búsqueda y descarga de
+imágenes), los tokens reportados en `response.usage` (incluidos los que
+vienen del caché de prompts), el costo estimado y
+contadores (reintentos, fallos a modo básico, hits de caché). Al terminar se
+calculan percentiles y totales, que se escriben en una hoja del Excel y en un
+archivo OpenMetrics (textfile) o JSON para el monitoreo de los jobs batch.
+"""
+
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Precio en USD por millón de tokens: (entrada, salida)
+MODEL_PRICES_PER_MILLION: Dict[str, Tuple[float, float]] = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+}
+# Precio de los tokens de entrada que vienen del caché de prompts (prefijos de 1024 tokens o más)
+CACHED_INPUT_PRICES_PER_MILLION: Dict[str, float] = {
+    'gpt-4o-mini': 0.075,
+    'gpt-4o': 1.25,
+}
+
+PERCENTILES = (50, 95, 99)
+METRIC_PREFIX = 'agora_enrich'
+
+# Operaciones con latencia registrada
+OP_LLM = 'llm_request'
+OP_IMAGE_SEARCH = 'image_search'
+OP_IMAGE_DOWNLOAD = 'image_download'
+OP_ROW = 'row'  # desde que el grupo de la fila empieza hasta que queda lista
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """
+    Costo estimado en USD; 0 si el modelo no está en la tabla de precios.
+    `cached_tokens` es la parte de `prompt_tokens` que vino del caché.
+    """
+    prices = MODEL_PRICES_PER_MILLION.get(model)
+    if not prices:
+        return 0.0
+    cached_price = CACHED_INPUT_PRICES_PER_MILLION.get(model, prices[0])
+    return ((prompt_tokens - cached_tokens) * prices[0] + cached_tokens * cached_price
+            + completion_tokens * prices[1]) / 1_000_000
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil con interpolación lineal sobre una lista ya ordenada"""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+class MetricsCollector:
+    """Colector seguro para varios hilos; las latencias se guardan en segundos"""
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self._finished: Optional[float] = None
+        self._latencies: Dict[str, List[float]] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, op: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(op, []).append(seconds)
+
+    @contextmanager
+    def timed(self, op: str):
+        """Mide la duración del bloque, aunque termine con excepción"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(op, time.perf_counter() - start)
+
+    def increment(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_counter(self, name: str, value: float):
+        with self._lock:
+            self._counters[name] = value
+
+    def record_usage(self, usage, model: Optional[str] = None):
+        """
+        Suma los tokens de `response.usage` (objeto de OpenAI o dict), los de
+        entrada servidos desde el caché de prompts
+        (`usage.prompt_tokens_details.cached_tokens`) y el costo estimado.
+        """
+        if usage is None:
+            return
+
+        def get(obj, key):
+            value = obj.get(key) if isinstance(obj, dict) else getattr(obj, key, None)
+            return value or 0
+
+        prompt_tokens = get(usage, 'prompt_tokens')
+        completion_tokens = get(usage, 'completion_tokens')
+        details = get(usage, 'prompt_tokens_details')
+        cached_tokens = get(details, 'cached_tokens') if details else 0
+        cost = estimate_cost(model or self.model or '', prompt_tokens, completion_tokens, cached_tokens)
+        with self._lock:
+            for name, value in (('prompt_tokens', prompt_tokens), ('completion_tokens', completion_tokens),
+                                ('cached_prompt_tokens', cached_tokens), ('cost_usd', cost)):
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    def finish(self):
+        """Fija el fin de la corrida (para filas por segundo)"""
+        self._finished = time.perf_counter()
+
+    def summary(self) -> Dict:
+        elapsed = (self._finished or time.perf_counter()) - self._started
+        with self._lock:
+            counters = dict(self._counters)
+            latencies = {op: sorted(values) for op, values in self._latencies.items()}
+
+        operations = {}
+        for op, values in sorted(latencies.items()):
+            stats = {"count": len(values), "total_seconds": sum(values)}
+            for pct in PERCENTILES:
+                stats[f"p{pct}"] = percentile(values, pct)
+            stats["max"] = values[-1] if values else 0.0
+            operations[op] = stats
+
+        rows = counters.get('rows', 0)
+        return {
+            "started_at": self.started_at,
+            "elapsed_seconds": elapsed,
+            "rows_per_second": rows / elapsed if elapsed > 0 else 0.0,
+            "model": self.model,
+            "counters": counters,
+            "operations": operations,
+        }
+
+    def summary_rows(self, summary: Optional[Dict] = None) -> List[List]:
+        """Filas para la hoja de métricas: (métrica, operación, valor)"""
+        summary = summary or self.summary()
+        rows = [
+            ["duración (s)", "", round(summary['elapsed_seconds'], 3)],
+            ["filas por segundo", "", round(summary['rows_per_second'], 3)],
+        ]
+        for name, value in sorted(summary['counters'].items()):
+            rows.append([name, "", round(value, 6) if isinstance(value, float) else value])
+        for op, stats in summary['operations'].items():
+            rows.append(["llamadas", op, stats['count']])
+            for key in [f"p{pct}" for pct in PERCENTILES] + ['max']:
+                rows.append([f"latencia {key} (s)", op, round(stats[key], 4)])
+        return rows
+
+    def to_openmetrics(self, summary: Optional[Dict] = None) -> str:
+        """Formato de texto OpenMetrics, apto para el textfile collector de node_exporter"""
+        summary = summary or self.summary()
+        lines = [
+            f"# TYPE {METRIC_PREFIX}_run_duration_seconds gauge",
+            f"{METRIC_PREFIX}_run_duration_seconds {summary['elapsed_seconds']:.6f}",
+            f"# TYPE {METRIC_PREFIX}_rows_per_second gauge",
+            f"{METRIC_PREFIX}_rows_per_second {summary['rows_per_second']:.6f}",
+            f"# TYPE {METRIC_PREFIX}_run_started_timestamp_seconds gauge",
+            f"{METRIC_PREFIX}_run_started_timestamp_seconds {summary['started_at']:.3f}",
+        ]
+        for name, value in sorted(summary['counters'].items()):
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value:.10g}")
+
+        if summary['operations']:
+            metric = f"{METRIC_PREFIX}_latency_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for op, stats in summary['operations'].items():
+                for pct in PERCENTILES:
+                    lines.append(f'{metric}{{op="{op}",quantile="{pct / 100}"}} {stats[f"p{pct}"]:.6f}')
+                lines.append(f'{metric}_count{{op="{op}"}} {stats["count"]}')
+                lines.append(f'{metric}_sum{{op="{op}"}} {stats["total_seconds"]:.6f}')
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, summary: Optional[Dict] = None):
+        """
+        Escribe JSON si la extensión es .json; si no, OpenMetrics. La escritura es
+        atómica para que el colector nunca lea un archivo a medias.
+        """
+        summary = summary or self.summary()
+        if path.endswith('.json'):
+            content = json.dumps(summary, ensure_ascii=False, indent=2)
+        else:
+            content = self.to_openmetrics(summary)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
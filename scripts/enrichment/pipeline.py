@@ -0,0 +1,223 @@
+"""
+Pipeline por etapas con colas acotadas.
+
+Cada etapa (p. ej. clasificar, IA, imágenes, formato) tiene sus propios hilos
+y toma elementos de una cola acotada; al terminar los pasa a la cola de la
+siguiente. Así la búsqueda de imagen de un grupo se traslapa con la llamada a
+la IA del siguiente, y una etapa lenta frena a las anteriores (backpressure)
+en lugar de acumular resultados en memoria.
+
+El consumidor (el escritor del Excel) recibe los elementos en el mismo orden
+de la fuente: los que llegan adelantados esperan en un búfer de reordenamiento.
+El número de elementos en vuelo (en colas, etapas y búfer) está acotado, así
+que la memoria no crece con el tamaño de la entrada.
+
+Un error en la fuente o en cualquier etapa detiene el pipeline y se vuelve a
+lanzar en el consumidor.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+# Elementos por cola entre etapas
+DEFAULT_QUEUE_SIZE = 4
+# Cada cuánto revisan los hilos si el pipeline se detuvo
+_POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+class Stage(NamedTuple):
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+
+
+class StageStats(NamedTuple):
+    name: str
+    workers: int
+    items: int
+    busy_seconds: float
+    # Tiempo esperando lugar en la cola siguiente (la etapa de después es más lenta)
+    blocked_seconds: float
+
+
+class _Stopped(Exception):
+    pass
+
+
+class StagePipeline:
+    """
+    Ejecuta `stages` sobre los elementos de `source` y los entrega en orden al
+    iterar. Usar como contexto (o llamar `close`) para detener los hilos si el
+    consumidor termina antes.
+    """
+
+    def __init__(self, source: Iterable, stages: Sequence[Stage], queue_size: int = DEFAULT_QUEUE_SIZE,
+                 max_in_flight: Optional[int] = None):
+        if not stages:
+            raise ValueError("El pipeline necesita al menos una etapa")
+        self.stages = list(stages)
+        self.queue_size = max(1, queue_size)
+        # Por defecto: lo que cabe en las colas más lo que procesan los hilos
+        self.max_in_flight = max_in_flight or (
+            self.queue_size * (len(self.stages) + 1) + sum(max(1, stage.workers) for stage in self.stages)
+        )
+        self._source = source
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self._in_flight = threading.Semaphore(self.max_in_flight)
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._remaining = [max(1, stage.workers) for stage in self.stages]
+        self._stats: Dict[str, List[float]] = {stage.name: [0, 0.0, 0.0] for stage in self.stages}
+        self._threads: List[threading.Thread] = []
+        self._started = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _fail(self, error: BaseException):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _put(self, target: queue.Queue, item) -> float:
+        """Encola esperando lugar; retorna los segundos que estuvo bloqueado"""
+        start = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+                return time.perf_counter() - start
+            except queue.Full:
+                continue
+
+    def _get(self, source: queue.Queue):
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+
+    def _feed(self):
+        try:
+            for sequence, item in enumerate(self._source):
+                while not self._in_flight.acquire(timeout=_POLL_SECONDS):
+                    if self._stop.is_set():
+                        return
+                self._put(self._queues[0], (sequence, item))
+            self._put(self._queues[0], _DONE)
+        except _Stopped:
+            pass
+        except BaseException as e:
+            self._fail(e)
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        inbox, outbox = self._queues[index], self._queues[index + 1]
+        stats = self._stats[stage.name]
+        try:
+            while True:
+                entry = self._get(inbox)
+                if entry is _DONE:
+                    # Avisar a los demás hilos de la etapa; el último avisa a la siguiente
+                    self._put(inbox, _DONE)
+                    with self._lock:
+                        self._remaining[index] -= 1
+                        last = self._remaining[index] == 0
+                    if last:
+                        self._put(outbox, _DONE)
+                    return
+                sequence, item = entry
+                start = time.perf_counter()
+                result = stage.func(item)
+                busy = time.perf_counter() - start
+                blocked = self._put(outbox, (sequence, result))
+                with self._lock:
+                    stats[0] += 1
+                    stats[1] += busy
+                    stats[2] += blocked
+        except _Stopped:
+            pass
+        except BaseException as e:
+            self._fail(e)
+
+    def _start(self):
+        self._started = True
+        threads = [threading.Thread(target=self._feed, name='pipeline-reader', daemon=True)]
+        for index, stage in enumerate(self.stages):
+            for number in range(max(1, stage.workers)):
+                threads.append(threading.Thread(target=self._work, args=(index,),
+                                                name=f'pipeline-{stage.name}-{number + 1}', daemon=True))
+        self._threads = threads
+        for thread in threads:
+            thread.start()
+
+    def __iter__(self) -> Iterator:
+        if self._started:
+            raise RuntimeError("El pipeline solo se puede iterar una vez")
+        self._start()
+        output = self._queues[-1]
+        reorder: Dict[int, Any] = {}
+        next_sequence = 0
+        try:
+            while True:
+                try:
+                    entry = self._get(output)
+                except _Stopped:
+                    break
+                if entry is _DONE:
+                    break
+                sequence, item = entry
+                reorder[sequence] = item
+                while next_sequence in reorder:
+                    ready = reorder.pop(next_sequence)
+                    next_sequence += 1
+                    yield ready
+                    self._in_flight.release()
+        finally:
+            self.close()
+        if self._error is not None:
+            raise self._error
+
+    def close(self, timeout: float = 1.0):
+        """Detiene los hilos (los elementos en vuelo se descartan)"""
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            # Un hilo ocupado en una llamada de red termina por su cuenta (es daemon)
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+
+    def stats(self) -> List[StageStats]:
+        with self._lock:
+            return [StageStats(stage.name, max(1, stage.workers), int(self._stats[stage.name][0]),
+                               self._stats[stage.name][1], self._stats[stage.name][2])
+                    for stage in self.stages]
+
+
+def parse_stage_workers(text: str, stage_names: Sequence[str]) -> Dict[str, int]:
+    """Interpreta 'etapa=N,etapa=N' (p. ej. 'llm=8,image=4')"""
+    workers: Dict[str, int] = {}
+    for part in filter(None, (part.strip() for part in (text or '').split(','))):
+        name, _, value = part.partition('=')
+        name = name.strip()
+        if name not in stage_names:
+            raise ValueError(f"etapa desconocida '{name}' (etapas: {', '.join(stage_names)})")
+        try:
+            count = int(value)
+        except ValueError:
+            raise ValueError(f"número de workers inválido para '{name}': '{value}'")
+        if count < 1:
+            raise ValueError(f"la etapa '{name}' necesita al menos 1 worker")
+        workers[name] = count
+    return workers
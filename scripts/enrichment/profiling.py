@@ -0,0 +1,184 @@
+"""
+Perfilado por etapas de una corrida (--profile).
+
+`Profiler.span(nombre)` mide un bloque con `time.perf_counter` y lo registra
+como evento con inicio y duración relativos al arranque de la corrida. Los
+spans heredan (por hilo) las filas del span que los contiene, así que cada
+llamada a la IA, búsqueda de imagen, etc. queda asociada a sus filas y se
+puede reconstruir la línea de tiempo de cada fila. Con el perfilado
+deshabilitado `span` retorna un contexto vacío compartido (costo casi nulo).
+
+Salidas:
+- Trace JSON en formato Chrome (chrome://tracing o https://ui.perfetto.dev)
+- Reporte de las N filas más lentas con el desglose por etapa
+- Totales por etapa en consola
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Límite de eventos guardados para el trace; después solo se acumulan totales
+DEFAULT_MAX_EVENTS = 500000
+DEFAULT_SLOWEST_ROWS = 20
+
+_NULL_SPAN = nullcontext()
+
+
+class Profiler:
+    def __init__(self, enabled: bool = False, max_events: int = DEFAULT_MAX_EVENTS):
+        self.enabled = enabled
+        self.max_events = max_events
+        self._origin = time.perf_counter()
+        # (nombre, id de hilo, inicio s, duración s, filas)
+        self._events: List[Tuple[str, int, float, float, Tuple[int, ...]]] = []
+        self._totals: Dict[str, List[float]] = {}  # nombre -> [llamadas, segundos]
+        self._thread_ids: Dict[int, int] = {}
+        self._labels: Dict[int, str] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.dropped_events = 0
+
+    def _thread_id(self) -> int:
+        ident = threading.get_ident()
+        tid = self._thread_ids.get(ident)
+        if tid is None:
+            with self._lock:
+                tid = self._thread_ids.setdefault(ident, len(self._thread_ids) + 1)
+        return tid
+
+    def span(self, name: str, rows: Optional[Sequence[int]] = None):
+        """Mide un bloque; `rows` asocia el span (y los que contenga) a esas filas"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name, rows)
+
+    @contextmanager
+    def _span(self, name: str, rows: Optional[Sequence[int]]):
+        parent_rows = getattr(self._local, 'rows', ())
+        span_rows = tuple(rows) if rows is not None else parent_rows
+        self._local.rows = span_rows
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._local.rows = parent_rows
+            self._record(name, start, end - start, span_rows)
+
+    def label(self, row: int, text: str):
+        """Texto con el que se identifica una fila en el reporte (p. ej. número de parte)"""
+        if self.enabled:
+            self._labels[row] = text
+
+    def add(self, name: str, seconds: float):
+        """Acumula tiempo de una etapa muy frecuente sin guardar un evento por llamada"""
+        if not self.enabled:
+            return
+        with self._lock:
+            totals = self._totals.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def timed_iter(self, name: str, iterable: Iterable) -> Iterator:
+        """Itera `iterable` acumulando en `name` el tiempo que tarda cada elemento en producirse"""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+    def _record(self, name: str, start: float, duration: float, rows: Tuple[int, ...]):
+        tid = self._thread_id()
+        with self._lock:
+            totals = self._totals.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += duration
+            if len(self._events) < self.max_events:
+                self._events.append((name, tid, start - self._origin, duration, rows))
+            else:
+                self.dropped_events += 1
+
+    def stage_totals(self) -> List[Tuple[str, int, float]]:
+        """(etapa, llamadas, segundos) ordenado por tiempo total, de mayor a menor"""
+        with self._lock:
+            items = [(name, int(count), seconds) for name, (count, seconds) in self._totals.items()]
+        return sorted(items, key=lambda item: item[2], reverse=True)
+
+    def write_chrome_trace(self, path: str):
+        """Eventos completos ("ph": "X") en microsegundos, un carril por hilo"""
+        with self._lock:
+            events = list(self._events)
+            thread_ids = dict(self._thread_ids)
+
+        trace_events = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+             "args": {"name": "principal" if ident == threading.main_thread().ident else f"worker-{tid}"}}
+            for ident, tid in thread_ids.items()
+        ]
+        for name, tid, start, duration, rows in events:
+            event = {"name": name, "cat": "enrich", "ph": "X", "pid": 1, "tid": tid,
+                     "ts": round(start * 1e6, 3), "dur": round(duration * 1e6, 3)}
+            if rows:
+                event["args"] = {"rows": list(rows) if len(rows) > 1 else rows[0]}
+            trace_events.append(event)
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+    def row_timelines(self) -> Dict[int, List[Tuple[str, float, float]]]:
+        """Por fila: lista de (span, inicio s, fin s) de todos los spans asociados a ella"""
+        timelines: Dict[int, List[Tuple[str, float, float]]] = {}
+        with self._lock:
+            events = list(self._events)
+        for name, _, start, duration, rows in events:
+            for row in rows:
+                timelines.setdefault(row, []).append((name, start, start + duration))
+        return timelines
+
+    def slowest_rows(self, count: int = DEFAULT_SLOWEST_ROWS) -> List[Dict]:
+        """Las `count` filas con mayor latencia (primer inicio a último fin de sus spans)"""
+        rows = []
+        for row, spans in self.row_timelines().items():
+            start = min(span[1] for span in spans)
+            end = max(span[2] for span in spans)
+            breakdown: Dict[str, float] = {}
+            for name, span_start, span_end in spans:
+                breakdown[name] = breakdown.get(name, 0.0) + (span_end - span_start)
+            rows.append({
+                "row": row,
+                "label": self._labels.get(row, ''),
+                "start": start,
+                "end": end,
+                "latency": end - start,
+                "breakdown": breakdown,
+                "spans": sorted(spans, key=lambda span: span[1]),
+            })
+        rows.sort(key=lambda item: item['latency'], reverse=True)
+        return rows[:count]
+
+    def write_slowest_report(self, path: str, count: int = DEFAULT_SLOWEST_ROWS):
+        """Reporte de texto con las filas más lentas y su línea de tiempo (ms desde el inicio)"""
+        lines = [f"FILAS MÁS LENTAS (top {count})", ""]
+        for item in self.slowest_rows(count):
+            lines.append(f"Fila {item['row'] + 2}: {item['label']}".rstrip())
+            lines.append(f"  latencia: {item['latency'] * 1000:.1f} ms "
+                         f"(de {item['start'] * 1000:.1f} a {item['end'] * 1000:.1f} ms)")
+            for name, seconds in sorted(item['breakdown'].items(), key=lambda entry: entry[1], reverse=True):
+                lines.append(f"  - {name}: {seconds * 1000:.1f} ms")
+            lines.append("  línea de tiempo:")
+            for name, start, end in item['spans']:
+                lines.append(f"    {start * 1000:10.1f} → {end * 1000:10.1f} ms  {name}")
+            lines.append("")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines))
@@ -0,0 +1,300 @@
+"""
+Plantillas de prompt por tipo de producto, a partir de catalog.product_type_field_config.
+
+La tabla indica qué campos del formulario de productos son visibles o
+requeridos para cada tipo. Cada plantilla pide a la IA solo el contenido de
+esos campos (p. ej. los servicios no piden compatibilidad de vehículos), con su
+propio esquema JSON, validador y tope de tokens.
+
+Todas las plantillas empiezan con el mismo bloque fijo (rol, reglas, glosario
+de tipos, significado de los campos, abreviaturas y ejemplos), de más de 1024
+tokens: el mínimo del caché automático de prompts de OpenAI. Después va el
+formato de respuesta del tipo y al final los datos del producto, así que todos
+los requests comparten el bloque común byte por byte y los del mismo tipo
+comparten además el formato.
+
+La configuración se lee de los INSERT del SQL de migración o de una
+exportación CSV de la tabla (product_type,field_name,is_visible,is_required,display_order).
+"""
+
+import csv
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from enrichment.cache import prompt_version
+from enrichment.schema import ENRICHMENT_FIELDS, batch_schema, compile_validator, enrichment_schema, max_tokens_for
+
+FIELD_CONFIG_COLUMNS = ('product_type', 'field_name', 'is_visible', 'is_required', 'display_order')
+
+_INSERT_PATTERN = re.compile(
+    r'INSERT\s+INTO\s+(?:\w+\.)?product_type_field_config\s*\(([^)]*)\)\s*VALUES(.*?)(?:ON\s+CONFLICT|;)',
+    re.IGNORECASE | re.DOTALL
+)
+_ROW_PATTERN = re.compile(
+    r"\(\s*'([^']+)'\s*,\s*'([^']+)'\s*,\s*(TRUE|FALSE)\s*,\s*(TRUE|FALSE)\s*,\s*(\d+)\s*\)", re.IGNORECASE
+)
+
+
+class FieldConfig(NamedTuple):
+    product_type: str
+    field_name: str
+    is_visible: bool
+    is_required: bool
+    display_order: int
+
+
+def _parse_bool(value) -> bool:
+    return str(value).strip().lower() in ('t', 'true', '1', 'yes', 'si', 'sí')
+
+
+def load_field_config(path: str) -> Dict[str, Dict[str, FieldConfig]]:
+    """
+    {tipo: {campo: FieldConfig}} desde un .sql (INSERT INTO ...product_type_field_config)
+    o un .csv exportado de la tabla. En el SQL, un INSERT posterior reemplaza al
+    anterior para el mismo tipo y campo (como su ON CONFLICT DO UPDATE).
+    """
+    rows: List[FieldConfig] = []
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                rows.append(FieldConfig(row['product_type'].strip(), row['field_name'].strip(),
+                                        _parse_bool(row.get('is_visible', 'true')),
+                                        _parse_bool(row.get('is_required', 'false')),
+                                        int(row.get('display_order') or 0)))
+    else:
+        with open(path, encoding='utf-8') as f:
+            sql = f.read()
+        for columns, values in _INSERT_PATTERN.findall(sql):
+            if tuple(column.strip() for column in columns.split(',')) != FIELD_CONFIG_COLUMNS:
+                raise ValueError(f"{path}: columnas no soportadas en INSERT: {columns.strip()}")
+            for product_type, field_name, visible, required, order in _ROW_PATTERN.findall(values):
+                rows.append(FieldConfig(product_type, field_name, _parse_bool(visible), _parse_bool(required),
+                                        int(order)))
+
+    config: Dict[str, Dict[str, FieldConfig]] = {}
+    for row in rows:
+        config.setdefault(row.product_type, {})[row.field_name] = row
+    if not config:
+        raise ValueError(f"{path}: no contiene configuración de campos por tipo de producto")
+    return config
+
+
+# Contexto del rol según el tipo
+TYPE_CONTEXT = {
+    'refaccion': "refacciones automotrices (piezas de repuesto)",
+    'accesorio': "accesorios automotrices (personalización, confort, audio, protección)",
+    'servicio_instalacion': "servicios de instalación en taller automotriz",
+    'servicio_mantenimiento': "servicios de mantenimiento automotriz",
+    'fluido': "fluidos y lubricantes automotrices",
+}
+
+# Campo del formulario -> llaves de technical_specs que lo alimentan (con su instrucción).
+# En el esquema de refacciones, `variants` guarda la compatibilidad de vehículos y
+# `nutritional_info` las especificaciones técnicas; en los servicios, sus detalles.
+VEHICLE_COMPATIBILITY_SPECS = {
+    "marca_compatible": "Marcas de vehículos compatibles (si aplica)",
+    "modelos_compatibles": "Modelos de vehículos compatibles (si aplica)",
+    "años_compatibles": "Rango de años compatibles (si aplica)",
+}
+SPECS_BY_FIELD = {
+    'variants': {
+        'servicio_instalacion': {
+            "tiempo_estimado": "Tiempo estimado del servicio",
+            "dificultad": "Dificultad (baja, media o alta)",
+            "herramientas": "Herramientas o equipo necesarios",
+        },
+        'servicio_mantenimiento': {
+            "tiempo_estimado": "Tiempo estimado del servicio",
+            "frecuencia_recomendada": "Frecuencia recomendada (kilómetros o meses)",
+        },
+    },
+    'nutritional_info': {
+        'servicio_instalacion': {"especificaciones": "Qué incluye el servicio"},
+        'servicio_mantenimiento': {"especificaciones": "Qué incluye el servicio"},
+        'fluido': {"especificaciones": "Especificaciones técnicas (viscosidad, norma, presentación)"},
+    },
+}
+DEFAULT_SPECS_BY_FIELD = {
+    'variants': VEHICLE_COMPATIBILITY_SPECS,
+    'nutritional_info': {"especificaciones": "Otras especificaciones técnicas relevantes"},
+}
+
+# Campo del formulario -> campo de la respuesta de la IA
+RESPONSE_FIELD_BY_CONFIG = {
+    'description': 'description',
+    'category_id': 'suggested_category',
+    'image_url': 'search_keywords',
+}
+
+FIELD_INSTRUCTIONS = {
+    "description": '"description": "Descripción detallada del producto (2-4 oraciones)"',
+    "suggested_category": '"suggested_category": "Categoría sugerida basada en el tipo de producto"',
+    "search_keywords": '"search_keywords": ["palabra1", "palabra2", "palabra3"] para búsqueda de imágenes',
+}
+
+# Bloque fijo común a todas las plantillas y a los lotes: va primero para que el caché de prompts del
+# proveedor (prefijos de 1024 tokens o más, idénticos byte por byte) se comparta entre tipos
+COMMON_INSTRUCTIONS = """Eres un experto en autopartes y productos automotrices. Preparas las fichas de catálogo de una tienda en línea que vende refacciones, accesorios, fluidos y servicios de taller, tanto a talleres mecánicos como a clientes finales en México.
+
+Cada request trae al final los datos de uno o más productos tal como vienen en la hoja de existencias del distribuidor: un nombre abreviado (casi siempre en mayúsculas, sin acentos y con abreviaturas), el número de parte del fabricante y el precio. Con esos datos completas únicamente los campos que pide la sección "Formato de respuesta", que también va al final, después de estas instrucciones.
+
+Reglas generales:
+- Escribe en español neutro, con ortografía y acentos correctos, sin mayúsculas sostenidas ni emojis.
+- No inventes datos: si un campo no se puede deducir del nombre o del número de parte, déjalo como texto vacío. Es preferible un campo vacío a un dato incorrecto.
+- No incluyas precios, existencias, descuentos ni promociones en ningún campo.
+- El campo product_type debe ser uno de: {product_types}.
+- No repitas el número de parte en la descripción, salvo que forme parte del nombre comercial del producto.
+- Usa unidades del sistema métrico (mm, cm, litros, kg) y conserva las medidas tal como vienen en el nombre.
+- Si el nombre incluye un código interno o el número de parte de otro fabricante, no lo interpretes como modelo de vehículo.
+- Las marcas de vehículos se escriben con su nombre comercial: Chevrolet (no CHEV ni CHEVY), Volkswagen (no VW), Nissan, Ford, Toyota, Honda, Dodge, Jeep, RAM, Kia, Hyundai, Mazda, Mitsubishi, Renault, Peugeot, Seat, Suzuki, Buick, Cadillac, GMC.
+- Los años compatibles se escriben como rango de cuatro dígitos ("2008-2017"); un año abreviado en el nombre ("08-17") se expande al siglo correspondiente.
+- Responde siempre con JSON válido, sin bloques de código, comentarios ni texto antes o después.
+
+Tipos de producto:
+- refaccion: pieza de repuesto que sustituye a una pieza original del vehículo por desgaste o falla. Ejemplos: filtros de aceite, aire o combustible, balatas, discos y tambores de freno, bujías, sensores, bandas y correas, mangueras, amortiguadores, rótulas, terminales, alternadores, marchas, baterías, radiadores, termostatos, bombas, embragues, juntas y empaques, sellos y retenes, tornillería, soportes, bujes, cojinetes, válvulas y módulos electrónicos.
+- accesorio: producto que se agrega al vehículo para personalizarlo, protegerlo o mejorar el confort, sin reemplazar una pieza original. Ejemplos: equipos de audio y bocinas, pantallas, iluminación LED decorativa, alarmas, cámaras de reversa, spoilers, tapetes, fundas para asientos, organizadores, portaequipajes, calcomanías y vinilos.
+- fluido: líquido, lubricante o químico que se consume con el uso del vehículo y se vende por volumen o por envase. Ejemplos: aceite de motor, aceite de transmisión, líquido de frenos, anticongelante y refrigerante, líquido de dirección hidráulica, grasa, aditivos y limpiadores.
+- servicio_instalacion: trabajo de taller para montar una pieza o un accesorio (mano de obra), no la pieza en sí. Ejemplos: instalación de autoestéreo, instalación de alarma, colocación de polarizado, instalación de enganche.
+- servicio_mantenimiento: trabajo de taller periódico o preventivo. Ejemplos: afinación, cambio de aceite, alineación y balanceo, servicio de frenos, limpieza de inyectores, diagnóstico por computadora.
+Cuando el nombre combine varias palabras de distintos tipos, decide por el sustantivo principal, que casi siempre es la primera palabra: "FILTRO,ACEITE" es una refacción (un filtro para aceite), "SELLO,FLTR LIQUIDO TRANS" es una refacción (un sello), y "ACEITE MOTOR 5W30" es un fluido.
+
+Significado de los campos:
+- description: de 2 a 4 oraciones para la página del producto. La primera dice qué es y para qué sirve; las siguientes, en qué vehículos o sistemas se usa y qué cuidar al instalarlo o usarlo. No empieces con "Este producto".
+- suggested_category: categoría corta del catálogo, en singular y con mayúscula inicial (por ejemplo "Frenos", "Suspensión", "Filtros", "Sistema eléctrico", "Enfriamiento", "Motor", "Transmisión", "Carrocería", "Audio y video", "Lubricantes", "Servicios de taller").
+- search_keywords: de 3 a 5 palabras o frases cortas, en minúsculas, útiles para buscar una foto genérica del producto (por ejemplo "balata", "pastillas de freno", "freno de disco"); no incluyas números de parte ni marcas de vehículos.
+- technical_specs: solo las llaves que pide el formato de respuesta, siempre como texto:
+  - marca_compatible: marcas de vehículos compatibles, separadas por coma.
+  - modelos_compatibles: modelos de vehículos compatibles, separados por coma.
+  - años_compatibles: rango de años compatibles ("2008-2017").
+  - especificaciones: otras especificaciones técnicas (medidas, material, posición, viscosidad, norma, presentación o lo que incluye un servicio).
+  - tiempo_estimado: duración aproximada de un servicio ("1 hora", "30 a 45 minutos").
+  - dificultad: dificultad de un servicio de instalación: baja, media o alta.
+  - herramientas: herramientas o equipo que requiere el servicio.
+  - frecuencia_recomendada: cada cuántos kilómetros o meses se recomienda un servicio de mantenimiento.
+
+Abreviaturas frecuentes en los nombres del inventario:
+DEL/DLNT = delantero, TRAS/TR = trasero, IZQ = izquierdo, DER = derecho, SUP = superior, INF = inferior,
+CJTE = conjunto, P/ = para, C/ = con, S/ = sin, RDA = rueda, SOP/SOPT = soporte, MTR = motor,
+TRANS = transmisión, CIL = cilindro, VLV = válvula, BAT = batería, CIG = cigüeñal, PNL = panel,
+VTN = ventana, MOLD = moldura, ADAP = adaptador, FLTR = filtro, ENFRI = enfriamiento, SAL = salida,
+ENT = entrada, DIR = dirección, SUSP = suspensión, AMORT = amortiguador, ESCAPE/ESC = escape,
+ELECT = eléctrico, INTERR = interruptor, TERM = terminal, REF = refacción, AUTO = automática,
+EST = estándar, EMB = embrague, DIST = distribución, ALT = alternador, ARR = arrancador o marcha,
+HID = hidráulico, NEUM = neumático, ANTICONG = anticongelante, SINT = sintético, MIN = mineral.
+
+Ejemplos de estilo (solo ilustran el tono y el nivel de detalle; responde únicamente con los campos del formato indicado al final):
+Producto: BALATA DEL CHEV AVEO 08-17
+Respuesta: {{"description": "Juego de balatas delanteras para el sistema de frenos de disco. Sustituye a las balatas originales cuando llegan al límite de desgaste y mantiene una frenada firme y silenciosa. Se recomienda revisar el estado de los discos al cambiarlas.", "product_type": "refaccion", "suggested_category": "Frenos", "technical_specs": {{"marca_compatible": "Chevrolet", "modelos_compatibles": "Aveo", "años_compatibles": "2008-2017", "especificaciones": "Posición delantera"}}, "search_keywords": ["balatas", "pastillas de freno", "freno de disco"]}}
+Producto: ACEITEMINERAL-20W50 AP SN 5
+Respuesta: {{"description": "Aceite mineral para motor a gasolina con viscosidad 20W-50 y clasificación API SN. Protege los motores con kilometraje alto y ayuda a reducir el consumo de aceite.", "product_type": "fluido", "suggested_category": "Lubricantes", "technical_specs": {{"especificaciones": "Viscosidad 20W-50, API SN, mineral"}}, "search_keywords": ["aceite de motor", "lubricante", "botella de aceite"]}}
+Producto: SERV AFINACION MAYOR 4 CIL
+Respuesta: {{"description": "Servicio de afinación mayor para motores de cuatro cilindros. Incluye el cambio de bujías y filtros y la limpieza del cuerpo de aceleración, para recuperar el rendimiento y reducir el consumo de combustible.", "product_type": "servicio_mantenimiento", "suggested_category": "Servicios de taller", "technical_specs": {{"tiempo_estimado": "2 a 3 horas", "frecuencia_recomendada": "Cada 20,000 km o 12 meses", "especificaciones": "Bujías, filtro de aire, filtro de combustible y limpieza de cuerpo de aceleración"}}, "search_keywords": ["afinación", "mecánico", "taller automotriz"]}}"""
+
+PRODUCT_SUFFIX = """Producto: {name}
+Número de Parte: {part_number}
+Precio: ${price:.2f}"""
+
+
+def common_instructions(product_types: Sequence[str]) -> str:
+    """Bloque fijo con el que empiezan todos los prompts de plantilla"""
+    return COMMON_INSTRUCTIONS.format(product_types=', '.join(product_types))
+
+
+class PromptTemplate:
+    """Prompt, esquema y validador de un tipo de producto"""
+
+    def __init__(self, product_type: str, fields: Sequence[str], spec_fields: Dict[str, str],
+                 product_types: Sequence[str]):
+        self.product_type = product_type
+        self.fields = tuple(fields)
+        self.spec_fields = dict(spec_fields)
+        self.schema = enrichment_schema(product_types, self.fields, tuple(self.spec_fields))
+        self.batch_schema = batch_schema(product_types, self.fields, tuple(self.spec_fields))
+        self.validate: Callable = compile_validator(self.schema)
+        self.max_tokens = max_tokens_for(self.fields, spec_count=len(self.spec_fields))
+        self._product_types = list(product_types)
+
+        # Primero el bloque común (idéntico para todos los tipos), después lo propio del tipo
+        self.common_prefix = common_instructions(product_types)
+        context = (f"Formato de respuesta. Tipo detectado por palabras clave: "
+                   f"{TYPE_CONTEXT.get(product_type, 'autopartes y productos automotrices')} "
+                   f"(product_type {product_type}); corrígelo si no corresponde.")
+        self.prefix = (f"{self.common_prefix}\n\n{context} Analiza el producto indicado al final y responde SOLO "
+                       f"con un objeto JSON válido, sin texto adicional, con esta forma:\n{self._shape(self.fields)}\n\n")
+        self.batch_prefix = (f"{self.common_prefix}\n\n{context} Analiza cada uno de los productos listados al final. "
+                             f"Responde SOLO con un arreglo JSON válido, sin texto adicional, con exactamente un "
+                             f"objeto por producto, en el mismo orden y con el mismo id numérico, con esta forma:\n"
+                             f"{self._shape(('id',) + self.fields)}\n\n")
+        self.version = prompt_version(self.prefix, self.batch_prefix)
+
+    def instruction(self, field: str) -> str:
+        if field == 'id':
+            return '"id": <el mismo id numérico del producto>'
+        if field == 'product_type':
+            return f'"product_type": "{"|".join(self._product_types)}"'
+        if field == 'technical_specs':
+            specs = ", ".join(f'"{key}": "{text}"' for key, text in self.spec_fields.items())
+            return f'"technical_specs": {{{specs}}}'
+        return FIELD_INSTRUCTIONS[field]
+
+    def _shape(self, fields: Sequence[str]) -> str:
+        return "{\n" + ",\n".join(f"    {self.instruction(field)}" for field in fields) + "\n}"
+
+    def render(self, name: str, part_number: str, price: float) -> str:
+        return self.prefix + PRODUCT_SUFFIX.format(name=name, part_number=part_number, price=float(price or 0))
+
+    def render_batch(self, items: Sequence[str]) -> str:
+        return self.batch_prefix + f"Productos ({len(items)}):\n" + "\n".join(items)
+
+    def field_schema(self, fields: Sequence[str]) -> Dict:
+        return enrichment_schema(self._product_types, fields, tuple(self.spec_fields))
+
+    def field_max_tokens(self, fields: Sequence[str]) -> int:
+        return max_tokens_for(fields, spec_count=len(self.spec_fields))
+
+
+def template_fields(product_type: str, config: Dict[str, FieldConfig]):
+    """(campos de la respuesta, llaves de technical_specs) visibles o requeridos para el tipo"""
+    def wanted(field_name: str) -> bool:
+        row = config.get(field_name)
+        # Un campo sin configuración se pide (mismo comportamiento que sin plantillas)
+        return row is None or row.is_visible or row.is_required
+
+    requested = {'product_type'}
+    requested.update(field for name, field in RESPONSE_FIELD_BY_CONFIG.items() if wanted(name))
+    spec_fields: Dict[str, str] = {}
+    for field_name, defaults in DEFAULT_SPECS_BY_FIELD.items():
+        if wanted(field_name):
+            spec_fields.update(SPECS_BY_FIELD.get(field_name, {}).get(product_type, defaults))
+    if spec_fields:
+        requested.add('technical_specs')
+    return [field for field in ENRICHMENT_FIELDS if field in requested], spec_fields
+
+
+class PromptRegistry:
+    """Una plantilla por tipo de producto; los tipos sin configuración piden todos los campos"""
+
+    def __init__(self, field_config: Dict[str, Dict[str, FieldConfig]], product_types: Sequence[str],
+                 default_type: str = 'refaccion'):
+        self.default_type = default_type
+        self.templates: Dict[str, PromptTemplate] = {}
+        for product_type in product_types:
+            fields, spec_fields = template_fields(product_type, field_config.get(product_type, {}))
+            self.templates[product_type] = PromptTemplate(product_type, fields, spec_fields, product_types)
+        self.version = prompt_version(*(template.version for template in self.templates.values()))
+
+    def get(self, product_type: Optional[str]) -> PromptTemplate:
+        return self.templates.get(product_type) or self.templates[self.default_type]
+
+    def describe(self) -> Dict[str, Dict]:
+        """Campos y tope de tokens por tipo (para mostrar en consola)"""
+        return {
+            product_type: {
+                "fields": list(template.fields),
+                "technical_specs": list(template.spec_fields),
+                "max_tokens": template.max_tokens,
+                "prefix_chars": len(template.prefix),
+                "common_prefix_chars": len(template.common_prefix),
+            }
+            for product_type, template in self.templates.items()
+        }
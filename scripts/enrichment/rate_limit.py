@@ -0,0 +1,85 @@
+"""
+Limitador de tasa compartido (token bucket) para llamadas a APIs externas.
+
+Aplica al mismo tiempo un presupuesto de requests por minuto (RPM) y uno de
+tokens por minuto (TPM). Es seguro para usarse desde varios hilos.
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Cubeta de tokens que se rellena de forma continua"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Segundos que faltan para poder consumir `amount` tokens"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Limitador RPM/TPM compartido entre todos los workers"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0) -> int:
+        """
+        Bloquea hasta que haya presupuesto para un request de `tokens` tokens.
+        Retorna los tokens reservados (para ajustarlos con `settle`).
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = 0.0
+                if self.requests:
+                    wait = max(wait, self.requests.wait_time(1, now))
+                if self.tokens and tokens:
+                    wait = max(wait, self.tokens.wait_time(tokens, now))
+                if wait <= 0:
+                    if self.requests:
+                        self.requests.consume(1)
+                    if self.tokens and tokens:
+                        self.tokens.consume(tokens)
+                    return tokens
+            time.sleep(min(wait, 1.0))
+
+    def settle(self, reserved: int, used: Optional[int]):
+        """Ajusta la reserva de tokens con el consumo real reportado por la API"""
+        if not self.tokens or used is None:
+            return
+        with self._lock:
+            diff = reserved - used
+            if diff > 0:
+                self.tokens.refund(diff)
+            elif diff < 0:
+                self.tokens.consume(-diff)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.requests or self.tokens)
@@ -0,0 +1,193 @@
+"""
+Lector en streaming del Excel/CSV de entrada.
+
+Recorre el archivo fila por fila (openpyxl en modo read-only o el módulo csv)
+y produce registros compactos y tipados, sin cargar todo el archivo en memoria.
+Los precios y existencias se parsean con expresiones precompiladas, de modo
+que valores como "$1,234.50" no rompen el proceso.
+"""
+
+import csv
+import os
+import re
+from typing import Iterator, List, NamedTuple, Optional
+
+import openpyxl
+
+# Mapear posibles nombres de columnas (encabezados normalizados)
+COLUMN_MAPPING = {
+    'numero_de_parte': 'part_number',
+    'número_de_parte': 'part_number',
+    'no._de_parte': 'part_number',
+    'no_de_parte': 'part_number',
+    'part_number': 'part_number',
+    'partnumber': 'part_number',
+    'sku': 'part_number',
+    'codigo': 'part_number',
+    'código': 'part_number',
+    'nombre': 'name',
+    'name': 'name',
+    'producto': 'name',
+    'descripcion': 'name',
+    'existencia': 'stock',
+    'existencias': 'stock',
+    'stock': 'stock',
+    'inventario': 'stock',
+    'cantidad': 'stock',
+    'precio': 'price',
+    'price': 'price',
+    'precio_unitario': 'price',
+    'costo': 'price'
+}
+
+REQUIRED_COLUMNS = ['name', 'price']
+DEFAULT_CHUNK_SIZE = 5000
+
+# Todo lo que no sea dígito, separador o signo (símbolos de moneda, espacios, letras)
+_NUMBER_NOISE = re.compile(r'[^0-9.,\-]')
+_THOUSANDS_COMMA = re.compile(r'^-?\d{1,3}(,\d{3})+(\.\d+)?$')
+_THOUSANDS_DOT = re.compile(r'^-?\d{1,3}(\.\d{3})+(,\d+)?$')
+
+
+class InputRecord(NamedTuple):
+    """Fila de entrada ya tipada"""
+    name: str
+    part_number: str
+    price: float
+    stock: Optional[float]
+
+
+def normalize_header(header) -> str:
+    """Normaliza un encabezado (sin espacios extremos, minúsculas, espacios -> _)"""
+    return str(header if header is not None else '').strip().lower().replace(' ', '_')
+
+
+def parse_number(value) -> Optional[float]:
+    """
+    Convierte un valor de celda a float. Acepta números, "$1,234.50", "1.234,50",
+    "  15 pzas". Retorna None si la celda está vacía o no es numérica.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)  # NaN -> None
+
+    text = _NUMBER_NOISE.sub('', str(value))
+    if not text or text in ('-', '.', ','):
+        return None
+
+    if ',' in text and '.' in text:
+        # El separador que aparece al final es el decimal
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        text = text.replace(',', '') if _THOUSANDS_COMMA.match(text) else text.replace(',', '.')
+    elif text.count('.') > 1 and _THOUSANDS_DOT.match(text):
+        text = text.replace('.', '')
+
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def format_text(value) -> str:
+    """Texto de una celda; los números enteros leídos como float pierden el '.0'"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if value != value:
+            return ''
+        if value.is_integer():
+            return str(int(value))
+    return str(value).strip()
+
+
+class InputReader:
+    """Lee productos de un .xlsx/.xlsm o .csv como registros tipados"""
+
+    def __init__(self, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.is_csv = os.path.splitext(file_path)[1].lower() in ('.csv', '.txt')
+        self.invalid_prices = 0
+        self.estimated_rows: Optional[int] = None
+
+        rows = self._raw_rows()
+        header = next(rows, None)
+        rows.close()
+        if header is None:
+            raise ValueError("El archivo está vacío")
+        self.columns = [COLUMN_MAPPING.get(normalize_header(h), normalize_header(h)) for h in header]
+
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in self.columns]
+        if missing_columns:
+            raise ValueError(f"Faltan columnas requeridas: {', '.join(missing_columns)}")
+
+        # Si varias columnas mapean al mismo campo, usar la primera
+        self._indexes = {}
+        for idx, column in enumerate(self.columns):
+            self._indexes.setdefault(column, idx)
+
+    def _raw_rows(self) -> Iterator[tuple]:
+        if self.is_csv:
+            if self.estimated_rows is None:
+                with open(self.file_path, 'rb') as f:
+                    lines = sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b''))
+                self.estimated_rows = max(lines - 1, 0)
+            with open(self.file_path, newline='', encoding='utf-8-sig') as f:
+                sample = f.read(8192)
+                f.seek(0)
+                try:
+                    dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+                except csv.Error:
+                    dialect = csv.excel
+                yield from csv.reader(f, dialect)
+            return
+
+        wb = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            if ws.max_row:
+                self.estimated_rows = max(ws.max_row - 1, 0)
+            yield from ws.iter_rows(values_only=True)
+        finally:
+            wb.close()
+
+    def __iter__(self) -> Iterator[InputRecord]:
+        name_idx = self._indexes['name']
+        price_idx = self._indexes['price']
+        part_idx = self._indexes.get('part_number')
+        stock_idx = self._indexes.get('stock')
+
+        rows = self._raw_rows()
+        next(rows, None)  # encabezados
+        for raw in rows:
+            if not raw or all(cell is None or cell == '' for cell in raw):
+                continue
+            width = len(raw)
+            price = parse_number(raw[price_idx]) if price_idx < width else None
+            if price is None:
+                self.invalid_prices += 1
+                price = 0.0
+            yield InputRecord(
+                name=format_text(raw[name_idx]) if name_idx < width else '',
+                part_number=format_text(raw[part_idx]) if part_idx is not None and part_idx < width else '',
+                price=price,
+                stock=parse_number(raw[stock_idx]) if stock_idx is not None and stock_idx < width else None,
+            )
+
+    def iter_chunks(self) -> Iterator[List[InputRecord]]:
+        """Registros agrupados en listas de hasta `chunk_size` elementos"""
+        chunk = []
+        for record in self:
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
@@ -0,0 +1,140 @@
+"""
+Almacén en memoria de los resultados de enriquecimiento.
+
+Cada fila se registra una sola vez al terminar de procesarse; el resumen
+(tipos de producto, fallos, imágenes, rangos de precio) se calcula a partir
+de este almacén en una sola pasada, sin volver a llamar a la IA.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Límites superiores de los rangos de precio del resumen
+PRICE_BUCKETS = [100, 500, 1000, 5000, 10000]
+
+
+def price_bucket_label(price: float) -> str:
+    """Etiqueta del rango de precio al que pertenece `price`"""
+    lower = 0
+    for upper in PRICE_BUCKETS:
+        if price < upper:
+            return f"${lower:,} - ${upper:,}"
+        lower = upper
+    return f"${lower:,}+"
+
+
+class EnrichmentResultStore:
+    """Registro compacto de resultados por posición de fila"""
+
+    def __init__(self):
+        # (product_type, price, has_image, source) por fila
+        self._records: Dict[int, Tuple[str, float, bool, str]] = {}
+        # Filas que copiaron el resultado de otra equivalente (deduplicación)
+        self.duplicates = 0
+        # Imágenes descartadas en la verificación y productos con imagen repetida
+        self.images_rejected = 0
+        self.images_shared = 0
+        # Búsquedas de imagen omitidas por el circuito de Unsplash o la fecha límite
+        self.images_deferred = 0
+        # Conteos del modo incremental (nuevos, cambiados, sin cambios, eliminados)
+        self.incremental: Optional[Dict[str, int]] = None
+
+    def add(self, position: int, result: Dict):
+        enriched_data = result.get('enriched_data', {})
+        self._records[position] = (
+            enriched_data.get('product_type', 'refaccion'),
+            result.get('price') or 0,
+            bool(result.get('image_url')),
+            'previous' if result.get('carried_forward') else enriched_data.get('source', 'ai'),
+        )
+        if result.get('duplicate_of'):
+            self.duplicates += 1
+        if result.get('rejected_image_url'):
+            self.images_rejected += 1
+        if result.get('image_shared_with'):
+            self.images_shared += 1
+        if result.get('image_deferred'):
+            self.images_deferred += 1
+
+    def add_many(self, product_types: Iterable[str], prices: Iterable[float], has_images: Iterable[bool],
+                 source: str):
+        """Registra un bloque de filas consecutivas (p. ej. del modo por columnas)"""
+        position = len(self._records)
+        for product_type, price, has_image in zip(product_types, prices, has_images):
+            self._records[position] = (product_type, price or 0, bool(has_image), source)
+            position += 1
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def summary(self) -> Dict:
+        """Calcula todos los agregados en una sola pasada"""
+        product_types: Dict[str, int] = {}
+        price_buckets: Dict[str, int] = {}
+        sources: Dict[str, int] = {}
+        images_found = 0
+
+        for product_type, price, has_image, source in self._records.values():
+            product_types[product_type] = product_types.get(product_type, 0) + 1
+            bucket = price_bucket_label(price)
+            price_buckets[bucket] = price_buckets.get(bucket, 0) + 1
+            sources[source] = sources.get(source, 0) + 1
+            if has_image:
+                images_found += 1
+
+        total = len(self._records)
+        return {
+            "total": total,
+            "product_types": product_types,
+            "price_buckets": price_buckets,
+            "sources": sources,
+            "failures": sources.get('fallback', 0),
+            "deferred": sources.get('deferred', 0),
+            "images_found": images_found,
+            "image_hit_rate": images_found / total if total else 0.0,
+            "images_rejected": self.images_rejected,
+            "images_shared": self.images_shared,
+            "images_deferred": self.images_deferred,
+            "duplicates": self.duplicates,
+            "dedup_ratio": total / (total - self.duplicates) if total > self.duplicates else 1.0,
+        }
+
+    def summary_rows(self, summary: Optional[Dict] = None) -> List[List]:
+        """Filas para la hoja "Resumen" (etiqueta, valor)"""
+        summary = summary or self.summary()
+        rows = [
+            ["TIPOS DE PRODUCTO ENCONTRADOS:", ""],
+        ]
+        for product_type, count in sorted(summary['product_types'].items()):
+            rows.append(["", f"  • {product_type}: {count} productos"])
+
+        rows.append(["", ""])
+        rows.append(["RANGOS DE PRECIO:", ""])
+        bucket_order = [price_bucket_label(upper - 1) for upper in PRICE_BUCKETS] + [price_bucket_label(PRICE_BUCKETS[-1])]
+        for bucket in bucket_order:
+            if bucket in summary['price_buckets']:
+                rows.append(["", f"  • {bucket}: {summary['price_buckets'][bucket]} productos"])
+
+        rows.append(["", ""])
+        rows.append(["CALIDAD DEL ENRIQUECIMIENTO:", ""])
+        rows.append(["Enriquecidos con IA:", summary['sources'].get('ai', 0)])
+        rows.append(["Desde caché:", summary['sources'].get('cache', 0)])
+        rows.append(["Sin cambios (copiados de la corrida anterior):", summary['sources'].get('previous', 0)])
+        rows.append(["Resueltos por reglas de número de parte:", summary['sources'].get('part_rule', 0)])
+        rows.append(["Resueltos por el clasificador (sin IA):", summary['sources'].get('classifier', 0)])
+        rows.append(["Enriquecimiento básico:", summary['sources'].get('basic', 0)])
+        rows.append(["Fallos de IA (modo básico):", summary['failures']])
+        rows.append(["Pospuestos para re-enriquecer (sin IA):", summary['deferred']])
+        rows.append(["Imágenes pospuestas:", summary['images_deferred']])
+        rows.append(["Imágenes encontradas:", f"{summary['images_found']} ({summary['image_hit_rate']:.1%})"])
+        rows.append(["Imágenes descartadas (rotas o pequeñas):", summary['images_rejected']])
+        rows.append(["Productos con imagen repetida:", summary['images_shared']])
+        rows.append(["Filas duplicadas (resultado copiado):", summary['duplicates']])
+        rows.append(["Filas por producto único:", f"{summary['dedup_ratio']:.2f}"])
+        if self.incremental is not None:
+            rows.append(["", ""])
+            rows.append(["CAMBIOS RESPECTO A LA CORRIDA ANTERIOR:", ""])
+            rows.append(["Productos nuevos:", self.incremental.get('new', 0)])
+            rows.append(["Productos cambiados (re-enriquecidos):", self.incremental.get('changed', 0)])
+            rows.append(["Productos sin cambios:", self.incremental.get('unchanged', 0)])
+            rows.append(["Productos eliminados (hoja Productos Eliminados):", self.incremental.get('removed', 0)])
+        return rows
@@ -0,0 +1,115 @@
+"""
+Ruteo por confianza: decide qué filas necesitan la IA.
+
+Antes de pagar un request se consultan fuentes baratas, en orden:
+1. Caché de resultados de IA (lo revisa el enricher antes de rutear)
+2. Reglas por número de parte (archivo CSV: patrón regex -> tipo de producto)
+3. Clasificador por palabras clave, si su confianza y número de coincidencias
+   alcanzan los umbrales
+
+Solo las filas que ninguna fuente resuelve con suficiente confianza van a la
+IA. Las demás se completan en modo básico con el tipo de producto decidido.
+"""
+
+import csv
+import re
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from enrichment.cache import normalize_part_number
+from enrichment.classifier import KeywordClassifier
+
+ROUTE_CACHE = 'cache'
+ROUTE_PART_RULE = 'part_rule'
+ROUTE_CLASSIFIER = 'classifier'
+ROUTE_LLM = 'llm'
+ROUTES = (ROUTE_CACHE, ROUTE_PART_RULE, ROUTE_CLASSIFIER, ROUTE_LLM)
+
+# Por defecto el clasificador solo decide si todas sus coincidencias apuntan al mismo tipo
+DEFAULT_MIN_CONFIDENCE = 1.0
+DEFAULT_MIN_MATCHES = 1
+
+
+class RouteDecision(NamedTuple):
+    route: str
+    product_type: Optional[str] = None
+    confidence: float = 0.0
+
+
+class PartNumberRule(NamedTuple):
+    pattern: 're.Pattern'
+    product_type: str
+
+
+def load_part_rules(path: str, valid_types: Iterable[str]) -> List[PartNumberRule]:
+    """
+    Lee reglas de un CSV con columnas `patron,tipo_producto`. El patrón es una
+    expresión regular que se busca al inicio del número de parte normalizado
+    (mayúsculas, sin espacios ni guiones). Gana la primera regla que coincide.
+    """
+    valid_types = set(valid_types)
+    rules = []
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for line_number, row in enumerate(csv.DictReader(f), start=2):
+            pattern = (row.get('patron') or '').strip()
+            product_type = (row.get('tipo_producto') or '').strip()
+            if not pattern:
+                continue
+            if product_type not in valid_types:
+                raise ValueError(f"{path}:{line_number}: tipo de producto inválido '{product_type}'")
+            try:
+                rules.append(PartNumberRule(re.compile(pattern, re.IGNORECASE), product_type))
+            except re.error as e:
+                raise ValueError(f"{path}:{line_number}: patrón inválido '{pattern}': {e}")
+    return rules
+
+
+class ConfidenceRouter:
+    """Decide la ruta de cada fila y cuenta cuántas tomaron cada una (seguro para varios hilos)"""
+
+    def __init__(self, classifier: KeywordClassifier, rules: Optional[List[PartNumberRule]] = None,
+                 use_classifier: bool = True, min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                 min_matches: int = DEFAULT_MIN_MATCHES):
+        self.classifier = classifier
+        self.rules = rules or []
+        self.use_classifier = use_classifier
+        self.min_confidence = min_confidence
+        self.min_matches = min_matches
+        self.counts: Dict[str, int] = {route: 0 for route in ROUTES}
+        self._lock = threading.Lock()
+
+    def record(self, route: str):
+        with self._lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+
+    def decide(self, name: str, part_number: str = "") -> RouteDecision:
+        """Ruta de una fila sin registrarla"""
+        if self.rules:
+            normalized = normalize_part_number(part_number)
+            if normalized:
+                for rule in self.rules:
+                    if rule.pattern.match(normalized):
+                        return RouteDecision(ROUTE_PART_RULE, rule.product_type, 1.0)
+
+        if self.use_classifier:
+            result = self.classifier.classify(name, part_number)
+            matches = result.scores.get(result.product_type, 0)
+            if matches >= self.min_matches and result.confidence >= self.min_confidence:
+                return RouteDecision(ROUTE_CLASSIFIER, result.product_type, result.confidence)
+
+        return RouteDecision(ROUTE_LLM)
+
+    def route(self, name: str, part_number: str = "") -> RouteDecision:
+        decision = self.decide(name, part_number)
+        self.record(decision.route)
+        return decision
+
+    def report(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+    def llm_avoided_ratio(self) -> float:
+        """Fracción de las filas ruteadas que no necesitaron la IA"""
+        counts = self.report()
+        total = sum(counts.values())
+        return (total - counts.get(ROUTE_LLM, 0)) / total if total else 0.0
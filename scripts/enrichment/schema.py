@@ -0,0 +1,249 @@
+"""
+Esquema JSON de la respuesta de enriquecimiento y su validación.
+
+- `enrichment_schema` construye el esquema completo. `response_format` lo
+  envía a OpenAI (structured outputs, modo estricto) sin las restricciones que
+  ese modo rechaza (`minLength`, `maxItems`); esas solo las aplica la
+  validación local.
+- `compile_validator` convierte el esquema, una sola vez, en una función por
+  campo; validar una respuesta no interpreta el esquema de nuevo y retorna los
+  campos inválidos o faltantes, para volver a pedir solo esos.
+- `repair_truncated_json` recupera lo completo de una respuesta cortada por
+  `max_tokens` (cierra strings, objetos y arreglos abiertos o recorta el último
+  miembro incompleto) en lugar de descartarla.
+
+Solo se soporta el subconjunto de JSON Schema que usa este esquema
+(object, array, string, enum), sin dependencias externas.
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+TECHNICAL_SPEC_FIELDS = ('marca_compatible', 'modelos_compatibles', 'años_compatibles', 'especificaciones')
+ENRICHMENT_FIELDS = ('description', 'product_type', 'suggested_category', 'technical_specs', 'search_keywords')
+
+# Tokens de salida suficientes para cada campo (al volver a pedir solo algunos)
+FIELD_MAX_TOKENS = {
+    'description': 220,
+    'product_type': 15,
+    'suggested_category': 30,
+    'search_keywords': 40,
+}
+# Por cada llave de technical_specs
+SPEC_FIELD_MAX_TOKENS = 40
+# Llaves y formato del objeto JSON
+RESPONSE_OVERHEAD_TOKENS = 30
+
+# Palabras clave de JSON Schema que acepta structured outputs en modo estricto
+STRICT_SCHEMA_KEYWORDS = frozenset({
+    'type', 'properties', 'required', 'additionalProperties', 'items', 'enum', 'const',
+    'description', 'anyOf', '$defs', '$ref',
+})
+
+
+def _object_schema(properties: Dict[str, Dict]) -> Dict:
+    # El modo estricto exige todas las propiedades como requeridas y sin propiedades adicionales
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def enrichment_properties(product_types: Sequence[str],
+                          spec_fields: Sequence[str] = TECHNICAL_SPEC_FIELDS) -> Dict[str, Dict]:
+    return {
+        "description": {"type": "string", "minLength": 1},
+        "product_type": {"type": "string", "enum": list(product_types)},
+        "suggested_category": {"type": "string"},
+        "technical_specs": _object_schema({field: {"type": "string"} for field in spec_fields}),
+        "search_keywords": {"type": "array", "items": {"type": "string"}, "maxItems": 5},
+    }
+
+
+def enrichment_schema(product_types: Sequence[str], fields: Optional[Sequence[str]] = None,
+                      spec_fields: Sequence[str] = TECHNICAL_SPEC_FIELDS) -> Dict:
+    """Esquema de un objeto de enriquecimiento (o solo de `fields`)"""
+    properties = enrichment_properties(product_types, spec_fields)
+    if fields is not None:
+        properties = {field: properties[field] for field in fields}
+    return _object_schema(properties)
+
+
+def batch_schema(product_types: Sequence[str], fields: Optional[Sequence[str]] = None,
+                 spec_fields: Sequence[str] = TECHNICAL_SPEC_FIELDS) -> Dict:
+    """Esquema de un lote: el modo estricto exige un objeto en la raíz, con el arreglo dentro"""
+    item = enrichment_schema(product_types, fields, spec_fields)
+    item["properties"] = {"id": {"type": "integer"}, **item["properties"]}
+    item["required"] = ["id"] + item["required"]
+    return _object_schema({"products": {"type": "array", "items": item}})
+
+
+def strict_schema(schema: Dict) -> Dict:
+    """Copia de `schema` solo con las palabras clave que acepta el modo estricto"""
+    strict = {}
+    for keyword, value in schema.items():
+        if keyword not in STRICT_SCHEMA_KEYWORDS:
+            continue
+        if keyword in ('properties', '$defs'):
+            value = {name: strict_schema(sub) for name, sub in value.items()}
+        elif keyword == 'items' and isinstance(value, dict):
+            value = strict_schema(value)
+        elif keyword == 'anyOf':
+            value = [strict_schema(sub) for sub in value]
+        elif isinstance(value, list):
+            value = list(value)
+        strict[keyword] = value
+    return strict
+
+
+def response_format(name: str, schema: Dict) -> Dict:
+    """Parámetro `response_format` de chat completions para structured outputs"""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": strict_schema(schema)}}
+
+
+def max_tokens_for(fields: Sequence[str], count: int = 1, spec_count: int = len(TECHNICAL_SPEC_FIELDS)) -> int:
+    """Tope de tokens de salida ajustado a los campos pedidos"""
+    per_object = RESPONSE_OVERHEAD_TOKENS + sum(
+        SPEC_FIELD_MAX_TOKENS * spec_count if field == 'technical_specs' else FIELD_MAX_TOKENS.get(field, 50)
+        for field in fields
+    )
+    return per_object * count
+
+
+def _compile(schema: Dict) -> Callable[[Any], bool]:
+    """Función que valida un valor contra `schema` (subconjunto soportado)"""
+    kind = schema.get("type")
+    if "enum" in schema:
+        allowed = frozenset(schema["enum"])
+        return lambda value: isinstance(value, str) and value in allowed
+    if kind == "string":
+        min_length = schema.get("minLength", 0)
+        if min_length:
+            return lambda value: isinstance(value, str) and len(value.strip()) >= min_length
+        return lambda value: isinstance(value, str)
+    if kind == "integer":
+        return lambda value: isinstance(value, int) and not isinstance(value, bool)
+    if kind == "array":
+        item_check = _compile(schema.get("items", {}))
+        max_items = schema.get("maxItems")
+
+        def check_array(value) -> bool:
+            if not isinstance(value, list) or (max_items is not None and len(value) > max_items):
+                return False
+            return all(item_check(item) for item in value)
+        return check_array
+    if kind == "object":
+        checks = [(field, _compile(sub)) for field, sub in schema.get("properties", {}).items()]
+
+        def check_object(value) -> bool:
+            return isinstance(value, dict) and all(field in value and check(value[field]) for field, check in checks)
+        return check_object
+    return lambda value: True
+
+
+def compile_validator(schema: Dict) -> Callable[[Any], List[str]]:
+    """
+    Compila un esquema de objeto en una función que retorna los campos de primer
+    nivel inválidos o faltantes (lista vacía = válido). Si el valor no es un
+    objeto, todos los campos son inválidos.
+    """
+    checks = [(field, _compile(sub)) for field, sub in schema.get("properties", {}).items()]
+    all_fields = [field for field, _ in checks]
+
+    def validate(data) -> List[str]:
+        if not isinstance(data, dict):
+            return list(all_fields)
+        return [field for field, check in checks if field not in data or not check(data[field])]
+    return validate
+
+
+def fill_defaults(data: Dict, spec_fields: Sequence[str] = TECHNICAL_SPEC_FIELDS) -> Dict:
+    """
+    Corrige en sitio desviaciones de forma que no ameritan otro request: specs
+    faltantes o nulas como texto vacío, keywords en un solo texto, de más, o nulas.
+    """
+    specs = data.get('technical_specs')
+    if isinstance(specs, dict):
+        for field in spec_fields:
+            value = specs.get(field)
+            if value is None:
+                specs[field] = ''
+            elif not isinstance(value, str):
+                specs[field] = ', '.join(map(str, value)) if isinstance(value, list) else str(value)
+    keywords = data.get('search_keywords')
+    if isinstance(keywords, str):
+        data['search_keywords'] = [keywords]
+    elif isinstance(keywords, list):
+        data['search_keywords'] = [str(keyword) for keyword in keywords if keyword is not None][:5]
+    if data.get('suggested_category') is None and 'suggested_category' in data:
+        data['suggested_category'] = ''
+    return data
+
+
+def repair_truncated_json(text: str) -> Optional[Any]:
+    """
+    Interpreta `text` como JSON, reparando un corte al final. Retorna el valor
+    o None si no hay nada recuperable.
+    """
+    text = (text or '').strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    start = next((i for i, ch in enumerate(text) if ch in '{['), None)
+    if start is None:
+        return None
+
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    # Última coma fuera de strings: todo lo anterior son miembros completos
+    last_comma: Optional[int] = None
+    last_comma_stack: List[str] = []
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                # Valor completo con texto sobrante después
+                try:
+                    return json.loads(text[start:i + 1])
+                except json.JSONDecodeError:
+                    return None
+        elif ch == ',':
+            last_comma = i
+            last_comma_stack = list(stack)
+
+    body = text[start:]
+    candidates = []
+    if not in_string:
+        # El último miembro quedó completo: basta con cerrar
+        candidates.append(body.rstrip().rstrip(',') + ''.join(reversed(stack)))
+    if last_comma is not None:
+        # Descartar el miembro incompleto
+        candidates.append(text[start:last_comma] + ''.join(reversed(last_comma_stack)))
+    # Sin miembros completos: contenedor vacío (los campos cuentan como faltantes)
+    candidates.append(body[0] + stack[0] if stack else body[0])
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
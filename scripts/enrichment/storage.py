@@ -0,0 +1,78 @@
+"""
+Adaptadores de almacenamiento para las imágenes derivadas.
+
+Un adaptador recibe una llave relativa (p. ej. "products/enriched/ab/<hash>-thumb.webp")
+y los bytes del archivo, y retorna la ruta con la que el backend sirve la imagen.
+El backend acepta rutas relativas al bucket (ver `normalizeStoragePath` en
+apps/backend/src/utils/storage.utils.ts), así que sin `public_base_url` se
+retorna la llave tal cual.
+"""
+
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+
+class StorageAdapter(ABC):
+    """Interfaz mínima: saber si una llave existe y subir bytes"""
+
+    def __init__(self, public_base_url: Optional[str] = None):
+        self.public_base_url = public_base_url.rstrip('/') if public_base_url else None
+        self.uploads = 0
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def upload(self, key: str, data: bytes, content_type: str) -> str:
+        ...
+
+    def url_for(self, key: str) -> str:
+        """Ruta que se escribe en el Excel (relativa al bucket o URL pública)"""
+        if self.public_base_url:
+            return f"{self.public_base_url}/{key}"
+        return key
+
+
+class LocalStorageAdapter(StorageAdapter):
+    """Guarda los archivos bajo un directorio local, respetando la estructura de la llave"""
+
+    def __init__(self, root: str, public_base_url: Optional[str] = None):
+        super().__init__(public_base_url)
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def upload(self, key: str, data: bytes, content_type: str) -> str:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.uploads += 1
+        return self.url_for(key)
+
+
+# Adaptadores disponibles por nombre (--storage)
+STORAGE_ADAPTERS: Dict[str, Type[StorageAdapter]] = {
+    'local': LocalStorageAdapter,
+}
+
+
+def create_storage(kind: str, **options) -> StorageAdapter:
+    if kind not in STORAGE_ADAPTERS:
+        raise ValueError(f"Almacenamiento desconocido: {kind} (disponibles: {', '.join(STORAGE_ADAPTERS)})")
+    return STORAGE_ADAPTERS[kind](**options)
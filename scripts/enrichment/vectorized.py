@@ -0,0 +1,62 @@
+"""
+Enriquecimiento básico (sin IA) por columnas, sobre DataFrames completos.
+
+Equivale a aplicar `_enrich_basic`, `format_technical_specs` y el cálculo de
+disponibilidad fila por fila, pero con operaciones de pandas/NumPy sobre
+bloques de registros. Se usa en el modo --no-ai sin búsqueda de imágenes.
+
+La clasificación usa `KeywordClassifier.classify_batch`, también por columnas.
+"""
+
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from enrichment.classifier import KeywordClassifier
+
+BASIC_DESCRIPTION_SUFFIX = ". Producto de calidad para vehículos."
+
+
+def enrich_basic_frame(frame: pd.DataFrame, classifier: KeywordClassifier) -> pd.DataFrame:
+    """
+    Recibe un DataFrame con columnas name, part_number, price, stock (como InputRecord)
+    y retorna las columnas de salida ya calculadas, más las columnas auxiliares
+    product_type_confidence y search_keywords.
+    """
+    names = frame['name'].astype(str)
+    part_numbers = frame['part_number'].astype(str)
+    stock = pd.to_numeric(frame['stock'], errors='coerce')
+
+    product_types, confidences = classifier.classify_batch(names, part_numbers)
+
+    # Palabras clave de búsqueda como en `_enrich_basic`: [nombre en minúsculas, número de parte]
+    lowered = names.str.lower()
+    search_keywords = lowered.where(part_numbers == '', lowered + '|' + part_numbers)
+
+    # Sin existencia registrada se asume disponible
+    is_available = np.where(stock.isna() | (stock > 0), 'true', 'false')
+
+    return pd.DataFrame({
+        'name': names,
+        'sku': part_numbers,
+        'description': names + BASIC_DESCRIPTION_SUFFIX,
+        'image_url': '',
+        'price': frame['price'].astype(float),
+        'product_type': product_types,
+        'category_slug': '',
+        'is_available': is_available,
+        'is_featured': 'false',
+        'display_order': 0,
+        # Las especificaciones del modo básico están vacías, por lo que el formato pipe-separated es ""
+        'technical_specs': '',
+        'stock': stock.astype(object).where(stock.notna(), ''),
+        'image_check': '',
+        'product_type_confidence': confidences,
+        'search_keywords': search_keywords,
+    }, index=frame.index)
+
+
+def frame_rows(frame: pd.DataFrame, fields: Sequence[str]) -> List[list]:
+    """Filas del DataFrame como listas, en el orden de `fields`"""
+    return frame[list(fields)].values.tolist()
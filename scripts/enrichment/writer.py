@@ -0,0 +1,182 @@
+"""
+Escritor del Excel enriquecido en modo write-only de openpyxl.
+
+Las filas se escriben en streaming conforme se producen y todas las celdas
+comparten estilos con nombre (encabezado, cuerpo, disponible/no disponible),
+así que la memoria no depende del número de filas. Las salidas muy grandes
+pueden repartirse en varias hojas y/o varios archivos.
+"""
+
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+# Configuración de estilos para Excel
+HEADER_FILL = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+HEADER_FONT = Font(bold=True, color="FFFFFF", size=11)
+SUCCESS_FILL = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+WARNING_FILL = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
+ERROR_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+BORDER = Border(
+    left=Side(style='thin'),
+    right=Side(style='thin'),
+    top=Side(style='thin'),
+    bottom=Side(style='thin')
+)
+
+# Límite de filas por hoja de Excel (1,048,576) menos margen para el encabezado
+EXCEL_MAX_ROWS = 1048575
+COLUMN_WIDTH = 25
+
+
+def _build_styles() -> dict:
+    body_alignment = Alignment(horizontal='left', vertical='top', wrap_text=True)
+    return {
+        'header': NamedStyle(name='enrich_header', font=HEADER_FONT, fill=HEADER_FILL, border=BORDER,
+                             alignment=Alignment(horizontal='center', vertical='center', wrap_text=True)),
+        'body': NamedStyle(name='enrich_body', border=BORDER, alignment=body_alignment),
+        'available': NamedStyle(name='enrich_available', border=BORDER, alignment=body_alignment, fill=SUCCESS_FILL),
+        'unavailable': NamedStyle(name='enrich_unavailable', border=BORDER, alignment=body_alignment, fill=WARNING_FILL),
+        'title': NamedStyle(name='enrich_title', font=Font(bold=True, size=14)),
+    }
+
+
+class EnrichedWorkbookWriter:
+    """
+    Escribe las filas enriquecidas en una o varias hojas/archivos.
+
+    columns: lista de (campo, encabezado, requerido), igual que en el script principal.
+    status_field: campo cuya celda se colorea según su valor "true"/"false".
+    """
+
+    def __init__(self, output_path: str, columns: Sequence[Tuple[str, str, bool]],
+                 sheet_title: str = "Productos Enriquecidos", status_field: Optional[str] = 'is_available',
+                 rows_per_sheet: int = EXCEL_MAX_ROWS, rows_per_file: Optional[int] = None):
+        self.output_path = output_path
+        self.columns = list(columns)
+        self.sheet_title = sheet_title
+        self.rows_per_sheet = min(rows_per_sheet, EXCEL_MAX_ROWS)
+        self.rows_per_file = rows_per_file
+        fields = [field for field, _, _ in self.columns]
+        self._status_idx = fields.index(status_field) if status_field in fields else None
+
+        self.rows_written = 0
+        self.paths: List[str] = []
+        self._workbooks: List[openpyxl.Workbook] = []
+        self._wb = None
+        self._ws = None
+        self._styles = None
+        self._sheet_rows = 0
+        self._file_rows = 0
+        self._sheet_count = 0
+        self._open_file()
+
+    def _file_path(self, index: int) -> str:
+        if index == 0:
+            return self.output_path
+        base, ext = os.path.splitext(self.output_path)
+        return f"{base}_parte{index + 1}{ext or '.xlsx'}"
+
+    def _open_file(self):
+        # El primer archivo se conserva abierto para agregar el resumen al final
+        if self._wb is not None and len(self._workbooks) > 1:
+            self._wb.save(self.paths[-1])
+            self._wb.close()
+
+        self._wb = openpyxl.Workbook(write_only=True)
+        for style in _build_styles().values():
+            self._wb.add_named_style(style)
+        self._styles = None
+        self._workbooks.append(self._wb)
+        self.paths.append(self._file_path(len(self.paths)))
+        self._file_rows = 0
+        self._sheet_count = 0
+        self._open_sheet()
+
+    def _open_sheet(self):
+        self._sheet_count += 1
+        title = self.sheet_title if self._sheet_count == 1 else f"{self.sheet_title} ({self._sheet_count})"
+        self._ws = self._wb.create_sheet(title[:31])
+        if self._styles is None:
+            self._styles = self._style_arrays(self._ws)
+        for col_idx in range(1, len(self.columns) + 1):
+            self._ws.column_dimensions[get_column_letter(col_idx)].width = COLUMN_WIDTH
+        self._ws.append([self._cell(header, 'header') for _, header, _ in self.columns])
+        self._sheet_rows = 0
+
+    @staticmethod
+    def _style_arrays(ws) -> dict:
+        """
+        Resuelve cada estilo con nombre una sola vez. Las celdas write-only se
+        serializan al momento y nunca se modifican, así que pueden compartir el arreglo.
+        """
+        arrays = {}
+        for key in ('header', 'body', 'available', 'unavailable'):
+            prototype = WriteOnlyCell(ws)
+            prototype.style = f'enrich_{key}'
+            arrays[key] = prototype._style
+        return arrays
+
+    def _cell(self, value, style: str) -> WriteOnlyCell:
+        cell = WriteOnlyCell(self._ws, value=value)
+        cell._style = self._styles[style]
+        return cell
+
+    def append(self, values: Sequence):
+        """Escribe una fila (valores en el orden de `columns`)"""
+        if self.rows_per_file and self._file_rows >= self.rows_per_file:
+            self._open_file()
+        elif self._sheet_rows >= self.rows_per_sheet:
+            self._open_sheet()
+
+        row = []
+        for idx, value in enumerate(values):
+            style = 'body'
+            if idx == self._status_idx:
+                style = 'available' if value == "true" else 'unavailable'
+            row.append(self._cell(value, style))
+        self._ws.append(row)
+        self._sheet_rows += 1
+        self._file_rows += 1
+        self.rows_written += 1
+
+    def write_summary(self, rows: Sequence[Sequence], title: str = "Resumen"):
+        """Agrega la hoja de resumen como primera hoja del primer archivo"""
+        wb = self._workbooks[0]
+        ws = wb.create_sheet(title, 0)
+        ws.column_dimensions['A'].width = 30
+        ws.column_dimensions['B'].width = 50
+        for row_idx, (label, value) in enumerate(rows, start=1):
+            if row_idx == 1:
+                label_cell = WriteOnlyCell(ws, value=label)
+                label_cell.style = 'enrich_title'
+                ws.append([label_cell, value])
+            else:
+                ws.append([label, value])
+
+    def write_table(self, title: str, headers: Sequence[str], rows: Sequence[Sequence]):
+        """Agrega una hoja con encabezado y filas al final del primer archivo (p. ej. métricas)"""
+        ws = self._workbooks[0].create_sheet(title[:31])
+        for col_idx in range(1, len(headers) + 1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = COLUMN_WIDTH
+        header_cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.style = 'enrich_header'
+            header_cells.append(cell)
+        ws.append(header_cells)
+        for row in rows:
+            ws.append(list(row))
+
+    def close(self) -> List[str]:
+        """Guarda los archivos pendientes y retorna sus rutas"""
+        if self._wb is not None and len(self._workbooks) > 1:
+            self._wb.save(self.paths[-1])
+            self._wb.close()
+        self._workbooks[0].save(self.paths[0])
+        self._wb = None
+        return self.paths
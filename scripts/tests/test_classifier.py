@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from enrich_products_with_ai import PRODUCT_TYPE_CLASSIFIER, PRODUCT_TYPE_KEYWORDS
+from enrichment.classifier import KeywordClassifier
+
+GM_EXISTENCIAS = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'gm', 'existencias.xlsx')
+
+
+@pytest.mark.parametrize('name, expected', [
+    # Palabras pegadas en data/gm/existencias.xlsx
+    ('ACEITEMINERAL-20W50 AP SN 5', 'fluido'),
+    ('ACEITE PARA MOTOR 20W50 SN  MIN', 'fluido'),
+    ('LÍQUIDO-TRANSMISIÓN AUTOMÁTICA', 'fluido'),
+    ('REFRIGERANTE', 'fluido'),
+    # Empates: gana el sustantivo principal (la primera palabra clave)
+    ('SELLO,FLTR LÍQUIDO TRANS/AUTO', 'refaccion'),
+    ('MANGUERA-SAL ENFRI LÍQUIDO TRA', 'refaccion'),
+    ('FILTRO,ACEITE', 'refaccion'),
+    ('TAPON DREN CARTER ACEITE', 'refaccion'),
+])
+def test_gm_regressions(name, expected):
+    assert PRODUCT_TYPE_CLASSIFIER.classify(name).product_type == expected
+
+
+def test_prefix_only_for_prefix_types():
+    classifier = KeywordClassifier({'refaccion': ['filtro'], 'fluido': ['aceite']}, prefix_types=('fluido',))
+    assert classifier.classify('ACEITEMOTOR').product_type == 'fluido'
+    assert classifier.classify('FILTROS').product_type == 'refaccion'
+    assert classifier.classify('FILTROACEITE').scores == {}
+
+
+def test_tie_break_does_not_depend_on_declaration_order():
+    reversed_keywords = dict(reversed(list(PRODUCT_TYPE_KEYWORDS.items())))
+    reversed_classifier = KeywordClassifier(reversed_keywords, default_type='refaccion', prefix_types=('fluido',))
+    names = ['SELLO,FLTR LÍQUIDO TRANS/AUTO', 'ACEITE FILTRO', 'FILTRO ACEITE', 'BOCINA LED']
+    if os.path.exists(GM_EXISTENCIAS):
+        import pandas as pd
+        names += pd.read_excel(GM_EXISTENCIAS)['DESCRIPCION'].astype(str).unique().tolist()
+    for name in names:
+        assert reversed_classifier.classify(name).product_type == PRODUCT_TYPE_CLASSIFIER.classify(name).product_type, name
+
+
+def test_classify_batch_matches_row_by_row():
+    names = ['SELLO,FLTR LÍQUIDO TRANS/AUTO', 'ACEITEMINERAL-20W50', 'Filtros de aceite', 'BOCINA LED', '',
+             None, float('nan'), 'perno\x00tuerca', 'ß filtro', 'FILTRO ACEITE', 'FILTRO ACEITE']
+    parts = ['12345678', '', 'LED-1', None, 'BOMBA', '', '', '', '', '99-88', 'X']
+    if os.path.exists(GM_EXISTENCIAS):
+        import pandas as pd
+        sheet = pd.read_excel(GM_EXISTENCIAS, dtype=str).fillna('')
+        names += sheet['DESCRIPCION'].tolist()
+        parts += sheet['No. de Parte'].tolist()
+
+    types, confidences = PRODUCT_TYPE_CLASSIFIER.classify_batch(names, parts)
+    assert len(types) == len(confidences) == len(names)
+    for name, part, product_type, confidence in zip(names, parts, types, confidences):
+        name = '' if name is None or name != name else name
+        has_letters = part and any(ch.isalpha() for ch in part)
+        expected = PRODUCT_TYPE_CLASSIFIER.classify(name, part if has_letters else '')
+        assert (product_type, confidence) == pytest.approx((expected.product_type, expected.confidence)), name
+
+
+def test_classify_batch_multiword_keywords_and_empty_input():
+    classifier = KeywordClassifier({'accesorio': ['tapete de hule'], 'refaccion': ['filtro']})
+    types, _ = classifier.classify_batch(['TAPETE DE HULE NEGRO', 'FILTRO', 'OTRO'])
+    assert types.tolist() == ['accesorio', 'refaccion', 'refaccion']
+    types, confidences = PRODUCT_TYPE_CLASSIFIER.classify_batch([])
+    assert len(types) == len(confidences) == 0
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from enrichment.delta import compute_delta, export_stock_delta, read_catalog_frame, read_stock_frame
+
+STOCK_CSV = """nombre,sku,precio,existencia
+FILTRO ACEITE,a-1,110,5
+BALATA DEL,B-2,80,0
+SENSOR O2,C-3,45,
+BUJIA,D-4,30,
+BOMBA AGUA,E-5,900,
+BOMBA AGUA,E-5,900,3
+TERMOSTATO,F-6,50.004,2
+BANDA,G-8,25,0
+SIN SKU,,10,1
+NUEVO,NEW-9,15,4
+"""
+
+CATALOG_CSV = """id,sku,price,is_available
+p1,A1,100,true
+p2,B-2,80,true
+p3,C-3,45,false
+p4,D-4,30,true
+p5,E-5,900,false
+p6,F-6,50,true
+p8,G-8,20,true
+p7,OLD-7,12,true
+"""
+
+
+@pytest.fixture
+def sheets(tmp_path):
+    stock_path = tmp_path / 'existencias.csv'
+    catalog_path = tmp_path / 'catalogo.csv'
+    stock_path.write_text(STOCK_CSV, encoding='utf-8')
+    catalog_path.write_text(CATALOG_CSV, encoding='utf-8')
+    return str(stock_path), str(catalog_path)
+
+
+def test_delta_reports_new_removed_and_changed_skus(sheets, tmp_path):
+    stock_path, catalog_path = sheets
+    output = str(tmp_path / 'delta.csv')
+    report, timings = export_stock_delta(stock_path, catalog_path, output)
+
+    assert (report.matched, report.new_skus, report.missing_skus, report.rows_without_sku) == (7, 1, 1, 1)
+    assert (report.price_changes, report.availability_changes) == (2, 3)
+    changes = dict(zip(report.delta['sku'], report.delta['changes']))
+    assert changes == {'a-1': 'price', 'B-2': 'availability', 'E-5': 'availability',
+                       'G-8': 'price|availability'}
+    row = report.delta.set_index('sku').loc['a-1']
+    assert (row['product_id'], row['price'], row['previous_price']) == ('p1', 110, 100)
+    # Las filas repetidas de un SKU suman su existencia
+    assert report.delta.set_index('sku').loc['E-5', 'stock'] == 3
+
+    written = pd.read_csv(output, dtype=str)
+    assert written['sku'].tolist() == report.delta['sku'].tolist()
+    assert set(timings) == {'read_input', 'read_catalog', 'compute', 'write'}
+
+
+def test_missing_stock_keeps_catalog_availability(sheets):
+    stock_path, catalog_path = sheets
+    stock, _ = read_stock_frame(stock_path)
+    assert stock.loc[['C3', 'D4'], 'stock'].isna().all()
+    assert stock.loc[['C3', 'D4'], 'is_available'].isna().all()
+
+    report = compute_delta(stock, read_catalog_frame(catalog_path))
+    # Sin existencia registrada no hay cambio: C-3 sigue no disponible y D-4 disponible
+    assert not {'C-3', 'D-4'} & set(report.delta['sku'])
+
+
+def test_sheet_without_stock_column_is_rejected(tmp_path):
+    path = tmp_path / 'sin_existencias.csv'
+    path.write_text("nombre,sku,precio\nFILTRO,A-1,10\n", encoding='utf-8')
+    with pytest.raises(ValueError, match='columna de existencias'):
+        read_stock_frame(str(path))
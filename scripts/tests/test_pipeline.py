@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from enrichment.pipeline import Stage, StagePipeline
+
+
+def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "tiempo de espera agotado"
+        time.sleep(0.005)
+
+
+def _assert_stopped(pipeline: StagePipeline):
+    assert pipeline._threads and not any(thread.is_alive() for thread in pipeline._threads)
+
+
+def test_output_keeps_source_order_when_later_items_finish_first():
+    finished = []
+    lock = threading.Lock()
+
+    def slow_first(item):
+        # Los primeros elementos esperan a que los siguientes terminen
+        if item < 3:
+            _wait_for(lambda: len(finished) >= 3 * (3 - item))
+        with lock:
+            finished.append(item)
+        return item * 10
+
+    items = list(range(12))
+    stages = [Stage('lenta', slow_first, workers=4), Stage('suma', lambda x: x + 1, workers=3)]
+    with StagePipeline(items, stages) as pipeline:
+        assert list(pipeline) == [item * 10 + 1 for item in items]
+    assert finished != sorted(finished)
+    assert finished.index(0) > finished.index(3)
+    _assert_stopped(pipeline)
+
+
+def test_in_flight_items_are_bounded():
+    started = []
+
+    def track(item):
+        started.append(item)
+        return item
+
+    max_in_flight = 5
+    consumed = 0
+    with StagePipeline(range(100), [Stage('etapa', track, workers=3)], queue_size=10,
+                       max_in_flight=max_in_flight) as pipeline:
+        for item in pipeline:
+            if consumed == 0:
+                # Con el consumidor detenido, la fuente se llena hasta el tope y ahí se queda
+                _wait_for(lambda: len(started) >= max_in_flight)
+                time.sleep(0.2)
+                assert len(started) == max_in_flight
+            assert item == consumed
+            consumed += 1
+            assert len(started) - consumed <= max_in_flight
+    assert consumed == 100
+
+
+def test_stage_error_is_raised_in_consumer():
+    def explode(item):
+        if item == 5:
+            raise ValueError("falla en el elemento 5")
+        return item
+
+    received = []
+    pipeline = StagePipeline(range(1000), [Stage('falla', explode, workers=2), Stage('otra', lambda x: x)])
+    with pytest.raises(ValueError, match="elemento 5"):
+        for item in pipeline:
+            received.append(item)
+    assert received == list(range(len(received))) and len(received) <= 5
+    _assert_stopped(pipeline)
+
+
+def test_empty_source_terminates():
+    pipeline = StagePipeline([], [Stage('a', lambda x: x, workers=3), Stage('b', lambda x: x, workers=2)])
+    assert list(pipeline) == []
+    _assert_stopped(pipeline)
+    assert [stats.items for stats in pipeline.stats()] == [0, 0]
@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+
+from enrich_products_with_ai import DEFAULT_FIELD_CONFIG, VALID_PRODUCT_TYPES
+from enrichment.metrics import MetricsCollector, estimate_cost
+from enrichment.prompts import PromptRegistry, common_instructions, load_field_config
+
+# Mínimo de OpenAI para cachear un prefijo; ~4 caracteres por token es una estimación generosa para español
+CACHE_MIN_TOKENS = 1024
+
+
+def test_templates_share_a_cacheable_prefix():
+    registry = PromptRegistry(load_field_config(DEFAULT_FIELD_CONFIG), VALID_PRODUCT_TYPES)
+    common = common_instructions(VALID_PRODUCT_TYPES)
+    assert len(common) > CACHE_MIN_TOKENS * 5
+    for template in registry.templates.values():
+        assert template.render('FILTRO ACEITE', '123', 10).startswith(common)
+        assert template.render_batch(['{"id": 0, "producto": "FILTRO"}']).startswith(common)
+    # Las plantillas siguen siendo distintas después del bloque común
+    assert len({template.prefix for template in registry.templates.values()}) == len(registry.templates)
+
+
+def test_record_usage_counts_cached_prompt_tokens():
+    metrics = MetricsCollector(model='gpt-4o-mini')
+    metrics.record_usage({'prompt_tokens': 2000, 'completion_tokens': 100,
+                          'prompt_tokens_details': {'cached_tokens': 1536}})
+    metrics.record_usage(SimpleNamespace(prompt_tokens=2000, completion_tokens=100,
+                                         prompt_tokens_details=SimpleNamespace(cached_tokens=0)))
+    metrics.record_usage({'prompt_tokens': 10, 'completion_tokens': 5})
+    counters = metrics.summary()['counters']
+    assert counters['prompt_tokens'] == 4010
+    assert counters['cached_prompt_tokens'] == 1536
+    expected = (estimate_cost('gpt-4o-mini', 2000, 100, 1536) + estimate_cost('gpt-4o-mini', 2000, 100)
+                + estimate_cost('gpt-4o-mini', 10, 5))
+    assert abs(counters['cost_usd'] - expected) < 1e-12
+    assert estimate_cost('gpt-4o-mini', 2000, 100, 1536) < estimate_cost('gpt-4o-mini', 2000, 100)
@@ -0,0 +1,47 @@
+from enrichment.schema import (
+    ENRICHMENT_FIELDS, STRICT_SCHEMA_KEYWORDS, batch_schema, compile_validator, enrichment_schema,
+    response_format,
+)
+
+PRODUCT_TYPES = ['refaccion', 'fluido', 'accesorio']
+
+
+def _keywords(schema):
+    """Palabras clave de JSON Schema usadas en `schema` (sin contar nombres de propiedades)"""
+    found = set(schema)
+    for name, value in schema.items():
+        if name in ('properties', '$defs'):
+            for sub in value.values():
+                found |= _keywords(sub)
+        elif name == 'items' and isinstance(value, dict):
+            found |= _keywords(value)
+        elif name == 'anyOf':
+            for sub in value:
+                found |= _keywords(sub)
+    return found
+
+
+def test_response_format_uses_only_strict_keywords():
+    for schema in (enrichment_schema(PRODUCT_TYPES), batch_schema(PRODUCT_TYPES),
+                   enrichment_schema(PRODUCT_TYPES, fields=['description', 'search_keywords'])):
+        sent = response_format('product_enrichment', schema)['json_schema']['schema']
+        assert _keywords(sent) <= STRICT_SCHEMA_KEYWORDS
+        assert 'minLength' not in _keywords(sent) and 'maxItems' not in _keywords(sent)
+
+
+def test_local_validator_keeps_full_constraints():
+    schema = enrichment_schema(PRODUCT_TYPES)
+    response_format('product_enrichment', schema)
+    validate = compile_validator(schema)
+    valid = {
+        'description': 'Filtro de aceite',
+        'product_type': 'refaccion',
+        'suggested_category': 'Filtros',
+        'technical_specs': {'marca_compatible': '', 'modelos_compatibles': '', 'años_compatibles': '',
+                            'especificaciones': ''},
+        'search_keywords': ['filtro'],
+    }
+    assert validate(valid) == []
+    assert validate({**valid, 'description': '  '}) == ['description']
+    assert validate({**valid, 'search_keywords': ['k'] * 6}) == ['search_keywords']
+    assert set(validate('no es objeto')) == set(ENRICHMENT_FIELDS)